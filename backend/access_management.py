@@ -3,7 +3,8 @@ API endpoints для управления доступом к оборудова
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, text
+from sqlalchemy import select, and_, or_, func, text, true, literal, case, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID, insert as pg_insert
 from sqlalchemy.orm import selectinload
 import uuid as uuid_lib
 from datetime import datetime, timedelta
@@ -11,6 +12,8 @@ from typing import Optional, List
 from database import get_db
 from models import User, Equipment, UserEquipmentAccess
 from auth import verify_token
+from concurrency import limit
+from hierarchy_management import HIERARCHY_NODE_TYPES, equipment_in_node
 
 router = APIRouter(prefix="/api/access", tags=["access"])
 
@@ -22,6 +25,89 @@ def check_access_management_permission(user_role: str):
             detail="Недостаточно прав для управления доступом"
         )
 
+async def _load_grant_target(db: AsyncSession, username: str, user_id: str):
+    """Текущий пользователь (с правом управления доступом) и инженер, которому выдается доступ"""
+    current_user_result = await db.execute(
+        select(User).where(User.username == username)
+    )
+    current_user = current_user_result.scalar_one_or_none()
+    if not current_user:
+        raise HTTPException(status_code=404, detail="Current user not found")
+    
+    check_access_management_permission(current_user.role)
+    
+    # Проверяем существование пользователя
+    target_user_result = await db.execute(
+        select(User).where(User.id == uuid_lib.UUID(user_id))
+    )
+    target_user = target_user_result.scalar_one_or_none()
+    if not target_user:
+        raise HTTPException(status_code=404, detail="Target user not found")
+    
+    # Проверяем, что это инженер
+    if target_user.role != "engineer":
+        raise HTTPException(
+            status_code=400,
+            detail="Доступ можно предоставлять только инженерам"
+        )
+    return current_user, target_user
+
+
+def _parse_expires_at(expires_at: Optional[str]) -> Optional[datetime]:
+    if expires_at:
+        try:
+            return datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+    return None
+
+
+async def _upsert_equipment_access(
+    db: AsyncSession,
+    user_id,
+    equipment_filter,
+    access_type: str,
+    granted_by,
+    expires_date: Optional[datetime],
+) -> int:
+    """
+    Выдать доступ ко всему оборудованию, подходящему под equipment_filter (условие
+    на Equipment), одним INSERT ... SELECT ... ON CONFLICT (user_id, equipment_id)
+    DO UPDATE: существование оборудования проверяется самим SELECT, существующий
+    (в т.ч. отозванный) доступ обновляется и активируется. Возвращает число строк.
+    """
+    access = UserEquipmentAccess.__table__
+    rows = select(
+        literal(user_id, PG_UUID(as_uuid=True)),
+        Equipment.id,
+        literal(access_type),
+        literal(granted_by, PG_UUID(as_uuid=True)),
+        func.now(),
+        literal(expires_date, access.c.expires_at.type),
+        literal(1),
+    ).where(equipment_filter)
+    stmt = pg_insert(access).from_select(
+        ["user_id", "equipment_id", "access_type", "granted_by", "granted_at", "expires_at", "is_active"],
+        rows,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[access.c.user_id, access.c.equipment_id],
+        set_={
+            "access_type": stmt.excluded.access_type,
+            "granted_by": stmt.excluded.granted_by,
+            "granted_at": func.now(),
+            # Без нового срока действующий доступ сохраняет прежний; отозванный — выдается заново
+            "expires_at": case(
+                (access.c.is_active == 1, func.coalesce(stmt.excluded.expires_at, access.c.expires_at)),
+                else_=stmt.excluded.expires_at,
+            ),
+            "is_active": 1,
+        },
+    ).returning(access.c.equipment_id)
+    result = await db.execute(stmt)
+    return len(result.all())
+
+
 @router.post("/users/{user_id}/equipment")
 async def grant_equipment_access(
     user_id: str,
@@ -31,89 +117,27 @@ async def grant_equipment_access(
     username: str = Depends(verify_token),
     db: AsyncSession = Depends(get_db)
 ):
-    """Предоставить доступ к оборудованию пользователю"""
+    """Предоставить доступ к оборудованию пользователю (один INSERT ... ON CONFLICT DO UPDATE)"""
     try:
-        # Проверяем права текущего пользователя
-        current_user_result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        current_user = current_user_result.scalar_one_or_none()
-        if not current_user:
-            raise HTTPException(status_code=404, detail="Current user not found")
-        
-        check_access_management_permission(current_user.role)
+        current_user, target_user = await _load_grant_target(db, username, user_id)
+        expires_date = _parse_expires_at(expires_at)
         
-        # Проверяем существование пользователя
-        target_user_result = await db.execute(
-            select(User).where(User.id == uuid_lib.UUID(user_id))
-        )
-        target_user = target_user_result.scalar_one_or_none()
-        if not target_user:
-            raise HTTPException(status_code=404, detail="Target user not found")
-        
-        # Проверяем, что это инженер
-        if target_user.role != "engineer":
-            raise HTTPException(
-                status_code=400,
-                detail="Доступ можно предоставлять только инженерам"
-            )
-        
-        # Парсим дату истечения
-        expires_date = None
-        if expires_at:
-            try:
-                expires_date = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
-            except:
-                pass
-        
-        granted_count = 0
+        # Некорректные id пропускаются; несуществующее оборудование отсекает сам запрос
+        equipment_uuids = []
         for equipment_id in equipment_ids:
             try:
-                equipment_uuid = uuid_lib.UUID(equipment_id)
-                
-                # Проверяем существование оборудования
-                equipment_result = await db.execute(
-                    select(Equipment).where(Equipment.id == equipment_uuid)
-                )
-                if not equipment_result.scalar_one_or_none():
-                    continue
-                
-                # Проверяем, не существует ли уже активный доступ
-                existing_result = await db.execute(
-                    select(UserEquipmentAccess).where(
-                        and_(
-                            UserEquipmentAccess.user_id == target_user.id,
-                            UserEquipmentAccess.equipment_id == equipment_uuid,
-                            text("user_equipment_access.is_active = 1")
-                        )
-                    )
-                )
-                existing = existing_result.scalar_one_or_none()
-                
-                if existing:
-                    # Обновляем существующий доступ
-                    existing.access_type = access_type
-                    existing.granted_by = current_user.id
-                    existing.granted_at = datetime.now()
-                    if expires_date:
-                        existing.expires_at = expires_date
-                    existing.is_active = 1
-                else:
-                    # Создаем новый доступ
-                    new_access = UserEquipmentAccess(
-                        user_id=target_user.id,
-                        equipment_id=equipment_uuid,
-                        access_type=access_type,
-                        granted_by=current_user.id,
-                        expires_at=expires_date,
-                        is_active=1
-                    )
-                    db.add(new_access)
-                
-                granted_count += 1
+                equipment_uuids.append(uuid_lib.UUID(equipment_id))
             except ValueError:
                 continue
         
+        granted_count = await _upsert_equipment_access(
+            db,
+            target_user.id,
+            Equipment.id == any_(bindparam("equipment_ids", equipment_uuids, type_=ARRAY(PG_UUID(as_uuid=True)))),
+            access_type,
+            current_user.id,
+            expires_date,
+        )
         await db.commit()
         
         return {
@@ -231,66 +255,65 @@ async def get_user_equipment_access(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get access: {str(e)}")
 
-@router.post("/users/{user_id}/equipment/bulk")
+@router.post("/users/{user_id}/equipment/bulk", dependencies=[Depends(limit("bulk"))])
 async def grant_bulk_equipment_access(
     user_id: str,
     request_data: dict,
     username: str = Depends(verify_token),
     db: AsyncSession = Depends(get_db)
 ):
-    """Массовое предоставление доступа к оборудованию по фильтрам"""
+    """
+    Массовое предоставление доступа к оборудованию по фильтрам:
+      - enterprise_id / branch_id / workshop_id / equipment_type_id — узел иерархии
+        (все оборудование узла, одним запросом);
+      - location (подстрока) / enterprise (начало location) — по текстовому
+        расположению (для оборудования без привязки к цехам).
+    Несколько фильтров сужают выборку.
+    """
     try:
-        # Проверяем права
-        current_user_result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        current_user = current_user_result.scalar_one_or_none()
-        if not current_user:
-            raise HTTPException(status_code=404, detail="Current user not found")
-        
-        check_access_management_permission(current_user.role)
+        current_user, target_user = await _load_grant_target(db, username, user_id)
         
         # Получаем фильтры
         location_filter = request_data.get("location")  # НГДУ, цех
         enterprise_filter = request_data.get("enterprise")  # Предприятие
         access_type = request_data.get("access_type", "read_write")
-        expires_at = request_data.get("expires_at")
+        expires_date = _parse_expires_at(request_data.get("expires_at"))
         
-        # Строим запрос для поиска оборудования
-        equipment_query = select(Equipment)
+        # Условие на оборудование
+        conditions = []
+        for node_type in HIERARCHY_NODE_TYPES:
+            node_id = request_data.get(f"{node_type}_id")
+            if not node_id:
+                continue
+            try:
+                node_uuid = uuid_lib.UUID(str(node_id))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid {node_type}_id format")
+            conditions.append(Equipment.id.in_(equipment_in_node(node_type, node_uuid)))
         
         if location_filter:
-            equipment_query = equipment_query.where(
-                Equipment.location.contains(location_filter)
-            )
+            conditions.append(Equipment.location.contains(location_filter))
         
         if enterprise_filter:
-            equipment_query = equipment_query.where(
-                Equipment.location.startswith(enterprise_filter)
-            )
+            conditions.append(Equipment.location.startswith(enterprise_filter))
         
-        equipment_result = await db.execute(equipment_query)
-        equipment_list = equipment_result.scalars().all()
+        granted_count = await _upsert_equipment_access(
+            db, target_user.id, and_(true(), *conditions), access_type, current_user.id, expires_date
+        )
+        await db.commit()
         
-        if not equipment_list:
+        if not granted_count:
             return {
                 "message": "Оборудование по указанным фильтрам не найдено",
                 "granted_count": 0
             }
         
-        # Предоставляем доступ ко всему найденному оборудованию
-        equipment_ids = [str(eq.id) for eq in equipment_list]
-        
-        return await grant_equipment_access(
-            user_id=user_id,
-            equipment_ids=equipment_ids,
-            access_type=access_type,
-            expires_at=expires_at,
-            username=username,
-            db=db
-        )
+        return {
+            "message": f"Доступ предоставлен к {granted_count} единицам оборудования",
+            "granted_count": granted_count,
+        }
     except HTTPException:
         raise
     except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to grant bulk access: {str(e)}")
-
@@ -0,0 +1,182 @@
+"""
+Приложения к PDF-отчетам: сканы удостоверений специалистов и свидетельств о
+поверке приборов.
+
+Сканы не встраиваются в тело отчета через ReportLab, а собираются в отдельные
+PDF-пакеты (по инженеру и по прибору) и добавляются в конец отчета постранично
+(pypdf). PDF-сканы переносятся страницами как есть, изображения — по одному на
+страницу с подписью.
+
+Пакеты кешируются в APPENDIX_CACHE_DIR. Имя файла содержит отпечаток исходных
+сканов (путь, размер, mtime) и реквизитов, поэтому измененный скан никогда не
+попадет в отчет из кеша; при загрузке/удалении скана старые пакеты удаляются
+явно (invalidate_engineer_bundles / invalidate_instrument_bundles).
+"""
+import hashlib
+import io
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+APPENDIX_CACHE_DIR = Path(os.getenv("APPENDIX_CACHE_DIR", "/app/reports/appendix_cache"))
+
+
+def available() -> bool:
+    """Есть ли pypdf (без него сканы встраиваются в тело отчета по-старому)"""
+    try:
+        import pypdf  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _is_pdf(path: str, mime_type: Optional[str]) -> bool:
+    return "pdf" in (mime_type or "").lower() or path.lower().endswith(".pdf")
+
+
+def _fingerprint(items: List[Dict[str, Any]], title: str) -> Optional[str]:
+    """Отпечаток пакета по реквизитам и состоянию файлов сканов"""
+    h = hashlib.sha256(title.encode("utf-8"))
+    found = False
+    for item in items:
+        path = item.get("path")
+        if not path or not os.path.exists(path):
+            continue
+        st = os.stat(path)
+        found = True
+        h.update(f"|{path}|{st.st_size}|{st.st_mtime_ns}|{item.get('mime_type') or ''}|{item.get('caption') or ''}".encode("utf-8"))
+    return h.hexdigest()[:20] if found else None
+
+
+def _image_page(path: str, caption: Optional[str]) -> bytes:
+    """Одна страница A4: подпись сверху, изображение вписано с сохранением пропорций"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+    from report_generator import register_fonts
+
+    _, bold_font = register_fonts()  # шрифты с кириллицей
+    buf = io.BytesIO()
+    page_w, page_h = A4
+    c = canvas.Canvas(buf, pagesize=A4, invariant=1)
+    top = page_h - 2 * cm
+    if caption:
+        c.setFont(bold_font, 11)
+        c.drawString(2 * cm, top, caption[:110])
+        top -= 1 * cm
+    image = ImageReader(path)
+    iw, ih = image.getSize()
+    box_w, box_h = page_w - 4 * cm, top - 2 * cm
+    scale = min(box_w / iw, box_h / ih)
+    w, h = iw * scale, ih * scale
+    c.drawImage(image, (page_w - w) / 2, top - h, width=w, height=h, preserveAspectRatio=True)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def _build_bundle(output_path: Path, items: List[Dict[str, Any]]) -> bool:
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for item in items:
+        path = item.get("path")
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            if _is_pdf(path, item.get("mime_type")):
+                start = len(writer.pages)
+                writer.append(PdfReader(path))
+            else:
+                start = len(writer.pages)
+                writer.append(PdfReader(io.BytesIO(_image_page(path, item.get("caption")))))
+            if item.get("caption"):
+                writer.add_outline_item(item["caption"], start)
+        except Exception as e:
+            print(f"⚠️  Appendix: не удалось добавить скан {path}: {e}")
+    if not writer.pages:
+        return False
+
+    # Атомарная запись: пакет может одновременно собираться в нескольких процессах пула
+    tmp_path = output_path.with_name(f".{output_path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as f:
+        writer.write(f)
+    os.replace(tmp_path, output_path)
+    return True
+
+
+def _prune(prefix: str, keep: Optional[Path] = None) -> None:
+    if not APPENDIX_CACHE_DIR.exists():
+        return
+    for p in APPENDIX_CACHE_DIR.glob(f"{prefix}_*.pdf"):
+        if keep is not None and p == keep:
+            continue
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+
+def get_bundle(kind: str, key: str, title: str, items: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Путь к PDF-пакету приложения (собирается при отсутствии в кеше).
+    kind: engineer | instrument; key — id инженера/прибора;
+    items: [{"path", "mime_type", "caption"}].
+    """
+    fingerprint = _fingerprint(items, title)
+    if not fingerprint:
+        return None
+    APPENDIX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    prefix = f"{kind}_{key}"
+    bundle_path = APPENDIX_CACHE_DIR / f"{prefix}_{fingerprint}.pdf"
+    if bundle_path.exists():
+        return str(bundle_path)
+    if not _build_bundle(bundle_path, items):
+        return None
+    # Предыдущие версии пакета этого инженера/прибора больше не нужны
+    _prune(prefix, keep=bundle_path)
+    return str(bundle_path)
+
+
+def collect(appendices) -> Tuple[List[Tuple[str, str]], frozenset]:
+    """
+    Пакеты приложений (report_document.Appendix), которые удалось собрать:
+    ([(заголовок, путь)], пути сканов в них). Вместо этих сканов в теле
+    отчета — ссылка на приложение; по ним же считается соль фрагментов,
+    поэтому отчет и предпросмотр вычисляют набор одинаково.
+    """
+    bundles: List[Tuple[str, str]] = []
+    paths = set()
+    if not appendices or not available():
+        return bundles, frozenset()
+    for appendix in appendices:
+        bundle_path = get_bundle(appendix.kind, appendix.key, appendix.title, appendix.items)
+        if bundle_path:
+            bundles.append((appendix.title, bundle_path))
+            paths.update(item["path"] for item in appendix.items)
+    return bundles, frozenset(paths)
+
+
+def invalidate_engineer_bundles(engineer_id) -> None:
+    """Сбросить кеш приложений инженера (вызывается при загрузке/удалении скана удостоверения)"""
+    _prune(f"engineer_{engineer_id}")
+
+
+def invalidate_instrument_bundles(equipment_id) -> None:
+    """Сбросить кеш приложений прибора (вызывается при загрузке/удалении скана свидетельства)"""
+    _prune(f"instrument_{equipment_id}")
+
+
+def append_bundles(body_path: str, bundles: List[Tuple[str, str]], output_path: str) -> str:
+    """Склеить тело отчета и пакеты приложений [(заголовок, путь)] постранично"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.append(body_path)
+    for title, bundle_path in bundles:
+        writer.append(bundle_path, outline_item=title)
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return output_path
@@ -4,11 +4,14 @@ API для работы с заданиями на диагностику/экс
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func
+from sqlalchemy import select, and_, or_, func, insert, literal, union_all, exists, text
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta
+import os
+import time
 import uuid as uuid_lib
 
 from database import get_db
@@ -17,6 +20,7 @@ from models import (
     Equipment,
     User,
     InspectionHistory,
+    Inspection,
     HierarchyEngineerAssignment,
     Enterprise,
     Branch,
@@ -24,9 +28,49 @@ from models import (
     EquipmentType,
 )
 from auth import verify_token
+from concurrency import limit
+from hierarchy_management import HIERARCHY_NODE_TYPES, equipment_in_node
 
 router = APIRouter(prefix="/api/assignments", tags=["assignments"])
 
+# Статистика по инженерам для панели оператора: кеш в памяти процесса на
+# несколько секунд (сбрасывается при изменении заданий через API)
+ASSIGNMENT_STATS_CACHE_SECONDS = float(os.getenv("ASSIGNMENT_STATS_CACHE_SECONDS", "30"))
+_STATS_CACHE_MAX_ENTRIES = 128
+_stats_cache: dict = {}
+
+_STATUS_KEYS = {
+    'PENDING': 'pending',
+    'IN_PROGRESS': 'in_progress',
+    'COMPLETED': 'completed',
+    'CANCELLED': 'cancelled',
+}
+
+
+def _stats_cache_get(key):
+    entry = _stats_cache.get(key)
+    if entry is None:
+        return None
+    expires, value = entry
+    if expires < time.monotonic():
+        _stats_cache.pop(key, None)
+        return None
+    return value
+
+
+def _stats_cache_put(key, value) -> None:
+    if ASSIGNMENT_STATS_CACHE_SECONDS <= 0:
+        return
+    if len(_stats_cache) >= _STATS_CACHE_MAX_ENTRIES:
+        _stats_cache.clear()
+    _stats_cache[key] = (time.monotonic() + ASSIGNMENT_STATS_CACHE_SECONDS, value)
+
+
+def invalidate_assignment_statistics() -> None:
+    """Сбросить кеш статистики (после создания или изменения заданий)"""
+    _stats_cache.clear()
+
+
 # Pydantic модели
 class AssignmentCreate(BaseModel):
     equipment_id: str
@@ -36,6 +80,19 @@ class AssignmentCreate(BaseModel):
     due_date: Optional[str] = None
     description: Optional[str] = None
 
+class BulkAssignmentCreate(BaseModel):
+    node_type: str  # enterprise/branch/workshop/equipment_type/equipment
+    node_id: str
+    assignment_type: str  # 'DIAGNOSTICS', 'EXPERTISE', 'INSPECTION'
+    assigned_to: str
+    priority: Optional[str] = 'NORMAL'
+    due_date: Optional[str] = None
+    description: Optional[str] = None
+    # Только оборудование, у которого следующее обследование не позже даты
+    next_inspection_before: Optional[str] = None
+    # С фильтром по дате: включать оборудование без известной даты следующего обследования
+    include_without_next_date: bool = True
+
 class AssignmentUpdate(BaseModel):
     status: Optional[str] = None
     priority: Optional[str] = None
@@ -131,6 +188,7 @@ async def create_assignment(
         
         db.add(new_assignment)
         await db.commit()
+        invalidate_assignment_statistics()
         await db.refresh(new_assignment)
         
         return {
@@ -145,6 +203,151 @@ async def create_assignment(
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка при создании задания: {str(e)}")
 
+# Открытые задания: новое задание на то же оборудование того же вида не создается
+OPEN_ASSIGNMENT_STATUSES = ('PENDING', 'IN_PROGRESS')
+
+_NODE_MODELS = {
+    "enterprise": Enterprise,
+    "branch": Branch,
+    "workshop": Workshop,
+    "equipment_type": EquipmentType,
+    "equipment": Equipment,
+}
+
+
+def _next_inspection_dates():
+    """Подзапрос: оборудование -> самая поздняя запланированная дата следующего обследования"""
+    dates = union_all(
+        select(InspectionHistory.equipment_id, InspectionHistory.next_inspection_date.label("next_date"))
+        .where(InspectionHistory.next_inspection_date.isnot(None)),
+        select(Inspection.equipment_id, Inspection.next_inspection_date.label("next_date"))
+        .where(Inspection.next_inspection_date.isnot(None)),
+    ).subquery()
+    return (
+        select(dates.c.equipment_id, func.max(dates.c.next_date).label("next_date"))
+        .group_by(dates.c.equipment_id)
+        .subquery("next_inspection")
+    )
+
+
+@router.post("/bulk", response_model=dict, dependencies=[Depends(limit("bulk"))])
+async def create_assignments_bulk(
+    request_data: BulkAssignmentCreate,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Создать задания на все оборудование узла иерархии (предприятие, филиал, цех)
+    или типа оборудования одной командой INSERT ... SELECT.
+    next_inspection_before — только оборудование со сроком следующего обследования
+    не позже даты (по истории обследований и чек-листам). Оборудование, по которому
+    уже есть открытое задание того же вида, пропускается.
+    """
+    try:
+        user_result = await db.execute(
+            select(User).where(User.username == username)
+        )
+        user = user_result.scalar_one_or_none()
+        
+        if not user or user.role not in ['admin', 'chief_operator', 'operator']:
+            raise HTTPException(status_code=403, detail="Недостаточно прав для создания задания")
+        
+        if request_data.node_type not in HIERARCHY_NODE_TYPES:
+            raise HTTPException(status_code=400, detail=f"node_type должен быть одним из: {', '.join(HIERARCHY_NODE_TYPES)}")
+        try:
+            node_id = uuid_lib.UUID(request_data.node_id)
+            assigned_to = uuid_lib.UUID(request_data.assigned_to)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Неверный формат идентификатора")
+        
+        node_model = _NODE_MODELS[request_data.node_type]
+        if await db.scalar(select(node_model.id).where(node_model.id == node_id)) is None:
+            raise HTTPException(status_code=404, detail="Объект иерархии не найден")
+        if await db.scalar(select(User.id).where(User.id == assigned_to)) is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        
+        due_date = None
+        if request_data.due_date:
+            try:
+                due_date = datetime.fromisoformat(request_data.due_date.replace('Z', '+00:00'))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Неверный формат due_date")
+        
+        conditions = [
+            Equipment.id.in_(equipment_in_node(request_data.node_type, node_id)),
+            Equipment.is_active == 1,
+        ]
+        targets_query = select(Equipment.id)
+        if request_data.next_inspection_before:
+            try:
+                before = datetime.fromisoformat(request_data.next_inspection_before).date()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Неверный формат next_inspection_before")
+            next_inspection = _next_inspection_dates()
+            targets_query = targets_query.outerjoin(
+                next_inspection, next_inspection.c.equipment_id == Equipment.id
+            )
+            due_condition = next_inspection.c.next_date <= before
+            if request_data.include_without_next_date:
+                due_condition = or_(due_condition, next_inspection.c.next_date.is_(None))
+            conditions.append(due_condition)
+        
+        has_open = exists().where(
+            Assignment.equipment_id == Equipment.id,
+            Assignment.assignment_type == request_data.assignment_type,
+            Assignment.status.in_(OPEN_ASSIGNMENT_STATUSES),
+        )
+        targets = targets_query.add_columns(has_open.label("has_open")).where(*conditions).cte("targets")
+        
+        inserted = (
+            insert(Assignment)
+            .from_select(
+                [
+                    Assignment.id, Assignment.equipment_id, Assignment.assignment_type,
+                    Assignment.assigned_by, Assignment.assigned_to, Assignment.status,
+                    Assignment.priority, Assignment.due_date, Assignment.description,
+                ],
+                select(
+                    func.gen_random_uuid(),
+                    targets.c.id,
+                    literal(request_data.assignment_type),
+                    literal(user.id, PG_UUID(as_uuid=True)),
+                    literal(assigned_to, PG_UUID(as_uuid=True)),
+                    literal('PENDING'),
+                    literal(request_data.priority or 'NORMAL'),
+                    literal(due_date, Assignment.due_date.type),
+                    literal(request_data.description, Assignment.description.type),
+                ).where(~targets.c.has_open),
+            )
+            .returning(Assignment.id)
+            .cte("inserted")
+        )
+        
+        # Параллельные массовые запросы не должны создать дубликаты открытых заданий
+        await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('assignments_bulk'))"))
+        matched, created = (await db.execute(
+            select(
+                select(func.count()).select_from(targets).scalar_subquery(),
+                select(func.count()).select_from(inserted).scalar_subquery(),
+            )
+        )).one()
+        await db.commit()
+        invalidate_assignment_statistics()
+        
+        return {
+            "status": "created",
+            "matched": matched,
+            "created": created,
+            "skipped_existing": matched - created,
+            "message": f"Создано заданий: {created}"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Ошибка при массовом создании заданий: {str(e)}")
+
 @router.get("", response_model=List[AssignmentResponse])
 async def get_assignments(
     status: Optional[str] = None,
@@ -375,6 +578,7 @@ async def update_assignment(
         assignment.updated_at = datetime.now()
         
         await db.commit()
+        invalidate_assignment_statistics()
         await db.refresh(assignment)
         
         return {
@@ -464,10 +668,20 @@ async def get_assignment_equipment(
 
 @router.get("/statistics/engineers")
 async def get_assignments_statistics_by_engineers(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    node_type: Optional[str] = None,
+    node_id: Optional[str] = None,
     username: str = Depends(verify_token),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить статистику по заданиям для каждого инженера"""
+    """
+    Получить статистику по заданиям для каждого инженера.
+    date_from / date_to — задания, созданные в интервале (даты включительно);
+    node_type + node_id — только оборудование узла иерархии или типа оборудования.
+    Счетчики — один GROUP BY assigned_to, status; результат кешируется на
+    ASSIGNMENT_STATS_CACHE_SECONDS.
+    """
     try:
         # Получаем информацию о пользователе
         user_result = await db.execute(
@@ -482,42 +696,74 @@ async def get_assignments_statistics_by_engineers(
         if user.role not in ['admin', 'chief_operator', 'operator']:
             raise HTTPException(status_code=403, detail="Доступ запрещен")
         
-        # Получаем всех инженеров
-        engineers_result = await db.execute(
-            select(User).where(User.role == 'engineer', User.is_active == 1)
+        conditions = []
+        try:
+            if date_from:
+                conditions.append(Assignment.created_at >= datetime.fromisoformat(date_from))
+            if date_to:
+                day_after = datetime.fromisoformat(date_to).date() + timedelta(days=1)
+                conditions.append(Assignment.created_at < datetime.combine(day_after, datetime.min.time()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Неверный формат даты (ожидается YYYY-MM-DD)")
+        if node_type or node_id:
+            if node_type not in HIERARCHY_NODE_TYPES or not node_id:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Укажите node_id и node_type: {', '.join(HIERARCHY_NODE_TYPES)}"
+                )
+            try:
+                node_uuid = uuid_lib.UUID(node_id)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Неверный формат node_id")
+            conditions.append(Assignment.equipment_id.in_(equipment_in_node(node_type, node_uuid)))
+        
+        cache_key = (date_from, date_to, node_type, node_id)
+        cached = _stats_cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        counts = (
+            select(Assignment.assigned_to, Assignment.status, func.count().label("count"))
+            .where(*conditions)
+            .group_by(Assignment.assigned_to, Assignment.status)
+            .subquery()
+        )
+        rows = await db.execute(
+            select(User.id, User.username, User.full_name, User.email, counts.c.status, counts.c.count)
+            .outerjoin(counts, counts.c.assigned_to == User.id)
+            .where(User.role == 'engineer', User.is_active == 1)
+            .order_by(User.full_name, User.username)
         )
-        engineers = engineers_result.scalars().all()
         
-        statistics = []
-        for engineer in engineers:
-            # Получаем все задания для инженера
-            assignments_result = await db.execute(
-                select(Assignment).where(Assignment.assigned_to == engineer.id)
-            )
-            all_assignments = assignments_result.scalars().all()
-            
-            total = len(all_assignments)
-            pending = len([a for a in all_assignments if a.status == 'PENDING'])
-            in_progress = len([a for a in all_assignments if a.status == 'IN_PROGRESS'])
-            completed = len([a for a in all_assignments if a.status == 'COMPLETED'])
-            cancelled = len([a for a in all_assignments if a.status == 'CANCELLED'])
-            
-            statistics.append({
-                "engineer_id": str(engineer.id),
-                "engineer_name": engineer.full_name or engineer.username,
-                "username": engineer.username,
-                "email": engineer.email,
-                "total": total,
-                "pending": pending,
-                "in_progress": in_progress,
-                "completed": completed,
-                "cancelled": cancelled,
-            })
+        by_engineer: dict = {}
+        for engineer_id, engineer_username, full_name, email, status, count in rows:
+            item = by_engineer.get(engineer_id)
+            if item is None:
+                item = by_engineer[engineer_id] = {
+                    "engineer_id": str(engineer_id),
+                    "engineer_name": full_name or engineer_username,
+                    "username": engineer_username,
+                    "email": email,
+                    "total": 0,
+                    "pending": 0,
+                    "in_progress": 0,
+                    "completed": 0,
+                    "cancelled": 0,
+                }
+            if status is None:
+                continue
+            item["total"] += count
+            key = _STATUS_KEYS.get(status)
+            if key:
+                item[key] += count
         
-        return {
+        statistics = list(by_engineer.values())
+        result = {
             "items": statistics,
             "total_engineers": len(statistics)
         }
+        _stats_cache_put(cache_key, result)
+        return result
         
     except HTTPException:
         raise
@@ -528,7 +774,6 @@ async def get_assignments_statistics_by_engineers(
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Ошибка при получении статистики: {error_detail}")
 
-
 @router.get("/statistics/objects", response_model=dict)
 async def get_assignments_progress_by_objects(
     username: str = Depends(verify_token),
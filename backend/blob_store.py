@@ -0,0 +1,211 @@
+"""
+Хранилище файлов с адресацией по содержимому (SHA-256) и подсчетом ссылок.
+
+Одни и те же фото и сканы загружаются повторно, а каждый пересобранный отчет
+раньше был новым файлом. Теперь загрузки (QuestionnaireDocumentFile,
+Certification, VerificationEquipment) и сгенерированные отчеты (Report, PDF/Word
+опросных листов Questionnaire)
+хранятся как блобы BLOB_STORE_DIR/ab/cd/<sha256><расширение>: одинаковое
+содержимое лежит на диске один раз, таблица blobs хранит число ссылок.
+PDF отчетов собираются детерминированно (ReportLab invariant, см.
+ReportGenerator._build_pdf), поэтому повторная генерация без изменений
+попадает в тот же блоб и без кеша фрагментов.
+
+  adopt()    — в транзакции вызывающего: +1 ссылка (INSERT ... ON CONFLICT),
+               файл переносится в хранилище, если такого содержимого еще нет.
+               Ссылка и запись, которая на нее указывает, фиксируются вместе.
+  discard()  — после фиксации удаления/замены записи: ставит освобождение в
+               фоновую очередь file_gc, которая вызывает release().
+  release()  — -1 ссылка; на нуле строка блоба удаляется, а файл стирается до
+               фиксации этого удаления (под блокировкой строки), поэтому
+               параллельный adopt того же содержимого либо увидит живой блоб,
+               либо заново положит файл.
+
+Сбой между фиксацией записи и освобождением оставляет лишнюю ссылку; такие
+блобы (без записей, ссылающихся на них) удаляет сверка file_gc. Записи, созданные до появления
+хранилища (без sha256), удаляются по пути, как раньше. Вместе с файлом
+удаляются его уменьшенные копии (image_derivatives).
+
+Байты блобов хранит драйвер storage (локальный диск или S3). В записях БД
+остается путь блоба в BLOB_STORE_DIR; при S3 это путь локальной копии, которая
+скачивается по требованию (ensure_local) — для рендеринга и отдачи файлов.
+"""
+import asyncio
+import hashlib
+import mimetypes
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from database import AsyncSessionLocal
+from image_derivatives import remove_variants
+from models import Blob
+from storage import get_storage, place_file
+from upload_storage import remove_file
+
+BLOB_STORE_DIR = Path(os.getenv("BLOB_STORE_DIR", "/app/uploads/blobs"))
+
+# Одновременных скачиваний локальных копий из хранилища (ensure_local_many)
+LOCAL_FETCH_CONCURRENCY = 4
+
+
+def blob_path(sha256: str, extension: str = "") -> Path:
+    return BLOB_STORE_DIR / sha256[:2] / sha256[2:4] / f"{sha256}{extension.lower()}"
+
+
+def blob_key(path: Optional[str]) -> Optional[str]:
+    """Ключ блоба в хранилище по его пути (None — файл не из blob_store)"""
+    if not path:
+        return None
+    root = os.path.abspath(BLOB_STORE_DIR)
+    full = os.path.abspath(path)
+    if not full.startswith(root + os.sep) or os.sep + ".incoming" + os.sep in full[len(root):]:
+        return None
+    return os.path.relpath(full, root).replace(os.sep, "/")
+
+
+def staging_path(extension: str = "") -> Path:
+    """Временный путь для загрузки рядом с хранилищем (перенос — атомарный rename)"""
+    return BLOB_STORE_DIR / ".incoming" / f"{uuid.uuid4().hex}{extension.lower()}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def adopt(db: AsyncSession, source_path: str, sha256: str, size: int,
+                extension: Optional[str] = None) -> str:
+    """
+    Добавить ссылку на блоб с содержимым source_path (в транзакции db) и
+    вернуть путь блоба. source_path после вызова больше не существует.
+    extension — расширение имени блоба (по умолчанию — как у source_path).
+    """
+    candidate = blob_path(sha256, Path(source_path).suffix if extension is None else extension)
+    result = await db.execute(
+        pg_insert(Blob)
+        .values(sha256=sha256, size=size, file_path=str(candidate), ref_count=1)
+        .on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            set_={"ref_count": Blob.ref_count + 1, "last_referenced_at": func.now()},
+        )
+        .returning(Blob.file_path)
+    )
+    path = result.scalar_one()
+    key = blob_key(path)
+    storage = get_storage()
+    if key is not None and storage.is_remote:
+        # В хранилище до фиксации записи; файл остается локальной копией
+        await storage.put_file(key, source_path, mimetypes.guess_type(path)[0])
+        await asyncio.to_thread(place_file, Path(source_path), Path(path))
+    elif key is not None:
+        await storage.put_file(key, source_path)
+    else:
+        await asyncio.to_thread(place_file, Path(source_path), Path(path))
+    return path
+
+
+async def adopt_file(db: AsyncSession, source_path: str) -> Tuple[str, str]:
+    """adopt() для готового файла (отчета): хеш считается в потоке. Возвращает (путь, sha256)"""
+    sha256 = await asyncio.to_thread(file_sha256, source_path)
+    size = await asyncio.to_thread(os.path.getsize, source_path)
+    return await adopt(db, source_path, sha256, size), sha256
+
+
+async def remove_blob_files(path: str) -> None:
+    """Удалить файл блоба: объект хранилища, локальную копию и уменьшенные копии"""
+    storage = get_storage()
+    key = blob_key(path)
+    if key is not None and storage.is_remote:
+        await storage.delete(key)
+    await remove_file(path)
+    await remove_variants(path)
+
+
+async def file_exists(path: Optional[str]) -> bool:
+    """Есть ли файл: локально или (для блобов) в хранилище"""
+    if not path:
+        return False
+    if await asyncio.to_thread(os.path.exists, path):
+        return True
+    storage = get_storage()
+    key = blob_key(path)
+    return key is not None and storage.is_remote and await storage.stat(key) is not None
+
+
+async def ensure_local(path: Optional[str]) -> bool:
+    """Скачать локальную копию блоба из хранилища, если ее нет. True — файл на диске"""
+    if not path:
+        return False
+    if await asyncio.to_thread(os.path.exists, path):
+        return True
+    storage = get_storage()
+    key = blob_key(path)
+    if key is None or not storage.is_remote:
+        return False
+    try:
+        await storage.fetch_to(key, path)
+    except Exception as e:
+        print(f"⚠️  Warning: failed to fetch {key} from storage: {e}")
+        return False
+    return True
+
+
+async def ensure_local_many(paths: Iterable[Optional[str]]) -> None:
+    """ensure_local для набора путей (вложения отчета), не более LOCAL_FETCH_CONCURRENCY одновременно"""
+    if not get_storage().is_remote:
+        return
+    unique: List[str] = list(dict.fromkeys(p for p in paths if p))
+    semaphore = asyncio.Semaphore(LOCAL_FETCH_CONCURRENCY)
+
+    async def _one(path: str) -> None:
+        async with semaphore:
+            await ensure_local(path)
+
+    await asyncio.gather(*(_one(p) for p in unique))
+
+
+async def _release(sha256: str) -> None:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256)
+            .values(ref_count=Blob.ref_count - 1)
+            .returning(Blob.ref_count, Blob.file_path)
+        )
+        row = result.first()
+        if row is not None and row.ref_count <= 0:
+            await db.execute(delete(Blob).where(Blob.sha256 == sha256))
+            await remove_blob_files(row.file_path)
+        await db.commit()
+
+
+async def discard(files: Iterable[Tuple[Optional[str], Optional[str]]]) -> None:
+    """
+    Освободить файлы [(путь, sha256)] удаленных или замененных записей.
+    Вызывается после фиксации транзакции; файлы удаляются в фоне (file_gc).
+    """
+    import file_gc
+    file_gc.enqueue(files)
+
+
+async def release(files: Iterable[Tuple[Optional[str], Optional[str]]]) -> None:
+    """Освободить ссылки сразу (обработчик очереди file_gc); ошибки не прерывают обработку"""
+    for path, sha256 in files:
+        try:
+            if sha256:
+                await _release(sha256)
+            elif path:
+                await remove_file(path)
+                await remove_variants(path)
+        except Exception as e:
+            print(f"⚠️  Warning: failed to release file {path or sha256}: {e}")
@@ -0,0 +1,179 @@
+"""
+Ограничение параллельности тяжелых эндпоинтов.
+
+Генерация отчетов, пакетные удаления, очистка и экспорт выполняются в одном
+процессе uvicorn; без ограничения одновременные тяжелые запросы вытесняют все
+остальные. Каждая группа маршрутов (reports, batch, bulk, export) получает свой
+семафор с очередью ограниченной длины:
+  - свободный слот — запрос выполняется сразу;
+  - слотов нет, но очередь не заполнена — запрос ждет (не дольше таймаута);
+  - очередь заполнена или ожидание истекло — 429 с заголовком Retry-After.
+
+Настройка через окружение (NAME — имя группы в верхнем регистре):
+  CONCURRENCY_<NAME>_LIMIT      — число одновременно выполняемых запросов;
+  CONCURRENCY_<NAME>_QUEUE      — максимальная длина очереди;
+  CONCURRENCY_QUEUE_TIMEOUT     — максимальное ожидание в очереди, сек.
+
+Метрики (активные, в очереди, время ожидания, отказы) — get_metrics().
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Any, Dict
+
+from fastapi import HTTPException
+
+# Значения по умолчанию: (одновременно, длина очереди)
+DEFAULT_LIMITS = {
+    "reports": (2, 20),
+    "batch": (1, 2),
+    "bulk": (2, 10),
+    "export": (2, 10),
+}
+QUEUE_TIMEOUT = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT", "30"))
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return max(0, int(value))
+
+
+class ConcurrencyLimiter:
+    """Семафор с ограниченной очередью и метриками"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float = QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.service_time_total = 0.0
+
+    def retry_after(self) -> int:
+        """Оценка, через сколько секунд освободится слот (по среднему времени обработки)"""
+        avg = self.service_time_total / self.completed if self.completed else 5.0
+        return max(1, math.ceil(avg * (self.waiting + 1) / self.limit))
+
+    def _reject(self, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self) -> "Slot":
+        """Занять слот (ожидая в очереди) или отказать с 429"""
+        if not self._semaphore.locked():
+            # Свободный слот: Semaphore.acquire возвращается без переключения задач
+            await self._semaphore.acquire()
+            self.active += 1
+            return Slot(self)
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise self._reject("Сервер занят: слишком много одновременных запросов, повторите позже")
+
+        started = time.monotonic()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise self._reject("Сервер занят: истекло время ожидания в очереди, повторите позже")
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        self.active += 1
+        return Slot(self)
+
+    def _release(self, started: float) -> None:
+        self.active -= 1
+        self.completed += 1
+        self.service_time_total += time.monotonic() - started
+        self._semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        admitted = self.completed + self.active
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": round(self.wait_time_total / admitted, 4) if admitted else 0.0,
+            "max_wait_seconds": round(self.wait_time_max, 4),
+            "avg_service_seconds": round(self.service_time_total / self.completed, 4) if self.completed else 0.0,
+        }
+
+
+class Slot:
+    """Занятый слот; release() можно вызывать повторно — освобождение однократное"""
+
+    def __init__(self, limiter: ConcurrencyLimiter):
+        self._limiter = limiter
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(self._started)
+
+
+_limiters: Dict[str, ConcurrencyLimiter] = {}
+
+
+def get_limiter(name: str) -> ConcurrencyLimiter:
+    """Ограничитель группы (создается при первом обращении, настройки — из окружения)"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        default_limit, default_queue = DEFAULT_LIMITS.get(name, (2, 10))
+        if name == "reports":
+            # Рендеринг упирается в пул процессов — по умолчанию столько же слотов
+            from render_pool import render_workers
+            default_limit = max(default_limit, render_workers())
+        env = name.upper()
+        limiter = ConcurrencyLimiter(
+            name,
+            _env_int(f"CONCURRENCY_{env}_LIMIT", default_limit),
+            _env_int(f"CONCURRENCY_{env}_QUEUE", default_queue),
+        )
+        _limiters[name] = limiter
+    return limiter
+
+
+def limit(name: str):
+    """
+    Зависимость FastAPI: слот группы name на время обработки запроса.
+        @app.post(..., dependencies=[Depends(limit("reports"))])
+    """
+    async def dependency():
+        slot = await get_limiter(name).acquire()
+        try:
+            yield slot
+        finally:
+            slot.release()
+    return dependency
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Метрики всех групп"""
+    return {name: get_limiter(name).metrics() for name in sorted(set(DEFAULT_LIMITS) | set(_limiters))}
@@ -0,0 +1,122 @@
+"""
+Файлы документов чек-листа (QuestionnaireDocumentFile): проверка ключа и типа
+и привязка загруженного файла к опросному листу (через blob_store).
+
+Используется обычной загрузкой (POST .../documents/{n}/upload) и
+возобновляемой загрузкой по частям (upload_sessions_api).
+"""
+import re
+import uuid as uuid_lib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import blob_store
+import image_derivatives
+from models import QuestionnaireDocumentFile
+
+ALLOWED_DOCUMENT_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'application/pdf']
+
+
+def validate_document_number(document_number: str) -> None:
+    """
+    Номер/ключ документа:
+    - основной список (1..17) — "Перечень рассмотренных документов";
+    - любые "безопасные" ключи для прочих вложений чек-листа:
+      factory_plate_photo, control_scheme_image, photo_1, scheme_2025_12 и т.п.
+    """
+    allowed_numbers = {str(i) for i in range(1, 18)}
+    if document_number in allowed_numbers:
+        return
+    # безопасный ключ: латиница/цифры/подчерк/дефис, 1..64 символа
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", document_number):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid document key. Use 1..17 or a safe key like factory_plate_photo/control_scheme_image/photo_1",
+        )
+
+
+def validate_document_type(content_type: Optional[str]) -> None:
+    """Только изображения и PDF"""
+    if content_type not in ALLOWED_DOCUMENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_DOCUMENT_TYPES)}"
+        )
+
+
+def document_file_extension(content_type: Optional[str], file_name: Optional[str]) -> str:
+    """Расширение файла документа по MIME типу (для имени блоба)"""
+    if content_type == 'application/pdf':
+        return '.pdf'
+    if content_type and 'image' in content_type:
+        return '.jpg' if 'jpeg' in content_type or 'jpg' in content_type else '.png'
+    return Path(file_name).suffix if file_name else '.bin'
+
+
+async def attach_document_file(
+    db: AsyncSession,
+    questionnaire_id: uuid_lib.UUID,
+    document_number: str,
+    source_path: str,
+    sha256: str,
+    file_size: int,
+    file_name: str,
+    mime_type: Optional[str],
+    uploaded_by: Optional[uuid_lib.UUID],
+) -> QuestionnaireDocumentFile:
+    """
+    Записать загруженный файл (source_path) как документ опросного листа,
+    заменив прежний файл этого документа. Файл переносится в blob_store
+    (одинаковое содержимое хранится один раз); ссылка на прежний блоб
+    освобождается после фиксации замены в БД. Для изображений в фоне
+    строятся уменьшенные копии (image_derivatives).
+    """
+    old_file_result = await db.execute(
+        select(QuestionnaireDocumentFile).where(
+            QuestionnaireDocumentFile.questionnaire_id == questionnaire_id,
+            QuestionnaireDocumentFile.document_number == document_number
+        )
+    )
+    old_file = old_file_result.scalar_one_or_none()
+    old_ref = (old_file.file_path, old_file.blob_sha256) if old_file else None
+    if old_file:
+        await db.execute(delete(QuestionnaireDocumentFile).where(QuestionnaireDocumentFile.id == old_file.id))
+
+    stored_path = await blob_store.adopt(
+        db, source_path, sha256, file_size, extension=document_file_extension(mime_type, file_name)
+    )
+    new_file = QuestionnaireDocumentFile(
+        questionnaire_id=questionnaire_id,
+        document_number=document_number,
+        file_name=file_name,
+        file_path=stored_path,
+        file_size=file_size,
+        file_type=mime_type.split('/')[0] if mime_type else None,  # image или application
+        mime_type=mime_type,
+        blob_sha256=sha256,
+        uploaded_by=uploaded_by
+    )
+    db.add(new_file)
+    await db.commit()
+    await db.refresh(new_file)
+    image_derivatives.schedule(new_file.file_path, mime_type)
+    if old_ref:
+        await blob_store.discard([old_ref])
+    return new_file
+
+
+def document_file_to_dict(document_file: QuestionnaireDocumentFile) -> Dict[str, Any]:
+    return {
+        "id": str(document_file.id),
+        "questionnaire_id": str(document_file.questionnaire_id),
+        "document_number": document_file.document_number,
+        "file_name": document_file.file_name,
+        "file_size": document_file.file_size,
+        "file_type": document_file.file_type,
+        "mime_type": document_file.mime_type,
+        "created_at": document_file.created_at.isoformat() if document_file.created_at else None
+    }
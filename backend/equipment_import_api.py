@@ -0,0 +1,419 @@
+"""
+Массовый импорт оборудования из CSV/XLSX.
+
+POST /api/equipment/import (multipart, поле file) заменяет тысячи вызовов
+POST /api/equipment при первичном наполнении справочника:
+
+  1. файл читается потоково (csv.reader поверх загрузки, openpyxl в режиме
+     read_only для XLSX) в отдельном потоке, строки проверяются сразу:
+     обязательное наименование, тип оборудования и цех — по справочникам,
+     загруженным в память одним запросом (id, код или наименование), дата
+     ввода в эксплуатацию, повтор кода оборудования в файле;
+  2. корректные строки грузятся через COPY во временную таблицу
+     (ON COMMIT DROP) и сливаются в equipment одним
+     INSERT ... SELECT ... ON CONFLICT (equipment_code): новое оборудование
+     создается, существующее с тем же кодом — обновляется (пустые ячейки не
+     затирают значения, прочие колонки дополняют attributes);
+  3. ответ — сколько создано/обновлено/пропущено и ошибки по номерам строк.
+
+Колонки (заголовок — первая строка, русские или английские названия):
+equipment_code, name, type, workshop, serial_number, location,
+commissioning_date; остальные колонки попадают в attributes. Строки без кода
+получают код как у триггера generate_equipment_code ("EQ-" + начало id).
+
+Параметры: update_existing=false — существующий код не обновляется (строка
+пропускается); strict=true — при любой ошибке ничего не загружается;
+dry_run=true — проверка и подсчет без записи; encoding — кодировка CSV (по
+умолчанию UTF-8, для файла не в UTF-8 — cp1251). Для XLSX нужен пакет openpyxl.
+"""
+import asyncio
+import codecs
+import csv
+import functools
+import json
+import os
+import uuid as uuid_lib
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import verify_token
+from concurrency import limit
+from database import get_db
+from models import EquipmentType, User, Workshop
+from upload_storage import MAX_UPLOAD_BYTES
+
+router = APIRouter(prefix="/api/equipment", tags=["equipment-import"])
+
+IMPORT_ROLES = ("admin", "chief_operator", "operator")
+IMPORT_MAX_ROWS = int(os.getenv("EQUIPMENT_IMPORT_MAX_ROWS", "200000"))
+# Сколько ошибок возвращать в ответе (error_count — всегда полное число)
+IMPORT_MAX_ERRORS = int(os.getenv("EQUIPMENT_IMPORT_MAX_ERRORS", "1000"))
+
+# Заголовок колонки (в нижнем регистре) -> поле
+COLUMN_ALIASES = {
+    "equipment_code": ("equipment_code", "code", "код", "код оборудования"),
+    "name": ("name", "наименование", "название", "наименование оборудования"),
+    "type": ("type", "type_id", "type_code", "equipment_type", "тип", "тип оборудования"),
+    "workshop": ("workshop", "workshop_id", "workshop_code", "цех"),
+    "serial_number": ("serial_number", "serial", "заводской номер", "зав. №", "серийный номер"),
+    "location": ("location", "расположение", "место расположения"),
+    "commissioning_date": ("commissioning_date", "дата ввода в эксплуатацию", "ввод в эксплуатацию"),
+}
+_FIELD_BY_HEADER = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+# Длины строковых колонок equipment
+_MAX_LENGTHS = {"equipment_code": 100, "name": 255, "serial_number": 100, "location": 500}
+
+_STAGING_COLUMNS = (
+    "row_no", "id", "equipment_code", "type_id", "workshop_id", "name",
+    "serial_number", "location", "commissioning_date", "attributes",
+)
+
+_CREATE_STAGING_SQL = """
+CREATE TEMP TABLE equipment_import_staging (
+    row_no integer NOT NULL,
+    id uuid NOT NULL,
+    equipment_code varchar(100) NOT NULL,
+    type_id uuid,
+    workshop_id uuid,
+    name varchar(255) NOT NULL,
+    serial_number varchar(100),
+    location varchar(500),
+    commissioning_date date,
+    attributes jsonb NOT NULL
+) ON COMMIT DROP
+"""
+
+# Сгенерированный код (строка без кода) совпал с существующим — строка
+# пропускается, а не обновляет чужое оборудование
+_MERGE_SQL = """
+INSERT INTO equipment (
+    id, equipment_code, type_id, workshop_id, name, serial_number, location,
+    commissioning_date, attributes, is_active, created_at
+)
+SELECT id, equipment_code, type_id, workshop_id, name, serial_number, location,
+       commissioning_date, attributes, 1, now()
+FROM equipment_import_staging
+ORDER BY row_no
+ON CONFLICT (equipment_code) DO {action}
+RETURNING (xmax = 0) AS inserted
+"""
+
+_MERGE_UPDATE = """UPDATE SET
+    name = EXCLUDED.name,
+    type_id = COALESCE(EXCLUDED.type_id, equipment.type_id),
+    workshop_id = COALESCE(EXCLUDED.workshop_id, equipment.workshop_id),
+    serial_number = COALESCE(EXCLUDED.serial_number, equipment.serial_number),
+    location = COALESCE(EXCLUDED.location, equipment.location),
+    commissioning_date = COALESCE(EXCLUDED.commissioning_date, equipment.commissioning_date),
+    attributes = COALESCE(equipment.attributes, '{}'::jsonb) || EXCLUDED.attributes,
+    updated_at = now()
+WHERE EXCLUDED.equipment_code <> 'EQ-' || UPPER(SUBSTRING(EXCLUDED.id::text FROM 1 FOR 8))"""
+
+
+def generated_code(equipment_id: uuid_lib.UUID) -> str:
+    """Код оборудования как у триггера generate_equipment_code"""
+    return f"EQ-{str(equipment_id)[:8].upper()}"
+
+
+class _Lookup:
+    """Справочник в памяти: поиск по id, коду или наименованию (без учета регистра)"""
+
+    def __init__(self, label: str, rows):
+        self.label = label
+        self.ids = set()
+        self.by_key: Dict[str, Optional[uuid_lib.UUID]] = {}
+        by_name: Dict[str, Optional[uuid_lib.UUID]] = {}
+        for row_id, code, name in rows:
+            self.ids.add(row_id)
+            if code:
+                key = str(code).strip().lower()
+                # None — неоднозначно (один код у нескольких записей)
+                self.by_key[key] = None if key in self.by_key and self.by_key[key] != row_id else row_id
+            if name:
+                key = str(name).strip().lower()
+                by_name[key] = None if key in by_name and by_name[key] != row_id else row_id
+        for key, row_id in by_name.items():
+            self.by_key.setdefault(key, row_id)
+
+    def resolve(self, value: str) -> Tuple[Optional[uuid_lib.UUID], Optional[str]]:
+        """(id, ошибка)"""
+        try:
+            row_id = uuid_lib.UUID(value)
+        except ValueError:
+            pass
+        else:
+            if row_id in self.ids:
+                return row_id, None
+            return None, f"{self.label} с id {value} не найден"
+        key = value.lower()
+        if key not in self.by_key:
+            return None, f"{self.label} «{value}» не найден"
+        row_id = self.by_key[key]
+        if row_id is None:
+            return None, f"{self.label} «{value}» неоднозначен — укажите id или код"
+        return row_id, None
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, float) and value.is_integer():
+        # Числовые ячейки XLSX (коды, номера) без ".0"
+        return str(int(value))
+    return value
+
+
+def _parse_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value)
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+
+
+def _detect_encoding(stream) -> str:
+    """
+    UTF-8, если весь файл корректен в UTF-8, иначе cp1251 (Excel в русской
+    локали сохраняет CSV в этой кодировке). Проверка — проход по файлу без
+    загрузки в память, поток возвращается в начало.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1251"
+    finally:
+        stream.seek(0)
+
+
+def _iter_csv(stream, encoding: Optional[str] = None) -> Iterator[List[Any]]:
+    # Без errors="replace": неверная кодировка — ошибка чтения файла, а не «�» в базе
+    reader = codecs.getreader(encoding or _detect_encoding(stream))(stream)
+    # Разделитель — по первой строке (Excel в русской локали сохраняет CSV через ";")
+    first_line = reader.readline()
+    delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+    yield from csv.reader([first_line], delimiter=delimiter)
+    yield from csv.reader(reader, delimiter=delimiter)
+
+
+def _iter_xlsx(stream) -> Iterator[List[Any]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def _parse_file(
+    rows: Iterator[List[Any]],
+    types: _Lookup,
+    workshops: _Lookup,
+) -> Tuple[List[tuple], List[Dict[str, Any]], int]:
+    """
+    Проверка строк файла: записи для COPY (в порядке _STAGING_COLUMNS),
+    ошибки по строкам и число строк данных. Номер строки — как в файле
+    (заголовок — строка 1).
+    """
+    header = next(rows, None)
+    if not header:
+        raise HTTPException(status_code=400, detail="Файл пуст")
+    columns: List[Tuple[str, bool]] = []
+    for value in header:
+        title = str(value).strip() if value is not None else ""
+        field = _FIELD_BY_HEADER.get(title.lower())
+        columns.append((field, False) if field else (title, True))
+    if "name" not in {field for field, extra in columns if not extra}:
+        raise HTTPException(status_code=400, detail="В файле нет колонки name (наименование)")
+
+    records: List[tuple] = []
+    errors: List[Dict[str, Any]] = []
+    seen_codes: Dict[str, int] = {}
+    total = 0
+    for row_no, row in enumerate(rows, start=2):
+        values: Dict[str, Any] = {}
+        attributes: Dict[str, Any] = {}
+        for (field, extra), value in zip(columns, row):
+            value = _cell(value)
+            if value is None or not field:
+                continue
+            if extra:
+                attributes[field] = value if isinstance(value, (int, float, bool)) else str(value)
+            else:
+                values[field] = value
+        if not values and not attributes:
+            continue
+        total += 1
+        if total > IMPORT_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Слишком много строк (максимум {IMPORT_MAX_ROWS})")
+
+        row_errors: List[str] = []
+        for field in ("equipment_code", "name", "serial_number", "location"):
+            if field in values:
+                values[field] = str(values[field])
+                if len(values[field]) > _MAX_LENGTHS[field]:
+                    row_errors.append(f"{field}: длиннее {_MAX_LENGTHS[field]} символов")
+        code = values.get("equipment_code")
+        if not values.get("name"):
+            row_errors.append("не указано наименование")
+        if code:
+            if code in seen_codes:
+                row_errors.append(f"код {code} повторяет строку {seen_codes[code]}")
+            else:
+                seen_codes[code] = row_no
+        type_id = workshop_id = commissioning_date = None
+        if "type" in values:
+            type_id, error = types.resolve(str(values["type"]))
+            if error:
+                row_errors.append(error)
+        if "workshop" in values:
+            workshop_id, error = workshops.resolve(str(values["workshop"]))
+            if error:
+                row_errors.append(error)
+        if "commissioning_date" in values:
+            try:
+                commissioning_date = _parse_date(values["commissioning_date"])
+            except (TypeError, ValueError):
+                row_errors.append(f"неверная дата ввода в эксплуатацию: {values['commissioning_date']}")
+
+        if row_errors:
+            errors.append({"row": row_no, "equipment_code": code, "errors": row_errors})
+            continue
+        equipment_id = uuid_lib.uuid4()
+        records.append((
+            row_no,
+            equipment_id,
+            code or generated_code(equipment_id),
+            type_id,
+            workshop_id,
+            values["name"],
+            values.get("serial_number"),
+            values.get("location"),
+            commissioning_date,
+            json.dumps(attributes, ensure_ascii=False, default=str),
+        ))
+    return records, errors, total
+
+
+async def _load_lookups(db: AsyncSession) -> Tuple[_Lookup, _Lookup]:
+    types = (await db.execute(select(EquipmentType.id, EquipmentType.code, EquipmentType.name))).all()
+    workshops = (await db.execute(select(Workshop.id, Workshop.code, Workshop.name))).all()
+    return _Lookup("Тип оборудования", types), _Lookup("Цех", workshops)
+
+
+async def _copy_and_merge(db: AsyncSession, records: List[tuple], update_existing: bool) -> Tuple[int, int]:
+    """COPY во временную таблицу и слияние в equipment: (создано, обновлено)"""
+    await db.execute(text(_CREATE_STAGING_SQL))
+    raw = await (await db.connection()).get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        "equipment_import_staging", records=records, columns=_STAGING_COLUMNS
+    )
+    action = _MERGE_UPDATE if update_existing else "NOTHING"
+    result = await db.execute(text(_MERGE_SQL.format(action=action)))
+    flags = result.scalars().all()
+    created = sum(1 for inserted in flags if inserted)
+    return created, len(flags) - created
+
+
+@router.post("/import", dependencies=[Depends(limit("bulk"))])
+async def import_equipment(
+    file: UploadFile = File(...),
+    update_existing: bool = True,
+    strict: bool = False,
+    dry_run: bool = False,
+    encoding: Optional[str] = None,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    """Импорт оборудования из CSV/XLSX (см. описание модуля)"""
+    try:
+        user = (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if user.role not in IMPORT_ROLES:
+            raise HTTPException(status_code=403, detail="Недостаточно прав для импорта оборудования")
+
+        if file.size is not None and MAX_UPLOAD_BYTES and file.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Файл слишком большой (максимум {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ)",
+            )
+        extension = os.path.splitext(file.filename or "")[1].lower()
+        if extension in (".csv", ".txt"):
+            rows = functools.partial(_iter_csv, encoding=encoding)
+        elif extension == ".xlsx":
+            try:
+                import openpyxl  # noqa: F401
+            except ImportError:
+                raise HTTPException(status_code=501, detail="Импорт XLSX недоступен: не установлен openpyxl")
+            rows = _iter_xlsx
+        else:
+            raise HTTPException(status_code=400, detail="Поддерживаются файлы .csv и .xlsx")
+        if encoding:
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                raise HTTPException(status_code=400, detail=f"Неизвестная кодировка: {encoding}")
+
+        types, workshops = await _load_lookups(db)
+        try:
+            records, errors, total = await asyncio.to_thread(
+                lambda: _parse_file(rows(file.file), types, workshops)
+            )
+        except HTTPException:
+            raise
+        except UnicodeDecodeError:
+            if encoding:
+                raise HTTPException(status_code=400, detail=f"Файл не в кодировке {encoding}")
+            raise HTTPException(
+                status_code=400,
+                detail="Не удалось определить кодировку файла — сохраните CSV в UTF-8 или укажите параметр encoding",
+            )
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Не удалось прочитать файл: {e}")
+
+        created = updated = 0
+        if records and not (strict and errors):
+            created, updated = await _copy_and_merge(db, records, update_existing)
+            if dry_run:
+                await db.rollback()
+            else:
+                await db.commit()
+                print(f"📥 Импорт оборудования ({username}): создано {created}, обновлено {updated}, ошибок {len(errors)}")
+
+        loaded = created + updated
+        return {
+            "total_rows": total,
+            "created": created,
+            "updated": updated,
+            # Корректные строки, не записанные в базу: существующий код при
+            # update_existing=false, strict-режим с ошибками
+            "skipped": len(records) - loaded,
+            "error_count": len(errors),
+            "errors": errors[:IMPORT_MAX_ERRORS],
+            "dry_run": dry_run,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to import equipment: {str(e)}")
@@ -0,0 +1,264 @@
+"""
+Отдача файлов (отчеты, файлы документов чек-листа, сканы) с поддержкой HTTP
+кэширования и докачки.
+
+  - ETag и Last-Modified: для файлов blob_store ETag — SHA-256 содержимого,
+    для прочих — по времени изменения и размеру; If-None-Match /
+    If-Modified-Since — ответ 304 без тела;
+  - Range: один диапазон bytes=a-b / a- / -n — ответ 206 (докачка PDF и фото
+    на мобильном, постраничная загрузка PDF в браузере), с учетом If-Range;
+    недопустимый диапазон — 416; несколько диапазонов — файл целиком;
+  - FILE_ACCEL_REDIRECT=1 — тело отдает nginx (sendfile): Python проверяет
+    права и возвращает заголовок X-Accel-Redirect с внутренним URI файла.
+    Только для запросов, пришедших через nginx (он передает заголовок
+    X-Sendfile-Type: X-Accel-Redirect); прямые запросы на :8000 получают файл
+    как обычно. Соответствие каталогов внутренним location задается
+    FILE_ACCEL_LOCATIONS ("каталог=URI" через запятую, см. nginx/default.conf).
+    Файлы вне этих каталогов отдаются как обычно;
+  - блобы во внешнем хранилище (STORAGE_BACKEND=s3, см. storage): редирект 307
+    на подписанную ссылку либо поток из хранилища (с Range), если локальной
+    копии нет.
+"""
+import asyncio
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+import blob_store
+from storage import get_storage
+
+RANGE_CHUNK_SIZE = 256 * 1024
+
+FILE_ACCEL_REDIRECT = os.getenv("FILE_ACCEL_REDIRECT", "0").strip().lower() in ("1", "true", "yes", "on")
+FILE_ACCEL_LOCATIONS = os.getenv(
+    "FILE_ACCEL_LOCATIONS",
+    "/app/uploads=/_protected/uploads,/app/reports=/_protected/reports",
+)
+
+
+def _accel_locations() -> List[Tuple[str, str]]:
+    locations = []
+    for item in FILE_ACCEL_LOCATIONS.split(","):
+        if "=" not in item:
+            continue
+        directory, uri = item.split("=", 1)
+        locations.append((os.path.abspath(directory.strip()), uri.strip().rstrip("/")))
+    return locations
+
+
+_ACCEL_LOCATIONS = _accel_locations()
+
+
+def _accel_uri(path: str) -> Optional[str]:
+    """Внутренний URI nginx для файла или None, если каталог не опубликован"""
+    full = os.path.abspath(path)
+    for directory, uri in _ACCEL_LOCATIONS:
+        if full.startswith(directory + os.sep):
+            relative = os.path.relpath(full, directory).replace(os.sep, "/")
+            return f"{uri}/{quote(relative)}"
+    return None
+
+
+def content_disposition(filename: str, inline: bool = False) -> str:
+    """Content-Disposition; имена не в ASCII (кириллица) — через filename* (RFC 6266)"""
+    disposition = "inline" if inline else "attachment"
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Слабое сравнение для If-None-Match"""
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def _is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    return bool(if_modified_since) and _not_modified_since(if_modified_since, mtime)
+
+
+def _range_applies(request: Request, etag: str, last_modified: str) -> bool:
+    """If-Range: диапазон отдается, только если файл не изменился (иначе — целиком)"""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return if_range == last_modified
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный диапазон лежит за концом файла"""
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (начало, конец включительно) для заголовка Range с одним диапазоном.
+    None — заголовок не поддерживается (отдается весь файл).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.partition("-"))
+    if not sep or not (first.isdigit() or last.isdigit()):
+        return None
+    if (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # bytes=-n — последние n байт
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+async def _iter_range(path: str, start: int, end: int):
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def _respond(
+    request: Request,
+    size: int,
+    mtime: float,
+    media_type: str,
+    filename: Optional[str],
+    inline: bool,
+    etag: str,
+    read_range: Callable[[int, int], AsyncIterator[bytes]],
+    full_response: Callable[[Dict[str, str]], Response],
+    local_path: Optional[str] = None,
+) -> Response:
+    """Проверка валидаторов, X-Accel-Redirect, Range — общее для локальных файлов и хранилища"""
+    etag = f'"{etag}"'
+    last_modified = formatdate(mtime, usegmt=True)
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": "private, no-cache",
+        "Accept-Ranges": "bytes",
+    }
+
+    if _is_not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+
+    if filename:
+        headers["Content-Disposition"] = content_disposition(filename, inline)
+    elif inline:
+        headers["Content-Disposition"] = "inline"
+
+    if local_path and FILE_ACCEL_REDIRECT and request.headers.get("x-sendfile-type", "").lower() == "x-accel-redirect":
+        internal_uri = _accel_uri(local_path)
+        if internal_uri:
+            # Тело (и Range) отдаст nginx; Content-Type/Disposition он возьмет из этого ответа
+            headers["X-Accel-Redirect"] = internal_uri
+            return Response(headers=headers, media_type=media_type)
+
+    range_header = request.headers.get("range")
+    if range_header and _range_applies(request, etag, last_modified):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(read_range(start, end), status_code=206, media_type=media_type, headers=headers)
+
+    return full_response(headers)
+
+
+def _default_etag(mtime_ns: int, size: int) -> str:
+    return hashlib.md5(f"{mtime_ns}-{size}".encode(), usedforsecurity=False).hexdigest()
+
+
+async def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    filename: Optional[str] = None,
+    inline: bool = False,
+    etag: Optional[str] = None,
+) -> Response:
+    """
+    Ответ с файлом path (см. описание модуля). etag — стабильный идентификатор
+    содержимого (SHA-256 блоба и т.п.); без него ETag считается по mtime и размеру.
+    Блобы во внешнем хранилище (storage) отдаются редиректом на подписанную
+    ссылку, локальной копией или потоком из хранилища.
+    """
+    storage = get_storage()
+    key = blob_store.blob_key(path) if storage.is_remote else None
+    if key is not None:
+        url = await storage.download_url(key, filename or os.path.basename(path), media_type, inline)
+        if url:
+            return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+        if not await asyncio.to_thread(os.path.exists, path):
+            obj = await storage.stat(key)
+            if obj is None:
+                raise HTTPException(status_code=404, detail="File not found in storage")
+
+            def _full_remote(headers: Dict[str, str]) -> Response:
+                headers["Content-Length"] = str(obj.size)
+                return StreamingResponse(storage.iter_range(key), media_type=media_type, headers=headers)
+
+            mtime = obj.modified.timestamp()
+            return _respond(
+                request, obj.size, mtime, media_type, filename, inline,
+                etag or _default_etag(int(mtime * 1e9), obj.size),
+                lambda start, end: storage.iter_range(key, start, end),
+                _full_remote,
+            )
+
+    stat = await asyncio.to_thread(os.stat, path)
+    return _respond(
+        request, stat.st_size, stat.st_mtime, media_type, filename, inline,
+        etag or _default_etag(stat.st_mtime_ns, stat.st_size),
+        lambda start, end: _iter_range(path, start, end),
+        lambda headers: FileResponse(path, media_type=media_type, headers=headers, stat_result=stat),
+        local_path=path,
+    )
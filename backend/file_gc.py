@@ -0,0 +1,384 @@
+"""
+Фоновое удаление файлов и сборка мусора в /app/reports и /app/uploads.
+
+Очередь удаления. Обработчики запросов файлы не удаляют: после фиксации
+удаления/замены записи они ставят файл в очередь (blob_store.discard ->
+enqueue). Фоновый обработчик освобождает ссылки пачками по FILE_GC_BATCH_SIZE
+и не быстрее FILE_GC_DELETE_RATE файлов в секунду, поэтому массовые удаления
+(очистка инспекций, пакетное удаление отчетов) не нагружают диск в запросе.
+Очередь живет в памяти процесса: потерянные при перезапуске элементы
+подберет сверка.
+
+Сверка (collect_orphans, раз в FILE_GC_INTERVAL секунд). Файлы, на которые
+нет ссылок в БД, остаются после упавшего рендеринга, оборванного запроса или
+сбоя между фиксацией и освобождением. Сверка:
+  - удаляет блобы (строки blobs и файлы), на которые не ссылается ни одна
+    запись, независимо от счетчика ссылок;
+  - обходит FILE_GC_ROOTS и удаляет файлы, путей которых нет в БД (и уменьшенные
+    копии изображений, исходных файлов которых больше нет);
+  - при хранилище S3 удаляет локальные копии блобов, не использовавшиеся
+    дольше BLOB_CACHE_TTL_HOURS (объект в хранилище остается).
+Файлы и блобы моложе FILE_GC_GRACE_HOURS не трогаются (идущие загрузки и
+рендеринг); перед удалением каждая пачка перепроверяется по БД. Кэши
+(приложения, фрагменты, предпросмотр) и части возобновляемых загрузок
+чистятся своими механизмами и пропускаются. FILE_GC_DRY_RUN=1 — только отчет
+о найденном. При нескольких репликах сверку выполняет одна (advisory lock).
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, exists, not_, or_, select, text
+
+import blob_store
+from database import AsyncSessionLocal, engine
+from image_derivatives import IMAGE_DERIVATIVES_DIR, derivative_key
+from models import (
+    Blob,
+    Certification,
+    InspectionHistory,
+    Questionnaire,
+    QuestionnaireDocumentFile,
+    RegulatoryDocument,
+    Report,
+    VerificationEquipment,
+    VerificationHistory,
+)
+from storage import get_storage
+
+
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+FILE_GC_ROOTS = [Path(p.strip()) for p in os.getenv("FILE_GC_ROOTS", "/app/reports,/app/uploads").split(",") if p.strip()]
+FILE_GC_INTERVAL = float(os.getenv("FILE_GC_INTERVAL", str(6 * 3600)))
+FILE_GC_GRACE = timedelta(hours=float(os.getenv("FILE_GC_GRACE_HOURS", "24")))
+FILE_GC_BATCH_SIZE = max(1, int(os.getenv("FILE_GC_BATCH_SIZE", "200")))
+FILE_GC_DELETE_RATE = float(os.getenv("FILE_GC_DELETE_RATE", "50"))
+FILE_GC_DRY_RUN = _env_flag("FILE_GC_DRY_RUN")
+# S3: локальные копии блобов, к которым не обращались дольше, удаляются (скачаются снова)
+BLOB_CACHE_TTL = timedelta(hours=float(os.getenv("BLOB_CACHE_TTL_HOURS", "72")))
+
+# Ключ pg_advisory_lock: сверку выполняет только одна реплика
+_GC_LOCK_KEY = 0x46494C45
+
+# Колонки с путями к файлам
+_PATH_COLUMNS = (
+    Blob.file_path,
+    Report.file_path,
+    Report.word_file_path,
+    Questionnaire.file_path,
+    Questionnaire.word_file_path,
+    QuestionnaireDocumentFile.file_path,
+    Certification.scan_file_path,
+    VerificationEquipment.scan_file_path,
+    VerificationHistory.scan_file_path,
+    RegulatoryDocument.file_path,
+    InspectionHistory.report_path,
+    InspectionHistory.word_report_path,
+)
+
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+_last_run: Optional[Dict[str, Any]] = None
+
+
+# ---------- Очередь удаления ----------
+
+def _get_queue() -> asyncio.Queue:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    return _queue
+
+
+async def _throttle(count: int) -> None:
+    if FILE_GC_DELETE_RATE > 0 and count:
+        await asyncio.sleep(count / FILE_GC_DELETE_RATE)
+
+
+async def _deletion_worker() -> None:
+    queue = _get_queue()
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < FILE_GC_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
+        try:
+            await blob_store.release(batch)
+        finally:
+            for _ in batch:
+                queue.task_done()
+        await _throttle(len(batch))
+
+
+def enqueue(files: Iterable[Tuple[Optional[str], Optional[str]]]) -> None:
+    """Поставить файлы [(путь, sha256)] в очередь освобождения (см. blob_store.release)"""
+    global _worker
+    queue = _get_queue()
+    for path, sha256 in files:
+        if path or sha256:
+            queue.put_nowait((path, sha256))
+    if _worker is None or _worker.done():
+        _worker = asyncio.create_task(_deletion_worker())
+
+
+async def drain(timeout: float = 10.0) -> None:
+    """Дождаться обработки очереди (при остановке приложения)"""
+    if _queue is None or _worker is None or _worker.done():
+        return
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"⚠️  Warning: file deletion queue not drained, {_queue.qsize()} item(s) left for GC")
+
+
+def stop() -> None:
+    if _worker is not None:
+        _worker.cancel()
+
+
+# ---------- Сверка с БД ----------
+
+def _blob_unreferenced():
+    """Условие: на блоб не ссылается ни одна запись"""
+    return and_(
+        not_(exists().where(QuestionnaireDocumentFile.blob_sha256 == Blob.sha256)),
+        not_(exists().where(Certification.scan_blob_sha256 == Blob.sha256)),
+        not_(exists().where(VerificationEquipment.scan_blob_sha256 == Blob.sha256)),
+        not_(exists().where(or_(Report.blob_sha256 == Blob.sha256, Report.word_blob_sha256 == Blob.sha256))),
+        not_(exists().where(or_(Questionnaire.blob_sha256 == Blob.sha256, Questionnaire.word_blob_sha256 == Blob.sha256))),
+    )
+
+
+async def _collect_orphan_blobs(cutoff: datetime, dry_run: bool, stats: Dict[str, Any]) -> None:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Blob.sha256, Blob.size).where(Blob.last_referenced_at < cutoff, _blob_unreferenced())
+        )
+        orphans = result.all()
+    stats["orphan_blobs"] = len(orphans)
+    stats["orphan_blob_bytes"] = sum(int(size or 0) for _, size in orphans)
+    if dry_run:
+        stats["samples"].extend(sha for sha, _ in orphans[:10])
+        return
+
+    for start in range(0, len(orphans), FILE_GC_BATCH_SIZE):
+        batch = [sha for sha, _ in orphans[start:start + FILE_GC_BATCH_SIZE]]
+        async with AsyncSessionLocal() as db:
+            # Условия проверяются заново: блоб мог получить ссылку после выборки
+            result = await db.execute(
+                delete(Blob)
+                .where(Blob.sha256.in_(batch), Blob.last_referenced_at < cutoff, _blob_unreferenced())
+                .returning(Blob.file_path)
+                .execution_options(synchronize_session=False)
+            )
+            paths = [row[0] for row in result.all()]
+            # Файлы удаляются до фиксации, под блокировкой строк (как в blob_store.release)
+            for path in paths:
+                await blob_store.remove_blob_files(path)
+            await db.commit()
+        stats["deleted_blobs"] += len(paths)
+        await _throttle(len(paths))
+
+
+async def _referenced_paths() -> Set[str]:
+    referenced: Set[str] = set()
+    async with AsyncSessionLocal() as db:
+        for column in _PATH_COLUMNS:
+            result = await db.stream(select(column).where(column.is_not(None)).execution_options(yield_per=1000))
+            async for path in result.scalars():
+                if path:
+                    referenced.add(os.path.abspath(path))
+    return referenced
+
+
+async def _still_referenced(paths: List[str]) -> Set[str]:
+    """Какие из путей успели появиться в БД после начала сверки"""
+    found: Set[str] = set()
+    async with AsyncSessionLocal() as db:
+        for column in _PATH_COLUMNS:
+            result = await db.execute(select(column).where(column.in_(paths)))
+            found.update(p for p in result.scalars().all() if p)
+    return {os.path.abspath(p) for p in found}
+
+
+def _excluded_dirs() -> List[str]:
+    """Каталоги с собственной очисткой"""
+    from appendix_bundles import APPENDIX_CACHE_DIR
+    from report_fragments import FRAGMENT_CACHE_DIR
+    from report_preview import PREVIEW_CACHE_DIR
+    from upload_sessions_api import UPLOAD_SESSION_DIR
+    return [
+        os.path.abspath(d)
+        for d in (APPENDIX_CACHE_DIR, FRAGMENT_CACHE_DIR, PREVIEW_CACHE_DIR, UPLOAD_SESSION_DIR)
+    ]
+
+
+def _scan_orphans(referenced: Set[str], derivative_keys: Set[str], threshold: float) -> Tuple[int, List[Tuple[str, int]]]:
+    """Обход FILE_GC_ROOTS: (просмотрено файлов, [(путь, размер)] файлов без ссылок старше threshold)"""
+    excluded = _excluded_dirs()
+    derivatives_dir = os.path.abspath(IMAGE_DERIVATIVES_DIR)
+    scanned = 0
+    orphans: List[Tuple[str, int]] = []
+    seen_roots: Set[str] = set()
+    for root in FILE_GC_ROOTS:
+        root = os.path.abspath(root)
+        if root in seen_roots or not os.path.isdir(root):
+            continue
+        seen_roots.add(root)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) not in excluded]
+            in_derivatives = dirpath == derivatives_dir or dirpath.startswith(derivatives_dir + os.sep)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name == ".gitkeep":
+                    continue
+                scanned += 1
+                if in_derivatives:
+                    if name.split("_", 1)[0] in derivative_keys:
+                        continue
+                elif path in referenced:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_mtime < threshold:
+                    orphans.append((path, st.st_size))
+    return scanned, orphans
+
+
+def _unlink_if_old(path: str, threshold: float) -> int:
+    """Удалить файл, если он не изменялся с начала сверки; вернуть освобожденные байты"""
+    try:
+        st = os.stat(path)
+        if st.st_mtime >= threshold:
+            return -1
+        os.unlink(path)
+        return st.st_size
+    except FileNotFoundError:
+        return -1
+
+
+async def _collect_orphan_files(cutoff: datetime, dry_run: bool, stats: Dict[str, Any]) -> None:
+    referenced = await _referenced_paths()
+    async with AsyncSessionLocal() as db:
+        blob_keys = set((await db.execute(select(Blob.sha256))).scalars().all())
+    derivative_keys = blob_keys | {derivative_key(p) for p in referenced}
+
+    threshold = cutoff.timestamp()
+    scanned, orphans = await asyncio.to_thread(_scan_orphans, referenced, derivative_keys, threshold)
+    stats["scanned_files"] = scanned
+    stats["orphan_files"] = len(orphans)
+    stats["orphan_file_bytes"] = sum(size for _, size in orphans)
+    if dry_run:
+        stats["samples"].extend(path for path, _ in orphans[:20])
+        return
+
+    for start in range(0, len(orphans), FILE_GC_BATCH_SIZE):
+        batch = [path for path, _ in orphans[start:start + FILE_GC_BATCH_SIZE]]
+        alive = await _still_referenced(batch)
+        deleted = 0
+        for path in batch:
+            if path in alive:
+                continue
+            freed = await asyncio.to_thread(_unlink_if_old, path, threshold)
+            if freed >= 0:
+                deleted += 1
+                stats["freed_bytes"] += freed
+        stats["deleted_files"] += deleted
+        await _throttle(deleted)
+
+
+def _evict_cache(threshold: float, dry_run: bool) -> Tuple[int, int]:
+    """Локальные копии блобов без обращений с threshold: (число, байты)"""
+    count = freed = 0
+    for dirpath, dirnames, filenames in os.walk(blob_store.BLOB_STORE_DIR):
+        dirnames[:] = [d for d in dirnames if d != ".incoming"]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+                if max(st.st_atime, st.st_mtime) >= threshold:
+                    continue
+                if not dry_run:
+                    os.unlink(path)
+            except OSError:
+                continue
+            count += 1
+            freed += st.st_size
+    return count, freed
+
+
+async def collect_orphans(dry_run: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Сверить файлы с БД и удалить файлы/блобы без ссылок (см. описание модуля).
+    dry_run — только найти (по умолчанию FILE_GC_DRY_RUN). Возвращает статистику.
+    """
+    global _last_run
+    dry_run = FILE_GC_DRY_RUN if dry_run is None else dry_run
+    stats: Dict[str, Any] = {
+        "dry_run": dry_run,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "orphan_blobs": 0,
+        "orphan_blob_bytes": 0,
+        "deleted_blobs": 0,
+        "scanned_files": 0,
+        "orphan_files": 0,
+        "orphan_file_bytes": 0,
+        "deleted_files": 0,
+        "freed_bytes": 0,
+        "samples": [],
+    }
+    started = time.monotonic()
+    async with engine.connect() as lock_conn:
+        locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _GC_LOCK_KEY})).scalar()
+        if not locked:
+            stats["skipped"] = "another GC run is in progress"
+            return stats
+        try:
+            cutoff = datetime.now(timezone.utc) - FILE_GC_GRACE
+            await _collect_orphan_blobs(cutoff, dry_run, stats)
+            await _collect_orphan_files(cutoff, dry_run, stats)
+            if get_storage().is_remote:
+                threshold = (datetime.now(timezone.utc) - BLOB_CACHE_TTL).timestamp()
+                stats["evicted_cache_files"], stats["evicted_cache_bytes"] = await asyncio.to_thread(
+                    _evict_cache, threshold, dry_run
+                )
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _GC_LOCK_KEY})
+            await lock_conn.commit()
+    stats["duration_seconds"] = round(time.monotonic() - started, 3)
+    _last_run = stats
+    return stats
+
+
+async def run_file_gc() -> None:
+    """Периодическая сверка (запускается при старте приложения)"""
+    while True:
+        await asyncio.sleep(FILE_GC_INTERVAL)
+        try:
+            stats = await collect_orphans()
+            if stats.get("orphan_blobs") or stats.get("orphan_files"):
+                print(
+                    f"🧹 File GC{' (dry run)' if stats['dry_run'] else ''}: "
+                    f"{stats['orphan_blobs']} orphan blob(s), {stats['orphan_files']} orphan file(s), "
+                    f"deleted {stats['deleted_blobs']} blob(s) and {stats['deleted_files']} file(s)"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Warning: file GC failed: {e}")
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Состояние очереди удаления и результат последней сверки"""
+    return {
+        "queue_depth": _queue.qsize() if _queue is not None else 0,
+        "worker_running": _worker is not None and not _worker.done(),
+        "last_run": _last_run,
+    }
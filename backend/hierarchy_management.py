@@ -18,6 +18,35 @@ from auth import verify_token, verify_token_optional
 
 router = APIRouter(prefix="/api/hierarchy", tags=["Hierarchy Management"])
 
+HIERARCHY_NODE_TYPES = ("enterprise", "branch", "workshop", "equipment_type", "equipment")
+
+
+def equipment_in_node(node_type: str, node_id: uuid_lib.UUID):
+    """
+    SELECT id оборудования узла иерархии (предприятие -> филиал -> цех -> оборудование,
+    либо тип оборудования) — подзапрос для INSERT ... SELECT / ANY(...) без выгрузки id.
+    """
+    if node_type == "equipment":
+        return select(Equipment.id).where(Equipment.id == node_id)
+    if node_type == "workshop":
+        return select(Equipment.id).where(Equipment.workshop_id == node_id)
+    if node_type == "branch":
+        return (
+            select(Equipment.id)
+            .join(Workshop, Workshop.id == Equipment.workshop_id)
+            .where(Workshop.branch_id == node_id)
+        )
+    if node_type == "enterprise":
+        return (
+            select(Equipment.id)
+            .join(Workshop, Workshop.id == Equipment.workshop_id)
+            .join(Branch, Branch.id == Workshop.branch_id)
+            .where(Branch.enterprise_id == node_id)
+        )
+    if node_type == "equipment_type":
+        return select(Equipment.id).where(Equipment.type_id == node_id)
+    raise ValueError(f"Unknown hierarchy node type: {node_type}")
+
 # Pydantic models
 class EnterpriseCreate(BaseModel):
     name: str
@@ -265,56 +294,165 @@ async def create_workshop(
         raise HTTPException(status_code=500, detail=f"Failed to create workshop: {str(e)}")
 
 # Engineer assignment endpoints
-@router.post("/enterprises/{enterprise_id}/assign-engineers")
-async def assign_engineers_to_enterprise(
-    enterprise_id: str,
-    assignment_data: EngineerAssignmentRequest,
+class HierarchyAssignmentPair(BaseModel):
+    object_type: str  # enterprise, branch, workshop, equipment_type, equipment
+    object_id: str
+    user_id: str
+
+class HierarchyObjectRef(BaseModel):
+    object_type: str
+    object_id: str
+
+class BulkHierarchyAssignmentRequest(BaseModel):
+    # Явные пары (объект, инженер) ...
+    assignments: List[HierarchyAssignmentPair] = []
+    # ... и/или все сочетания objects x user_ids
+    objects: List[HierarchyObjectRef] = []
+    user_ids: List[str] = []
+    expires_at: Optional[datetime] = None
+
+# Тип узла -> (колонка назначения, таблица узла)
+_ASSIGNMENT_NODES = {
+    "enterprise": ("enterprise_id", "enterprises"),
+    "branch": ("branch_id", "branches"),
+    "workshop": ("workshop_id", "workshops"),
+    "equipment_type": ("equipment_type_id", "equipment_types"),
+    "equipment": ("equipment_id", "equipment"),
+}
+
+
+def _node_case(template: str, else_: str = "false") -> str:
+    """CASE по типу узла; template — SQL с подстановкой {column} и {table}"""
+    branches = " ".join(
+        f"WHEN '{node_type}' THEN " + template.format(column=column, table=table)
+        for node_type, (column, table) in _ASSIGNMENT_NODES.items()
+    )
+    return f"CASE i.object_type {branches} ELSE {else_} END"
+
+
+# Одна команда на весь набор пар: существующие активные назначения обновляются,
+# недостающие создаются; пары с несуществующим инженером или узлом пропускаются.
+# Уникального ограничения на (инженер, узел) нет (исторические дубликаты), поэтому
+# вместо ON CONFLICT — UPDATE и INSERT ... WHERE NOT EXISTS в одном WITH.
+_BULK_ASSIGN_SQL = f"""
+WITH pairs AS (
+    SELECT DISTINCT ON (t.object_type, t.object_id, t.user_id) t.*
+    FROM unnest(
+        CAST(:object_types AS text[]), CAST(:object_ids AS uuid[]),
+        CAST(:user_ids AS uuid[]), CAST(:new_ids AS uuid[])
+    ) AS t(object_type, object_id, user_id, new_id)
+),
+valid_pairs AS (
+    SELECT i.* FROM pairs i
+    WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = i.user_id)
+      AND {_node_case("EXISTS (SELECT 1 FROM {table} n WHERE n.id = i.object_id)")}
+),
+updated AS (
+    UPDATE hierarchy_engineer_assignments a
+    SET expires_at = CAST(:expires_at AS timestamptz), granted_by = CAST(:granted_by AS uuid),
+        granted_at = now(), updated_at = now()
+    FROM valid_pairs i
+    WHERE a.user_id = i.user_id AND a.is_active = 1
+      AND {_node_case("a.{column} = i.object_id")}
+    RETURNING i.object_type, i.object_id, i.user_id
+),
+inserted AS (
+    INSERT INTO hierarchy_engineer_assignments (
+        id, user_id, {", ".join(column for column, _ in _ASSIGNMENT_NODES.values())},
+        granted_by, granted_at, is_active, expires_at, created_at, updated_at
+    )
+    SELECT i.new_id, i.user_id,
+        {", ".join(f"CASE WHEN i.object_type = '{node_type}' THEN i.object_id END" for node_type in _ASSIGNMENT_NODES)},
+        CAST(:granted_by AS uuid), now(), 1, CAST(:expires_at AS timestamptz), now(), now()
+    FROM valid_pairs i
+    WHERE NOT EXISTS (
+        SELECT 1 FROM updated u
+        WHERE u.object_type = i.object_type AND u.object_id = i.object_id AND u.user_id = i.user_id
+    )
+    RETURNING id
+)
+SELECT 'created' AS action, i.object_type, i.object_id, i.user_id
+FROM inserted JOIN valid_pairs i ON i.new_id = inserted.id
+UNION ALL
+SELECT DISTINCT 'updated', object_type, object_id, user_id FROM updated
+"""
+
+
+async def _load_assigner(db: AsyncSession, username: str) -> User:
+    """Текущий пользователь с правом назначать инженеров"""
+    user_result = await db.execute(
+        select(User).where(User.username == username)
+    )
+    current_user = user_result.scalar_one_or_none()
+    if not current_user or current_user.role not in ["admin", "chief_operator"]:
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+    return current_user
+
+
+async def apply_engineer_assignments(
+    db: AsyncSession,
+    pairs: List[tuple],
+    granted_by,
+    expires_at: Optional[datetime],
+) -> dict:
+    """
+    Назначить инженеров на узлы иерархии: pairs — [(тип узла, id узла, id инженера)]
+    (строки; некорректный UUID — ValueError). Один запрос на весь набор; возвращает
+    компактный diff: created/updated/skipped — списки [тип, id узла, id инженера].
+    """
+    parsed = []
+    for object_type, object_id, user_id in pairs:
+        if object_type not in _ASSIGNMENT_NODES:
+            raise HTTPException(status_code=400, detail=f"Unknown object_type: {object_type}")
+        parsed.append((object_type, uuid_lib.UUID(str(object_id)), uuid_lib.UUID(str(user_id))))
+    if not parsed:
+        return {"created": [], "updated": [], "skipped": [], "created_count": 0, "updated_count": 0}
+
+    result = await db.execute(
+        text(_BULK_ASSIGN_SQL),
+        {
+            "object_types": [p[0] for p in parsed],
+            "object_ids": [p[1] for p in parsed],
+            "user_ids": [p[2] for p in parsed],
+            "new_ids": [uuid_lib.uuid4() for _ in parsed],
+            "expires_at": expires_at,
+            "granted_by": granted_by,
+        },
+    )
+    diff = {"created": [], "updated": []}
+    applied = set()
+    for action, object_type, object_id, user_id in result.all():
+        diff[action].append([object_type, str(object_id), str(user_id)])
+        applied.add((object_type, object_id, user_id))
+    diff["skipped"] = [[t, str(o), str(u)] for t, o, u in dict.fromkeys(parsed) if (t, o, u) not in applied]
+    diff["created_count"] = len(diff["created"])
+    diff["updated_count"] = len(diff["updated"])
+    return diff
+
+
+@router.post("/assign-engineers/bulk")
+async def bulk_assign_engineers(
+    request: BulkHierarchyAssignmentRequest,
     username: str = Depends(verify_token),
     db: AsyncSession = Depends(get_db)
 ):
-    """Назначить инженеров на предприятие"""
+    """
+    Массовое назначение инженеров на узлы иерархии (предприятия, филиалы, цеха,
+    типы оборудования, оборудование) одним запросом к БД: пары assignments и все
+    сочетания objects x user_ids. Ответ — diff созданных/обновленных назначений
+    и пропущенных пар (нет инженера или узла).
+    """
     try:
-        user_result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        current_user = user_result.scalar_one_or_none()
-        if not current_user or current_user.role not in ["admin", "chief_operator"]:
-            raise HTTPException(status_code=403, detail="Доступ запрещен")
-        
-        enterprise_uuid = uuid_lib.UUID(enterprise_id)
-        
-        for user_id_str in assignment_data.user_ids:
-            user_uuid = uuid_lib.UUID(user_id_str)
-            
-            # Проверяем, не назначен ли уже
-            existing_result = await db.execute(
-                select(HierarchyEngineerAssignment).where(
-                    and_(
-                        HierarchyEngineerAssignment.user_id == user_uuid,
-                        HierarchyEngineerAssignment.enterprise_id == enterprise_uuid,
-                        text("hierarchy_engineer_assignments.is_active = 1")
-                    )
-                )
-            )
-            existing = existing_result.scalar_one_or_none()
-            
-            if existing:
-                # Обновляем существующее назначение
-                existing.expires_at = assignment_data.expires_at
-                existing.granted_by = current_user.id
-                existing.granted_at = datetime.now()
-            else:
-                # Создаем новое назначение
-                new_assignment = HierarchyEngineerAssignment(
-                    user_id=user_uuid,
-                    enterprise_id=enterprise_uuid,
-                    granted_by=current_user.id,
-                    expires_at=assignment_data.expires_at
-                )
-                db.add(new_assignment)
-        
+        current_user = await _load_assigner(db, username)
+
+        pairs = [(a.object_type, a.object_id, a.user_id) for a in request.assignments]
+        pairs += [(o.object_type, o.object_id, user_id) for o in request.objects for user_id in request.user_ids]
+        if not pairs:
+            raise HTTPException(status_code=400, detail="No assignments provided")
+
+        diff = await apply_engineer_assignments(db, pairs, current_user.id, request.expires_at)
         await db.commit()
-        return {"message": "Инженеры успешно назначены на предприятие"}
+        return diff
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid UUID format")
     except HTTPException:
@@ -323,53 +461,32 @@ async def assign_engineers_to_enterprise(
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to assign engineers: {str(e)}")
 
-@router.post("/branches/{branch_id}/assign-engineers")
-async def assign_engineers_to_branch(
-    branch_id: str,
+
+async def _assign_engineers_to_node(
+    object_type: str,
+    object_id: str,
     assignment_data: EngineerAssignmentRequest,
-    username: str = Depends(verify_token),
-    db: AsyncSession = Depends(get_db)
+    username: str,
+    db: AsyncSession,
+    message: str,
 ):
-    """Назначить инженеров на филиал"""
     try:
-        user_result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        current_user = user_result.scalar_one_or_none()
-        if not current_user or current_user.role not in ["admin", "chief_operator"]:
-            raise HTTPException(status_code=403, detail="Доступ запрещен")
-        
-        branch_uuid = uuid_lib.UUID(branch_id)
-        
-        for user_id_str in assignment_data.user_ids:
-            user_uuid = uuid_lib.UUID(user_id_str)
-            
-            existing_result = await db.execute(
-                select(HierarchyEngineerAssignment).where(
-                    and_(
-                        HierarchyEngineerAssignment.user_id == user_uuid,
-                        HierarchyEngineerAssignment.branch_id == branch_uuid,
-                        text("hierarchy_engineer_assignments.is_active = 1")
-                    )
-                )
-            )
-            existing = existing_result.scalar_one_or_none()
-            
-            if existing:
-                existing.expires_at = assignment_data.expires_at
-                existing.granted_by = current_user.id
-                existing.granted_at = datetime.now()
-            else:
-                new_assignment = HierarchyEngineerAssignment(
-                    user_id=user_uuid,
-                    branch_id=branch_uuid,
-                    granted_by=current_user.id,
-                    expires_at=assignment_data.expires_at
-                )
-                db.add(new_assignment)
-        
+        current_user = await _load_assigner(db, username)
+        pairs = [(object_type, object_id, user_id) for user_id in assignment_data.user_ids]
+        diff = await apply_engineer_assignments(db, pairs, current_user.id, assignment_data.expires_at)
+        if diff["skipped"]:
+            # Пропущенная пара — нет узла или инженера: назначение не выполняется целиком
+            await db.rollback()
+            _, table = _ASSIGNMENT_NODES[object_type]
+            node_exists = (await db.execute(
+                text(f"SELECT 1 FROM {table} WHERE id = :id"), {"id": uuid_lib.UUID(object_id)}
+            )).first()
+            if not node_exists:
+                raise HTTPException(status_code=404, detail="Объект иерархии не найден")
+            missing = ", ".join(user_id for _, _, user_id in diff["skipped"])
+            raise HTTPException(status_code=404, detail=f"Пользователи не найдены: {missing}")
         await db.commit()
-        return {"message": "Инженеры успешно назначены на филиал"}
+        return {"message": message}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid UUID format")
     except HTTPException:
@@ -378,6 +495,30 @@ async def assign_engineers_to_branch(
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to assign engineers: {str(e)}")
 
+@router.post("/enterprises/{enterprise_id}/assign-engineers")
+async def assign_engineers_to_enterprise(
+    enterprise_id: str,
+    assignment_data: EngineerAssignmentRequest,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Назначить инженеров на предприятие"""
+    return await _assign_engineers_to_node(
+        "enterprise", enterprise_id, assignment_data, username, db, "Инженеры успешно назначены на предприятие"
+    )
+
+@router.post("/branches/{branch_id}/assign-engineers")
+async def assign_engineers_to_branch(
+    branch_id: str,
+    assignment_data: EngineerAssignmentRequest,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Назначить инженеров на филиал"""
+    return await _assign_engineers_to_node(
+        "branch", branch_id, assignment_data, username, db, "Инженеры успешно назначены на филиал"
+    )
+
 @router.post("/workshops/{workshop_id}/assign-engineers")
 async def assign_engineers_to_workshop(
     workshop_id: str,
@@ -386,52 +527,9 @@ async def assign_engineers_to_workshop(
     db: AsyncSession = Depends(get_db)
 ):
     """Назначить инженеров на цех"""
-    try:
-        user_result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        current_user = user_result.scalar_one_or_none()
-        if not current_user or current_user.role not in ["admin", "chief_operator"]:
-            raise HTTPException(status_code=403, detail="Доступ запрещен")
-        
-        workshop_uuid = uuid_lib.UUID(workshop_id)
-        
-        for user_id_str in assignment_data.user_ids:
-            user_uuid = uuid_lib.UUID(user_id_str)
-            
-            existing_result = await db.execute(
-                select(HierarchyEngineerAssignment).where(
-                    and_(
-                        HierarchyEngineerAssignment.user_id == user_uuid,
-                        HierarchyEngineerAssignment.workshop_id == workshop_uuid,
-                        text("hierarchy_engineer_assignments.is_active = 1")
-                    )
-                )
-            )
-            existing = existing_result.scalar_one_or_none()
-            
-            if existing:
-                existing.expires_at = assignment_data.expires_at
-                existing.granted_by = current_user.id
-                existing.granted_at = datetime.now()
-            else:
-                new_assignment = HierarchyEngineerAssignment(
-                    user_id=user_uuid,
-                    workshop_id=workshop_uuid,
-                    granted_by=current_user.id,
-                    expires_at=assignment_data.expires_at
-                )
-                db.add(new_assignment)
-        
-        await db.commit()
-        return {"message": "Инженеры успешно назначены на цех"}
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid UUID format")
-    except HTTPException:
-        raise
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to assign engineers: {str(e)}")
+    return await _assign_engineers_to_node(
+        "workshop", workshop_id, assignment_data, username, db, "Инженеры успешно назначены на цех"
+    )
 
 @router.post("/equipment-types/{equipment_type_id}/assign-engineers")
 async def assign_engineers_to_equipment_type(
@@ -441,52 +539,10 @@ async def assign_engineers_to_equipment_type(
     db: AsyncSession = Depends(get_db)
 ):
     """Назначить инженеров на тип оборудования"""
-    try:
-        user_result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        current_user = user_result.scalar_one_or_none()
-        if not current_user or current_user.role not in ["admin", "chief_operator"]:
-            raise HTTPException(status_code=403, detail="Доступ запрещен")
-        
-        equipment_type_uuid = uuid_lib.UUID(equipment_type_id)
-        
-        for user_id_str in assignment_data.user_ids:
-            user_uuid = uuid_lib.UUID(user_id_str)
-            
-            existing_result = await db.execute(
-                select(HierarchyEngineerAssignment).where(
-                    and_(
-                        HierarchyEngineerAssignment.user_id == user_uuid,
-                        HierarchyEngineerAssignment.equipment_type_id == equipment_type_uuid,
-                        text("hierarchy_engineer_assignments.is_active = 1")
-                    )
-                )
-            )
-            existing = existing_result.scalar_one_or_none()
-            
-            if existing:
-                existing.expires_at = assignment_data.expires_at
-                existing.granted_by = current_user.id
-                existing.granted_at = datetime.now()
-            else:
-                new_assignment = HierarchyEngineerAssignment(
-                    user_id=user_uuid,
-                    equipment_type_id=equipment_type_uuid,
-                    granted_by=current_user.id,
-                    expires_at=assignment_data.expires_at
-                )
-                db.add(new_assignment)
-        
-        await db.commit()
-        return {"message": "Инженеры успешно назначены на тип оборудования"}
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid UUID format")
-    except HTTPException:
-        raise
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to assign engineers: {str(e)}")
+    return await _assign_engineers_to_node(
+        "equipment_type", equipment_type_id, assignment_data, username, db,
+        "Инженеры успешно назначены на тип оборудования",
+    )
 
 @router.post("/equipment/{equipment_id}/assign-engineers")
 async def assign_engineers_to_equipment(
@@ -496,52 +552,9 @@ async def assign_engineers_to_equipment(
     db: AsyncSession = Depends(get_db)
 ):
     """Назначить инженеров на конкретное оборудование"""
-    try:
-        user_result = await db.execute(
-            select(User).where(User.username == username)
-        )
-        current_user = user_result.scalar_one_or_none()
-        if not current_user or current_user.role not in ["admin", "chief_operator"]:
-            raise HTTPException(status_code=403, detail="Доступ запрещен")
-        
-        equipment_uuid = uuid_lib.UUID(equipment_id)
-        
-        for user_id_str in assignment_data.user_ids:
-            user_uuid = uuid_lib.UUID(user_id_str)
-            
-            existing_result = await db.execute(
-                select(HierarchyEngineerAssignment).where(
-                    and_(
-                        HierarchyEngineerAssignment.user_id == user_uuid,
-                        HierarchyEngineerAssignment.equipment_id == equipment_uuid,
-                        text("hierarchy_engineer_assignments.is_active = 1")
-                    )
-                )
-            )
-            existing = existing_result.scalar_one_or_none()
-            
-            if existing:
-                existing.expires_at = assignment_data.expires_at
-                existing.granted_by = current_user.id
-                existing.granted_at = datetime.now()
-            else:
-                new_assignment = HierarchyEngineerAssignment(
-                    user_id=user_uuid,
-                    equipment_id=equipment_uuid,
-                    granted_by=current_user.id,
-                    expires_at=assignment_data.expires_at
-                )
-                db.add(new_assignment)
-        
-        await db.commit()
-        return {"message": "Инженеры успешно назначены на оборудование"}
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid UUID format")
-    except HTTPException:
-        raise
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to assign engineers: {str(e)}")
+    return await _assign_engineers_to_node(
+        "equipment", equipment_id, assignment_data, username, db, "Инженеры успешно назначены на оборудование"
+    )
 
 @router.get("/assignments/{user_id}")
 async def get_user_assignments(
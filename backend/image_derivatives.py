@@ -0,0 +1,189 @@
+"""
+Уменьшенные копии (производные) загруженных изображений.
+
+Фото с телефонов хранятся в исходном разрешении (4000+ px, несколько МБ), а
+просмотр в браузере, скачивание на мобильном и вставка в отчет полный размер
+не используют. После загрузки изображения (файлы документов чек-листа, сканы
+сертификатов и оборудования для поверки) в фоне строятся варианты:
+
+  thumb  — превью для списков (до 320 px по большей стороне);
+  screen — просмотр на экране (до 1600 px);
+  print  — вставка в PDF/Word отчета (до 2480 px, ~300 dpi на ширину A4).
+
+Ориентация из EXIF применяется к пикселям (фото с телефона не "лежат на боку"),
+метаданные не копируются, результат — JPEG. Варианты лежат в
+IMAGE_DERIVATIVES_DIR/ab/<ключ>_<вариант>.jpg; ключ для файлов blob_store —
+SHA-256 содержимого (имя блоба), поэтому одинаковые фото обрабатываются
+один раз. Построение выполняется в пуле рендеринга (render_pool); если вариант
+запрошен раньше, чем построен, он строится по запросу.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from render_pool import run_in_pool
+
+IMAGE_DERIVATIVES_DIR = Path(os.getenv("IMAGE_DERIVATIVES_DIR", "/app/uploads/derivatives"))
+
+# вариант -> (максимальная сторона, px; качество JPEG)
+VARIANTS: Dict[str, tuple] = {
+    "thumb": (320, 75),
+    "screen": (1600, 82),
+    "print": (2480, 88),
+}
+ORIGINAL = "original"
+
+_SHA256_RE = re.compile(r"[0-9a-f]{64}")
+
+_inflight: Dict[str, asyncio.Task] = {}
+_background: Set[asyncio.Task] = set()
+
+
+def is_image(mime_type: Optional[str], path: Optional[str] = None) -> bool:
+    if mime_type:
+        return mime_type.lower().startswith("image/")
+    return bool(path) and Path(path).suffix.lower() in (".jpg", ".jpeg", ".png")
+
+
+def derivative_key(source_path: str) -> str:
+    """Ключ вариантов: SHA-256 для блобов, хеш пути для файлов вне хранилища"""
+    stem = Path(source_path).stem
+    if _SHA256_RE.fullmatch(stem):
+        return stem
+    return hashlib.sha256(os.path.abspath(source_path).encode("utf-8")).hexdigest()
+
+
+def variant_path(source_path: str, variant: str) -> Path:
+    key = derivative_key(source_path)
+    return IMAGE_DERIVATIVES_DIR / key[:2] / f"{key}_{variant}.jpg"
+
+
+def _flatten(image):
+    """RGB без прозрачности (PNG со схемами — на белом фоне)"""
+    from PIL import Image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB") if image.mode != "RGB" else image
+
+
+def generate(source_path: str) -> Dict[str, str]:
+    """
+    Построить все варианты изображения source_path (недостающие).
+    Выполняется в процессе пула, поэтому функция модульного уровня.
+    Возвращает {вариант: путь}.
+    """
+    from PIL import Image, ImageOps
+
+    targets = {name: variant_path(source_path, name) for name in VARIANTS}
+    if all(p.exists() for p in targets.values()):
+        return {name: str(p) for name, p in targets.items()}
+
+    largest = max(side for side, _ in VARIANTS.values())
+    with Image.open(source_path) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8), если это возможно
+        source.draft("RGB", (largest, largest))
+        image = _flatten(ImageOps.exif_transpose(source))
+
+    # От большего варианта к меньшему: каждый следующий уменьшается из предыдущего
+    for name in sorted(VARIANTS, key=lambda n: VARIANTS[n][0], reverse=True):
+        side, quality = VARIANTS[name]
+        image.thumbnail((side, side), Image.LANCZOS)
+        target = targets[name]
+        if target.exists():
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            image.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+    return {name: str(p) for name, p in targets.items()}
+
+
+async def _build(source_path: str) -> Dict[str, str]:
+    # При внешнем хранилище (storage) исходник может отсутствовать в локальном кэше
+    import blob_store
+    await blob_store.ensure_local(source_path)
+    return await run_in_pool(generate, source_path)
+
+
+def _generate_task(source_path: str) -> asyncio.Task:
+    """
+    Одна задача построения на ключ: фоновая и запрошенная по требованию не дублируются.
+    Ждать ее через asyncio.shield: отмена одного ожидающего (разрыв соединения,
+    таймаут) не должна отменять построение для остальных.
+    """
+    key = derivative_key(source_path)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_build(source_path))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    return task
+
+
+async def _generate_logged(source_path: str) -> None:
+    try:
+        await asyncio.shield(_generate_task(source_path))
+    except Exception as e:
+        print(f"⚠️  Warning: failed to build image variants for {source_path}: {e}")
+
+
+def schedule(source_path: Optional[str], mime_type: Optional[str]) -> None:
+    """Запустить построение вариантов в фоне (после фиксации загрузки); не изображения — пропускаются"""
+    if not source_path or not is_image(mime_type, source_path):
+        return
+    task = asyncio.create_task(_generate_logged(source_path))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def ensure_variant(source_path: str, mime_type: Optional[str], variant: Optional[str]) -> Optional[str]:
+    """
+    Путь к варианту изображения (строится, если его еще нет).
+    None — нужен исходный файл: запрошен original, файл не изображение
+    или вариант построить не удалось.
+    """
+    if not variant or variant == ORIGINAL or variant not in VARIANTS:
+        return None
+    if not is_image(mime_type, source_path):
+        return None
+    target = variant_path(source_path, variant)
+    if not target.exists():
+        try:
+            await asyncio.shield(_generate_task(source_path))
+        except Exception as e:
+            print(f"⚠️  Warning: failed to build image variant {variant} for {source_path}: {e}")
+            return None
+    return str(target) if target.exists() else None
+
+
+def render_path(source_path: Optional[str], mime_type: Optional[str] = None) -> Optional[str]:
+    """Путь для вставки в отчет: вариант print, если он уже построен, иначе исходный файл"""
+    if not source_path or not is_image(mime_type, source_path):
+        return source_path
+    target = variant_path(source_path, "print")
+    return str(target) if target.exists() else source_path
+
+
+def _remove_variants(source_path: str) -> None:
+    for name in VARIANTS:
+        variant_path(source_path, name).unlink(missing_ok=True)
+
+
+async def remove_variants(source_path: Optional[str]) -> None:
+    """Удалить варианты файла, который больше не хранится"""
+    if not source_path:
+        return
+    try:
+        await asyncio.to_thread(_remove_variants, source_path)
+    except OSError:
+        pass
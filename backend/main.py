@@ -1,15 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import FastAPI, Depends, HTTPException, Request, UploadFile, File, Form, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text, or_, and_, func, Integer, cast, delete
-from typing import List, Optional
+from sqlalchemy import select, text, or_, and_, func, Integer, cast, delete, update, false, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime, date, timedelta
+import asyncio
+import base64
 import os
 import uuid as uuid_lib
-from database import get_db, engine, Base
+from database import get_db, engine, Base, AsyncSessionLocal
 from models import (
     UserEquipmentAccess,
     Equipment, EquipmentType, PipelineSegment, Inspection,
@@ -20,12 +24,32 @@ from models import (
     VerificationEquipment, VerificationHistory, InspectionEquipment
 )
 from report_generator import ReportGenerator
+from report_context import build_report_context, build_questionnaire_context, fetch_attachments
+from render_pool import render_report_async, render_workers, report_formats, run_in_pool, shutdown_render_pool
+import report_preview
+from zip_stream import ZipStream
+from concurrency import get_limiter, get_metrics as get_concurrency_metrics, limit
+from appendix_bundles import invalidate_engineer_bundles, invalidate_instrument_bundles
+from upload_storage import UploadSizeLimitMiddleware, remove_file, safe_file_name, save_upload
+import blob_store
+import image_derivatives
+import file_gc
+from file_delivery import file_response
+from document_files import (
+    attach_document_file,
+    document_file_extension,
+    document_file_to_dict,
+    validate_document_number,
+    validate_document_type,
+)
 from auth import USERS_DB, create_access_token, verify_token, verify_token_optional, verify_password, hash_password
 from pathlib import Path
 from access_management import router as access_router
 from hierarchy_management import router as hierarchy_router
-from assignments_api import router as assignments_router
+from assignments_api import router as assignments_router, invalidate_assignment_statistics
 from equipment_history_api import router as equipment_history_router
+from upload_sessions_api import router as upload_sessions_router, run_session_gc
+from equipment_import_api import router as equipment_import_router
 
 app = FastAPI(
     title="ES TD NGO Platform API",
@@ -33,6 +57,9 @@ app = FastAPI(
     version="3.6.2"
 )
 
+# Лимит размера загрузок по мере приема тела (до разбора multipart)
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +74,8 @@ app.include_router(access_router)
 app.include_router(hierarchy_router)
 app.include_router(assignments_router)  # Новый роутер для заданий (версия 3.3.0)
 app.include_router(equipment_history_router)  # Новый роутер для истории (версия 3.3.0)
+app.include_router(upload_sessions_router)  # Возобновляемая загрузка файлов документов
+app.include_router(equipment_import_router)  # Массовый импорт оборудования из CSV/XLSX
 
 # Версия мобильного приложения
 MOBILE_APP_VERSION = "3.6.2"
@@ -137,12 +166,90 @@ async def startup():
             print("✅ DB migration: ensured equipment_resources.resource_type")
         except Exception as e:
             print(f"⚠️  Warning: DB migration equipment_resources.resource_type failed: {e}")
+
+        try:
+            async with engine.begin() as conn:
+                # Версия содержимого, по которой сгенерированы PDF/Word опросного листа
+                await conn.execute(
+                    text(
+                        "ALTER TABLE questionnaires "
+                        "ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64), "
+                        "ADD COLUMN IF NOT EXISTS word_content_hash VARCHAR(64)"
+                    )
+                )
+            print("✅ DB migration: ensured questionnaires.content_hash/word_content_hash")
+        except Exception as e:
+            print(f"⚠️  Warning: DB migration questionnaires.content_hash failed: {e}")
+
+        try:
+            async with engine.begin() as conn:
+                # Ключи вложений чек-листа (factory_plate_photo и т.п.) длиннее 10 символов
+                await conn.execute(
+                    text(
+                        "ALTER TABLE questionnaire_document_files "
+                        "ALTER COLUMN document_number TYPE VARCHAR(64)"
+                    )
+                )
+            print("✅ DB migration: ensured questionnaire_document_files.document_number VARCHAR(64)")
+        except Exception as e:
+            print(f"⚠️  Warning: DB migration questionnaire_document_files.document_number failed: {e}")
+
+        try:
+            async with engine.begin() as conn:
+                # Ссылки на блобы хранилища с адресацией по содержимому (blob_store)
+                for table, columns in (
+                    ("questionnaire_document_files", ("blob_sha256",)),
+                    ("certifications", ("scan_blob_sha256",)),
+                    ("verification_equipment", ("scan_blob_sha256",)),
+                    ("reports", ("blob_sha256", "word_blob_sha256")),
+                    ("questionnaires", ("blob_sha256", "word_blob_sha256")),
+                ):
+                    await conn.execute(
+                        text(
+                            f"ALTER TABLE {table} "
+                            + ", ".join(f"ADD COLUMN IF NOT EXISTS {c} VARCHAR(64)" for c in columns)
+                        )
+                    )
+            print("✅ DB migration: ensured blob_sha256 columns")
+        except Exception as e:
+            print(f"⚠️  Warning: DB migration blob_sha256 columns failed: {e}")
+
+        try:
+            async with engine.begin() as conn:
+                # Отчеты по чек-листу: выборка и массовое удаление по inspection_id,
+                # проверка внешнего ключа при удалении чек-листов
+                await conn.execute(
+                    text("CREATE INDEX IF NOT EXISTS ix_reports_inspection_id ON reports (inspection_id)")
+                )
+            print("✅ DB migration: ensured reports.inspection_id index")
+        except Exception as e:
+            print(f"⚠️  Warning: DB migration reports.inspection_id index failed: {e}")
+
+        # Фоновая очистка брошенных сессий возобновляемой загрузки
+        global _upload_session_gc_task, _file_gc_task
+        _upload_session_gc_task = asyncio.create_task(run_session_gc())
+        # Сверка файлов отчетов и загрузок с БД (удаление файлов без ссылок)
+        _file_gc_task = asyncio.create_task(file_gc.run_file_gc())
             
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
         import traceback
         traceback.print_exc()
 
+_upload_session_gc_task: Optional[asyncio.Task] = None
+_file_gc_task: Optional[asyncio.Task] = None
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Остановка пула рендеринга отчетов и фоновых задач"""
+    for task in (_upload_session_gc_task, _file_gc_task):
+        if task:
+            task.cancel()
+    # Файлы, поставленные в очередь удаления, освобождаем до выхода
+    await file_gc.drain()
+    file_gc.stop()
+    shutdown_render_pool()
+
 @app.get("/")
 async def root():
     return {
@@ -151,6 +258,37 @@ async def root():
         "status": "running"
     }
 
+@app.get("/api/metrics/concurrency")
+async def concurrency_metrics(username: str = Depends(verify_token)):
+    """Метрики ограничителей тяжелых эндпоинтов: активные запросы, очередь, ожидание, отказы"""
+    return get_concurrency_metrics()
+
+@app.get("/api/metrics/file-gc")
+async def file_gc_metrics(username: str = Depends(verify_token)):
+    """Очередь фонового удаления файлов и результат последней сверки"""
+    return file_gc.get_metrics()
+
+@app.post("/api/maintenance/file-gc", dependencies=[Depends(limit("bulk"))])
+async def run_file_gc(
+    dry_run: bool = True,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Сверка файлов /app/reports и /app/uploads с БД вне расписания (только admin).
+    dry_run=true (по умолчанию) — только найти файлы без ссылок, не удаляя.
+    """
+    try:
+        user_result = await db.execute(select(User).where(User.username == username))
+        current_user = user_result.scalar_one_or_none()
+        if not current_user or current_user.role != "admin":
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+        return await file_gc.collect_orphans(dry_run=dry_run)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"File GC failed: {str(e)}")
+
 # Аутентификация
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -980,6 +1118,7 @@ async def create_inspection(
                         # Прочие статусы не меняем, чтобы не ломать логику
                         pass
                     await db.commit()
+                    invalidate_assignment_statistics()
             except Exception:
                 # Не блокируем создание инспекции из-за статуса задания
                 await db.rollback()
@@ -1053,6 +1192,64 @@ async def create_client(client_data: dict, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Объявлен раньше /api/inspections/{inspection_id}: иначе "cleanup" совпадает с id
+@app.delete("/api/inspections/cleanup", dependencies=[Depends(limit("bulk"))])
+async def cleanup_inspections(
+    older_than_days: int = 180,
+    before: Optional[str] = None,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Массовое удаление старых чек-листов (inspections) и связанных отчетов/методов НК.
+    - admin/chief_operator/operator: удаляют любые
+    - engineer: удаляет только свои
+    Удаление — пачками (см. _delete_inspections), файлы отчетов удаляются в фоне.
+    """
+    try:
+        user_result = await db.execute(select(User).where(User.username == username))
+        current_user = user_result.scalar_one_or_none()
+        if not current_user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        cutoff = None
+        if before:
+            try:
+                cutoff = datetime.fromisoformat(before.replace("Z", "+00:00"))
+            except Exception:
+                try:
+                    cutoff = datetime.strptime(before, "%Y-%m-%d")
+                except Exception:
+                    raise HTTPException(status_code=400, detail="Invalid 'before' format")
+        else:
+            if older_than_days < 1:
+                raise HTTPException(status_code=400, detail="older_than_days must be >= 1")
+            cutoff = datetime.now() - timedelta(days=int(older_than_days))
+
+        insp_query = select(Inspection.id).where(Inspection.created_at < cutoff)
+        if current_user.role == "engineer":
+            insp_query = insp_query.where(Inspection.inspector_id == current_user.id)
+        elif current_user.role not in ["admin", "chief_operator", "operator"]:
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+
+        insp_result = await db.execute(insp_query.order_by(Inspection.created_at))
+        inspection_ids = list(insp_result.scalars().all())
+
+        stats = await _delete_inspections(db, inspection_ids, "cleanup_inspections")
+        return {
+            "status": "ok",
+            "deleted": stats["deleted"],
+            "reports_deleted": stats["reports_deleted"],
+            "chunks": stats["chunks"],
+            "cutoff": cutoff.isoformat(),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to cleanup inspections: {str(e)}")
+
+
 @app.delete("/api/inspections/{inspection_id}")
 async def delete_inspection(
     inspection_id: str,
@@ -1065,6 +1262,7 @@ async def delete_inspection(
     - engineer: удаляет только свои (по inspector_id)
     При удалении также удаляются связанные отчеты (reports) и методы НК (ndt_methods) по inspection_id.
     """
+    released_files = []
     try:
         insp_uuid = uuid_lib.UUID(inspection_id)
 
@@ -1092,14 +1290,7 @@ async def delete_inspection(
         rep_result = await db.execute(select(Report).where(Report.inspection_id == inspection.id))
         related_reports = rep_result.scalars().all()
         for report in related_reports:
-            for p in [report.file_path, getattr(report, "word_file_path", None)]:
-                if p:
-                    try:
-                        fp = Path(p)
-                        if fp.exists():
-                            fp.unlink()
-                    except Exception:
-                        pass
+            released_files.extend(_report_file_refs(report))
             await db.delete(report)
 
         # Удаляем связанные методы НК (новая схема привязки к inspection_id)
@@ -1112,6 +1303,8 @@ async def delete_inspection(
 
         await db.delete(inspection)
         await db.commit()
+        # Файлы отчетов освобождаются после фиксации удаления записей
+        await blob_store.discard(released_files)
         return {"status": "deleted", "id": inspection_id, "reports_deleted": len(related_reports)}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid inspection_id format")
@@ -1121,85 +1314,6 @@ async def delete_inspection(
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete inspection: {str(e)}")
 
-
-@app.delete("/api/inspections/cleanup")
-async def cleanup_inspections(
-    older_than_days: int = 180,
-    before: Optional[str] = None,
-    username: str = Depends(verify_token),
-    db: AsyncSession = Depends(get_db),
-):
-    """
-    Массовое удаление старых чек-листов (inspections) и связанных отчетов/методов НК.
-    - admin/chief_operator/operator: удаляют любые
-    - engineer: удаляет только свои
-    """
-    try:
-        user_result = await db.execute(select(User).where(User.username == username))
-        current_user = user_result.scalar_one_or_none()
-        if not current_user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        cutoff = None
-        if before:
-            try:
-                cutoff = datetime.fromisoformat(before.replace("Z", "+00:00"))
-            except Exception:
-                try:
-                    cutoff = datetime.strptime(before, "%Y-%m-%d")
-                except Exception:
-                    raise HTTPException(status_code=400, detail="Invalid 'before' format")
-        else:
-            if older_than_days < 1:
-                raise HTTPException(status_code=400, detail="older_than_days must be >= 1")
-            cutoff = datetime.now() - timedelta(days=int(older_than_days))
-
-        insp_query = select(Inspection).where(Inspection.created_at < cutoff)
-        if current_user.role == "engineer":
-            insp_query = insp_query.where(Inspection.inspector_id == current_user.id)
-        elif current_user.role not in ["admin", "chief_operator", "operator"]:
-            raise HTTPException(status_code=403, detail="Доступ запрещен")
-
-        insp_result = await db.execute(insp_query)
-        inspections = insp_result.scalars().all()
-
-        deleted = 0
-        reports_deleted = 0
-        for inspection in inspections:
-            # связанные отчеты
-            rep_result = await db.execute(select(Report).where(Report.inspection_id == inspection.id))
-            related_reports = rep_result.scalars().all()
-            for report in related_reports:
-                for p in [report.file_path, getattr(report, "word_file_path", None)]:
-                    if p:
-                        try:
-                            fp = Path(p)
-                            if fp.exists():
-                                fp.unlink()
-                        except Exception:
-                            pass
-                await db.delete(report)
-                reports_deleted += 1
-
-            # методы НК
-            try:
-                ndt_result = await db.execute(select(NDTMethod).where(NDTMethod.inspection_id == inspection.id))
-                for m in ndt_result.scalars().all():
-                    await db.delete(m)
-            except Exception:
-                pass
-
-            await db.delete(inspection)
-            deleted += 1
-
-        await db.commit()
-        return {"status": "ok", "deleted": deleted, "reports_deleted": reports_deleted, "cutoff": cutoff.isoformat()}
-    except HTTPException:
-        raise
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to cleanup inspections: {str(e)}")
-
 # Projects endpoints
 @app.get("/api/projects")
 async def get_projects(
@@ -1647,6 +1761,7 @@ async def update_certification(
         
         await db.commit()
         await db.refresh(certification)
+        invalidate_engineer_bundles(certification.engineer_id)
         
         return {
             "id": str(certification.id),
@@ -1692,6 +1807,7 @@ async def delete_certification(
         
         certification.is_active = 0
         await db.commit()
+        invalidate_engineer_bundles(certification.engineer_id)
         
         return {"message": "Сертификат успешно удален"}
     except Exception as e:
@@ -1699,6 +1815,41 @@ async def delete_certification(
         raise HTTPException(status_code=500, detail=f"Failed to delete certification: {str(e)}")
 
 
+def _image_variant(size: Optional[str], default: str = "screen") -> str:
+    """Вариант изображения из параметра size (см. image_derivatives.VARIANTS)"""
+    variant = (size or default).strip().lower()
+    if variant != image_derivatives.ORIGINAL and variant not in image_derivatives.VARIANTS:
+        allowed = ", ".join([*image_derivatives.VARIANTS, image_derivatives.ORIGINAL])
+        raise HTTPException(status_code=400, detail=f"Invalid size. Allowed: {allowed}")
+    return variant
+
+
+def _image_variant_name(file_name: Optional[str], variant: str) -> str:
+    """Имя файла варианта: photo.png -> photo_screen.jpg"""
+    stem = Path(file_name or "image").stem or "image"
+    return f"{stem}_{variant}.jpg"
+
+
+async def _image_variant_response(
+    request: Request,
+    source_path: str,
+    mime_type: Optional[str],
+    variant: str,
+    file_name: Optional[str],
+    blob_sha256: Optional[str],
+    inline: bool = False,
+):
+    """Ответ с уменьшенной копией изображения; None — отдавать исходный файл (не изображение, original)"""
+    variant_path = await image_derivatives.ensure_variant(source_path, mime_type, variant)
+    if not variant_path:
+        return None
+    return await file_response(
+        request, variant_path, 'image/jpeg',
+        filename=_image_variant_name(file_name, variant), inline=inline,
+        etag=f"{blob_sha256}-{variant}" if blob_sha256 else None,
+    )
+
+
 @app.post("/api/certifications/{certification_id}/scan")
 async def upload_certification_scan(
     certification_id: str,
@@ -1729,39 +1880,24 @@ async def upload_certification_scan(
         if file.content_type and file.content_type not in allowed:
             raise HTTPException(status_code=400, detail="Разрешены только фото (JPEG/PNG/WEBP) или PDF")
 
-        uploads_dir = Path("/app/uploads/certification_scans") / str(cert.id)
-        uploads_dir.mkdir(parents=True, exist_ok=True)
-
-        safe_name = (file.filename or "scan").replace("\\", "_").replace("/", "_")
-        stored_name = f"{uuid_lib.uuid4()}_{safe_name}"
-        stored_path = uploads_dir / stored_name
-
-        # Удаляем старый файл, если был
-        old_path = getattr(cert, "scan_file_path", None)
-        if old_path:
-            try:
-                old_p = Path(old_path)
-                if old_p.exists():
-                    old_p.unlink()
-            except Exception:
-                pass
-
-        size = 0
-        with stored_path.open("wb") as f:
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                size += len(chunk)
-                f.write(chunk)
-
-        cert.scan_file_path = str(stored_path)
-        cert.scan_file_name = file.filename
-        cert.scan_file_size = size
-        cert.scan_mime_type = file.content_type
-
-        await db.commit()
+        # Скан хранится в blob_store: одинаковые сканы лежат на диске один раз
+        stored = await save_upload(file, blob_store.staging_path(Path(safe_file_name(file.filename, "scan")).suffix))
+        try:
+            old_ref = (cert.scan_file_path, cert.scan_blob_sha256)
+            cert.scan_file_path = await blob_store.adopt(db, stored.path, stored.sha256, stored.size)
+            cert.scan_blob_sha256 = stored.sha256
+            cert.scan_file_name = file.filename
+            cert.scan_file_size = stored.size
+            cert.scan_mime_type = file.content_type
+            await db.commit()
+        finally:
+            await remove_file(stored.path)
         await db.refresh(cert)
+        image_derivatives.schedule(cert.scan_file_path, cert.scan_mime_type)
+        # Ссылка на старый скан освобождается только после того, как новый записан в БД
+        await blob_store.discard([old_ref])
+        # Пакет приложений инженера для PDF-отчетов пересоберется при следующей генерации
+        invalidate_engineer_bundles(cert.engineer_id)
 
         return {
             "id": str(cert.id),
@@ -1781,25 +1917,40 @@ async def upload_certification_scan(
 @app.get("/api/certifications/{certification_id}/scan")
 async def download_certification_scan(
     certification_id: str,
+    request: Request,
+    size: Optional[str] = None,
     username: str = Depends(verify_token),
     db: AsyncSession = Depends(get_db)
 ):
-    """Скачать скан сертификата"""
+    """
+    Скачать скан сертификата. Скан-изображение по умолчанию отдается в размере
+    screen; size=thumb|print — другой вариант, size=original — исходный файл.
+    """
     try:
         cert_uuid = uuid_lib.UUID(certification_id)
+        variant = _image_variant(size)
         result = await db.execute(select(Certification).where(Certification.id == cert_uuid))
         cert = result.scalar_one_or_none()
         if not cert:
             raise HTTPException(status_code=404, detail="Сертификат не найден")
 
         scan_path = getattr(cert, "scan_file_path", None)
-        if not scan_path or not Path(scan_path).exists():
+        if not await blob_store.file_exists(scan_path):
             raise HTTPException(status_code=404, detail="Скан не найден")
 
-        return FileResponse(
-            path=scan_path,
-            filename=(getattr(cert, "scan_file_name", None) or "certificate-scan"),
+        variant_response = await _image_variant_response(
+            request, scan_path, cert.scan_mime_type, variant,
+            cert.scan_file_name, cert.scan_blob_sha256,
+        )
+        if variant_response:
+            return variant_response
+
+        return await file_response(
+            request,
+            scan_path,
             media_type=(getattr(cert, "scan_mime_type", None) or "application/octet-stream"),
+            filename=(getattr(cert, "scan_file_name", None) or "certificate-scan"),
+            etag=cert.scan_blob_sha256,
         )
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid certification_id format")
@@ -1829,20 +1980,15 @@ async def delete_certification_scan(
         if not cert:
             raise HTTPException(status_code=404, detail="Сертификат не найден")
 
-        scan_path = getattr(cert, "scan_file_path", None)
-        if scan_path:
-            try:
-                p = Path(scan_path)
-                if p.exists():
-                    p.unlink()
-            except Exception:
-                pass
-
+        old_ref = (cert.scan_file_path, cert.scan_blob_sha256)
         cert.scan_file_path = None
+        cert.scan_blob_sha256 = None
         cert.scan_file_name = None
         cert.scan_file_size = None
         cert.scan_mime_type = None
         await db.commit()
+        await blob_store.discard([old_ref])
+        invalidate_engineer_bundles(cert.engineer_id)
 
         return {"message": "Скан удален"}
     except ValueError:
@@ -1984,90 +2130,23 @@ async def get_inspection_preview(inspection_id: str, db: AsyncSession = Depends(
     """Получить данные инспекции для предпросмотра перед генерацией отчета"""
     try:
         inspection_uuid = uuid_lib.UUID(inspection_id)
-        
-        # Получаем данные инспекции
-        result = await db.execute(
-            select(Inspection).where(Inspection.id == inspection_uuid)
-        )
-        inspection = result.scalar_one_or_none()
-        if not inspection:
-            raise HTTPException(status_code=404, detail="Inspection not found")
-        
-        # Получаем данные оборудования
-        eq_result = await db.execute(
-            select(Equipment).where(Equipment.id == inspection.equipment_id)
-        )
-        equipment = eq_result.scalar_one_or_none()
-        if not equipment:
-            raise HTTPException(status_code=404, detail="Equipment not found")
-        
-        # Получаем методы НК через questionnaire_id
-        # Сначала находим questionnaire для этого inspection
-        questionnaire_result = await db.execute(
-            select(Questionnaire).where(Questionnaire.equipment_id == equipment.id)
-            .order_by(Questionnaire.created_at.desc())
-        )
-        questionnaire = questionnaire_result.scalar_one_or_none()
-        
-        ndt_methods = []
-        if questionnaire:
-            ndt_result = await db.execute(
-                select(NDTMethod).where(NDTMethod.questionnaire_id == questionnaire.id)
-            )
-            ndt_methods = ndt_result.scalars().all()
-        
-        # Получаем данные ресурса, если есть
-        resource_data = None
-        res_result = await db.execute(
-            select(EquipmentResource).where(EquipmentResource.equipment_id == equipment.id)
-            .order_by(EquipmentResource.created_at.desc())
-        )
-        resource = res_result.scalar_one_or_none()
-        if resource:
-            # Используем поля, которые есть в модели EquipmentResource
-            resource_data = {
-                "resource_type": resource.resource_type,
-                "current_value": float(resource.current_value) if resource.current_value else None,
-                "limit_value": float(resource.limit_value) if resource.limit_value else None,
-                "unit": resource.unit,
-                "last_updated": resource.last_updated.isoformat() if resource.last_updated else None,
-            }
-        
+
+        # Тот же контекст, что и для генерации PDF/DOCX
+        ctx = await build_report_context(db, inspection_uuid)
+
         return {
-            "inspection": {
-                "id": str(inspection.id),
-                "date_performed": inspection.date_performed.isoformat() if inspection.date_performed else None,
-                "status": inspection.status,
-                "conclusion": inspection.conclusion,
-                "data": inspection.data,
-            },
-            "equipment": {
-                "id": str(equipment.id),
-                "name": equipment.name,
-                "serial_number": equipment.serial_number,
-                "location": equipment.location,
-                "commissioning_date": str(equipment.commissioning_date) if equipment.commissioning_date else None,
-                "attributes": equipment.attributes or {},
-            },
+            "inspection": ctx["inspection"],
+            "equipment": ctx["equipment"],
             "questionnaire": {
-                "id": str(questionnaire.id) if questionnaire else None,
+                "id": ctx["questionnaire_id"],
             },
-            "ndt_methods": [
-                {
-                    "method_code": m.method_code,
-                    "method_name": m.method_name,
-                    "is_performed": bool(m.is_performed),
-                    "standard": m.standard,
-                    "equipment": m.equipment,
-                    "inspector_name": m.inspector_name,
-                    "inspector_level": m.inspector_level,
-                    "results": m.results,
-                    "defects": m.defects,
-                    "conclusion": m.conclusion,
-                }
-                for m in ndt_methods
+            "ndt_methods": ctx["ndt_methods"],
+            "resource": ctx["resource"],
+            "document_files": [
+                {k: v for k, v in f.items() if k != "file_path"}
+                for f in ctx["document_files"]
             ],
-            "resource": resource_data,
+            "verification_equipment": ctx["verification_equipment"],
         }
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid inspection_id format")
@@ -2079,6 +2158,54 @@ async def get_inspection_preview(inspection_id: str, db: AsyncSession = Depends(
         raise HTTPException(status_code=500, detail=f"Failed to get preview: {str(e)}")
 
 
+
+@app.get("/api/inspections/{inspection_id}/preview/pages", dependencies=[Depends(limit("reports"))])
+async def get_inspection_preview_pages(
+    inspection_id: str,
+    report_type: str = "TECHNICAL_REPORT",
+    pages: int = report_preview.DEFAULT_PAGES,
+    width: int = report_preview.DEFAULT_WIDTH,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Визуальный предпросмотр: титульная часть и первые страницы отчета в виде
+    PNG-миниатюр (data URL). Миниатюры кешируются по отпечатку содержимого.
+    """
+    try:
+        inspection_uuid = uuid_lib.UUID(inspection_id)
+        if not report_preview.available():
+            raise HTTPException(status_code=501, detail="Визуальный предпросмотр недоступен (не установлен pypdfium2)")
+        if report_type not in ("TECHNICAL_REPORT", "EXPERTISE"):
+            raise HTTPException(status_code=400, detail="report_type должен быть TECHNICAL_REPORT или EXPERTISE")
+        pages = max(1, min(pages, report_preview.MAX_PAGES))
+        width = max(120, min(width, report_preview.MAX_WIDTH))
+
+        ctx = await build_report_context(db, inspection_uuid, include_resource=report_type == "EXPERTISE")
+        await fetch_attachments(ctx)
+        result = await run_in_pool(report_preview.render_preview, ctx, report_type, pages, width)
+
+        def _read_pages():
+            items = []
+            for idx, path in enumerate(result["pages"], 1):
+                data = Path(path).read_bytes()
+                items.append({"page": idx, "image": "data:image/png;base64," + base64.b64encode(data).decode("ascii")})
+            return items
+
+        return {
+            "fingerprint": result["fingerprint"],
+            "report_type": report_type,
+            "pages": await asyncio.to_thread(_read_pages),
+        }
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid inspection_id format")
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to render preview: {str(e)}")
+
 @app.get("/api/inspections/{inspection_id}/questionnaire")
 async def get_inspection_questionnaire_info(
     inspection_id: str,
@@ -2145,335 +2272,255 @@ async def get_inspection_questionnaire_info(
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Failed to get inspection questionnaire info: {str(e)}")
 
-@app.post("/api/reports/generate")
-async def generate_report(
-    report_data: dict,
-    username: str = Depends(verify_token),
-    db: AsyncSession = Depends(get_db)
-):
-    """Generate technical report or expertise"""
-    try:
-        # Текущий пользователь
-        user_result = await db.execute(select(User).where(User.username == username))
-        current_user = user_result.scalar_one_or_none()
-        if not current_user:
-            raise HTTPException(status_code=404, detail="User not found")
+def _report_output_paths(reports_dir: Path, report_type: str, inspection_id, formats: List[str]) -> dict:
+    """Пути файлов отчета по форматам: {"pdf": ..., "docx": ...}"""
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return {fmt: str(reports_dir / f"{report_type}_{inspection_id}_{stamp}.{fmt}") for fmt in formats}
 
-        inspection_id = None
-        if report_data.get("inspection_id"):
-            try:
-                inspection_id = uuid_lib.UUID(report_data.get("inspection_id"))
-            except:
-                raise HTTPException(status_code=400, detail="Invalid inspection_id format")
-        
-        # Get inspection data
-        if inspection_id:
-            result = await db.execute(
-                select(Inspection).where(Inspection.id == inspection_id)
-            )
-            inspection = result.scalar_one_or_none()
-            if not inspection:
-                raise HTTPException(status_code=404, detail="Inspection not found")
-            
-            # Get equipment data
-            eq_result = await db.execute(
-                select(Equipment).where(Equipment.id == inspection.equipment_id)
-            )
-            equipment = eq_result.scalar_one_or_none()
-            if not equipment:
-                raise HTTPException(status_code=404, detail="Equipment not found")
-            
-            # Get resource data if expertise
-            resource_data = None
-            if report_data.get("report_type") == "EXPERTISE":
-                res_result = await db.execute(
-                    select(EquipmentResource).where(EquipmentResource.equipment_id == equipment.id)
-                    .order_by(EquipmentResource.created_at.desc())
-                )
-                resource = res_result.scalar_one_or_none()
-                if resource:
-                    # Используем поля, которые есть в модели EquipmentResource
-                    resource_data = {
-                        "resource_type": resource.resource_type,
-                        "current_value": float(resource.current_value) if resource.current_value else None,
-                        "limit_value": float(resource.limit_value) if resource.limit_value else None,
-                        "unit": resource.unit,
-                        "last_updated": resource.last_updated.isoformat() if resource.last_updated else None,
-                    }
-            
-            # Методы НК:
-            # 1) Сначала пытаемся взять методы, привязанные напрямую к inspection_id (3.3.0+)
-            # 2) Фолбэк: методы, привязанные к последнему questionnaire по этому оборудованию (историческая логика)
-            ndt_methods = []
-            try:
-                ndt_result = await db.execute(
-                    select(NDTMethod).where(NDTMethod.inspection_id == inspection.id)
-                )
-                ndt_methods = ndt_result.scalars().all()
-            except Exception:
-                ndt_methods = []
 
-            if not ndt_methods:
-                questionnaire_result = await db.execute(
-                    select(Questionnaire).where(Questionnaire.equipment_id == equipment.id)
-                    .order_by(Questionnaire.created_at.desc())
-                )
-                questionnaire = questionnaire_result.scalar_one_or_none()
+async def _new_report_record(db: AsyncSession, inspection_id, report_type: str, output_paths: dict, sizes: dict, created_by) -> Report:
+    """
+    Запись Report: file_path — основной файл (PDF, если он есть), word_* — DOCX.
+    Отрисованные файлы переносятся в blob_store (в транзакции db): повторная
+    генерация неизменного отчета не создает на диске новой копии.
+    """
+    stored = {}
+    for fmt, path in output_paths.items():
+        stored[fmt] = await blob_store.adopt_file(db, path)
+    main_format = "pdf" if "pdf" in output_paths else "docx"
+    report = Report(
+        inspection_id=inspection_id,
+        report_type=report_type,
+        file_path=stored[main_format][0],
+        file_size=sizes.get(main_format, 0),
+        blob_sha256=stored[main_format][1],
+        created_by=created_by,
+    )
+    if "docx" in output_paths:
+        report.word_file_path, report.word_blob_sha256 = stored["docx"]
+        report.word_file_size = sizes.get("docx", 0)
+    return report
 
-                if questionnaire:
-                    ndt_result = await db.execute(
-                        select(NDTMethod).where(NDTMethod.questionnaire_id == questionnaire.id)
-                    )
-                    ndt_methods = ndt_result.scalars().all()
 
-            # Вложения чек-листа (фото таблички/схема контроля/сканы документов) — привязаны к Questionnaire
-            document_files = []
-            try:
-                q_query = select(Questionnaire).where(Questionnaire.equipment_id == equipment.id)
-                if getattr(inspection, "created_at", None):
-                    q_query = q_query.order_by(
-                        func.abs(func.extract("epoch", Questionnaire.created_at - inspection.created_at))
-                    )
-                else:
-                    q_query = q_query.order_by(Questionnaire.created_at.desc())
-
-                q_result = await db.execute(q_query)
-                q_for_files = q_result.scalar_one_or_none()
-                if q_for_files:
-                    files_result = await db.execute(
-                        select(QuestionnaireDocumentFile).where(
-                            QuestionnaireDocumentFile.questionnaire_id == q_for_files.id
-                        )
-                    )
-                    files = files_result.scalars().all()
-                    document_files = [
-                        {
-                            "document_number": f.document_number,
-                            "file_name": f.file_name,
-                            "file_path": f.file_path,
-                            "file_size": int(f.file_size or 0),
-                            "file_type": f.file_type,
-                            "mime_type": f.mime_type,
-                        }
-                        for f in files
-                    ]
-            except Exception:
-                document_files = []
-            
-            # Получаем используемое оборудование для поверок
-            verification_equipment_list = []
+def _report_file_refs(report: Report) -> list:
+    """Файлы отчета для blob_store.discard: [(путь, sha256)]"""
+    refs = [(report.file_path, report.blob_sha256)]
+    # При генерации только DOCX оба поля указывают на один файл (одна ссылка)
+    if report.word_file_path and report.word_file_path != report.file_path:
+        refs.append((report.word_file_path, report.word_blob_sha256))
+    return refs
+
+
+# Размер пачки массовых операций (удаление/архивирование чек-листов и отчетов):
+# каждая пачка — один UPDATE/DELETE в отдельной короткой транзакции
+# (блокировки строк не держатся на всю операцию)
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+BULK_ALL_ROLES = ["admin", "chief_operator", "operator"]
+
+
+def _chunks(items: list):
+    for offset in range(0, len(items), BULK_CHUNK_SIZE):
+        yield items[offset:offset + BULK_CHUNK_SIZE]
+
+
+def _any_id(ids: list):
+    """Массив id одним параметром: ... = ANY($1) вместо IN с параметром на каждый id"""
+    return any_(bindparam("ids", ids, type_=ARRAY(PG_UUID(as_uuid=True)), unique=True))
+
+
+def _parse_uuids(values: List[str]) -> list:
+    """UUID из списка строк; некорректные значения пропускаются"""
+    ids = []
+    for value in values:
+        try:
+            ids.append(uuid_lib.UUID(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def _inspection_owner_filter(user: User):
+    """Условие доступа к чек-листам для массовых операций (None — доступны все)"""
+    if user.role in BULK_ALL_ROLES:
+        return None
+    if user.role == "engineer":
+        return Inspection.inspector_id == user.id
+    return false()
+
+
+def _report_owner_filter(user: User):
+    """Условие доступа к отчетам для массовых операций (как в get_reports; None — доступны все)"""
+    if user.role in BULK_ALL_ROLES:
+        return None
+    if user.role == "engineer":
+        return or_(
+            Report.created_by == user.id,
+            and_(
+                Report.created_by.is_(None),
+                Report.inspection_id.in_(select(Inspection.id).where(Inspection.inspector_id == user.id)),
+            ),
+        )
+    return false()
+
+
+def _returned_report_files(rows) -> list:
+    """_report_file_refs для строк RETURNING (file_path, blob_sha256, word_file_path, word_blob_sha256)"""
+    refs = []
+    for file_path, blob_sha256, word_file_path, word_blob_sha256 in rows:
+        refs.append((file_path, blob_sha256))
+        if word_file_path and word_file_path != file_path:
+            refs.append((word_file_path, word_blob_sha256))
+    return refs
+
+
+_REPORT_FILE_COLUMNS = (Report.file_path, Report.blob_sha256, Report.word_file_path, Report.word_blob_sha256)
+
+
+async def _bulk_ids(db: AsyncSession, query, where) -> list:
+    """id, отобранные запросом query с условием доступа where"""
+    if where is not None:
+        query = query.where(where)
+    return list((await db.execute(query)).scalars().all())
+
+
+async def _delete_inspections(db: AsyncSession, inspection_ids: list, label: str) -> dict:
+    """
+    Удалить чек-листы с отчетами, методами НК и привязками оборудования для поверок
+    set-based запросами DELETE ... WHERE inspection_id = ANY(...) пачками по
+    BULK_CHUNK_SIZE, с фиксацией после каждой пачки. Файлы отчетов
+    освобождаются после фиксации пачки (удаление с диска — в фоне, file_gc).
+    """
+    deleted = 0
+    reports_deleted = 0
+    chunks = 0
+    total = len(inspection_ids)
+    for chunk in _chunks(inspection_ids):
+        rep_result = await db.execute(
+            delete(Report)
+            .where(Report.inspection_id == _any_id(chunk))
+            .returning(*_REPORT_FILE_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        rows = rep_result.all()
+        reports_deleted += len(rows)
+        await db.execute(
+            delete(NDTMethod)
+            .where(NDTMethod.inspection_id == _any_id(chunk))
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(InspectionEquipment)
+            .where(InspectionEquipment.inspection_id == _any_id(chunk))
+            .execution_options(synchronize_session=False)
+        )
+        insp_result = await db.execute(
+            delete(Inspection)
+            .where(Inspection.id == _any_id(chunk))
+            .returning(Inspection.id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted += len(insp_result.all())
+        await db.commit()
+        await blob_store.discard(_returned_report_files(rows))
+        chunks += 1
+        if total > BULK_CHUNK_SIZE:
+            processed = min(chunks * BULK_CHUNK_SIZE, total)
+            print(f"🧹 {label}: {processed}/{total} inspections processed, {deleted} deleted")
+    return {"deleted": deleted, "reports_deleted": reports_deleted, "chunks": chunks}
+
+
+async def _delete_reports(db: AsyncSession, report_ids: list, where=None) -> int:
+    """DELETE ... RETURNING пачками (where — условие доступа); файлы освобождаются после фиксации пачки"""
+    deleted = 0
+    for chunk in _chunks(report_ids):
+        stmt = delete(Report).where(Report.id == _any_id(chunk))
+        if where is not None:
+            stmt = stmt.where(where)
+        result = await db.execute(
+            stmt.returning(*_REPORT_FILE_COLUMNS).execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        await db.commit()
+        await blob_store.discard(_returned_report_files(rows))
+        deleted += len(rows)
+    return deleted
+
+
+async def _set_archived(db: AsyncSession, model, ids: list, archive: bool, where=None) -> int:
+    """UPDATE ... SET is_archived RETURNING id пачками; число обновленных строк"""
+    updated = 0
+    for chunk in _chunks(ids):
+        stmt = update(model).where(model.id == _any_id(chunk)).values(is_archived=archive)
+        if where is not None:
+            stmt = stmt.where(where)
+        result = await db.execute(stmt.returning(model.id).execution_options(synchronize_session=False))
+        updated += len(result.all())
+        await db.commit()
+    return updated
+
+
+def _report_download_name(report: Report, path: str) -> str:
+    """Имя файла отчета для скачивания (файл в blob_store назван по хешу)"""
+    if not report.blob_sha256 and not report.word_blob_sha256:
+        return os.path.basename(path)
+    created = report.created_at or datetime.now()
+    return f"{report.report_type}_{report.inspection_id}_{created.strftime('%Y%m%d_%H%M%S')}{Path(path).suffix}"
+
+
+@app.post("/api/reports/generate", dependencies=[Depends(limit("reports"))])
+async def generate_report(
+    report_data: dict,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Generate technical report or expertise"""
+    try:
+        # Текущий пользователь
+        user_result = await db.execute(select(User).where(User.username == username))
+        current_user = user_result.scalar_one_or_none()
+        if not current_user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        inspection_id = None
+        if report_data.get("inspection_id"):
             try:
-                # Ищем по inspection_id
-                inspection_eq_result = await db.execute(
-                    select(InspectionEquipment).where(InspectionEquipment.inspection_id == inspection.id)
-                )
-                inspection_equipment = inspection_eq_result.scalars().all()
-                
-                for ie in inspection_equipment:
-                    ver_eq_result = await db.execute(
-                        select(VerificationEquipment).where(VerificationEquipment.id == ie.verification_equipment_id)
-                    )
-                    ver_eq = ver_eq_result.scalar_one_or_none()
-                    if ver_eq:
-                        verification_equipment_list.append({
-                            "id": str(ver_eq.id),
-                            "name": ver_eq.name,
-                            "equipment_type": ver_eq.equipment_type,
-                            "serial_number": ver_eq.serial_number,
-                            "manufacturer": ver_eq.manufacturer,
-                            "model": ver_eq.model,
-                            "verification_date": ver_eq.verification_date.isoformat() if ver_eq.verification_date else None,
-                            "next_verification_date": ver_eq.next_verification_date.isoformat() if ver_eq.next_verification_date else None,
-                            "verification_certificate_number": ver_eq.verification_certificate_number,
-                            "verification_organization": ver_eq.verification_organization,
-                            "scan_file_path": ver_eq.scan_file_path,
-                            "scan_file_name": ver_eq.scan_file_name,
-                        })
-            except Exception as e:
-                print(f"Warning: Could not load verification equipment: {e}")
-                verification_equipment_list = []
+                inspection_id = uuid_lib.UUID(report_data.get("inspection_id"))
+            except:
+                raise HTTPException(status_code=400, detail="Invalid inspection_id format")
+        
+        # Get inspection data
+        if inspection_id:
+            report_type = report_data.get("report_type", "TECHNICAL_REPORT")
+
+            # Все данные отчета (инспекция, оборудование, ресурс, методы НК, вложения,
+            # поверенное оборудование, документы специалистов) — пакетными запросами
+            ctx = await build_report_context(db, inspection_id, include_resource=report_type == "EXPERTISE")
             
             # Generate report
             reports_dir = Path("/app/reports")
             reports_dir.mkdir(exist_ok=True)
             
-            report_type = report_data.get("report_type", "TECHNICAL_REPORT")
-            # pdf или docx (поддерживаем также WORD/DOC)
-            output_format = (report_data.get("format") or "pdf").strip().lower()
-            is_docx = output_format in ["docx", "doc", "word"]
-            
-            if is_docx:
-                # Генерация Word документа
-                from word_generator import WordGenerator
-                word_generator = WordGenerator()
-                filename = f"{report_type}_{inspection.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-                file_path = reports_dir / filename
-            else:
-                # Генерация PDF
-                generator = ReportGenerator()
-                filename = f"{report_type}_{inspection.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                file_path = reports_dir / filename
-            
-            # Проверяем, что ndt_methods не None и является списком
-            if ndt_methods is None:
-                ndt_methods = []
-            
-            ndt_methods_data = [
-                {
-                    "method_code": m.method_code,
-                    "method_name": m.method_name,
-                    "is_performed": bool(m.is_performed),
-                    "standard": m.standard,
-                    "equipment": m.equipment,
-                    "inspector_name": m.inspector_name,
-                    "inspector_level": m.inspector_level,
-                    "results": m.results,
-                    "defects": m.defects,
-                    "conclusion": m.conclusion,
-                    "photos": m.photos or [],
-                    "additional_data": m.additional_data or {},
-                    "performed_date": m.performed_date.isoformat() if m.performed_date else None,
-                }
-                for m in ndt_methods
-            ]
-
-            # Приложения: документы специалистов (удостоверения/сертификаты НК) по ФИО из методов НК
-            specialist_docs = []
-            try:
-                inspector_names = sorted(
-                    {str(m.get("inspector_name")).strip() for m in ndt_methods_data if m.get("inspector_name")},
-                    key=lambda s: s.lower(),
-                )
-                for name in inspector_names:
-                    # ищем пользователя по full_name или username
-                    ures = await db.execute(
-                        select(User).where(or_(User.full_name == name, User.username == name))
-                    )
-                    u = ures.scalar_one_or_none()
-                    if not u or not getattr(u, "engineer_id", None):
-                        continue
-                    certs_res = await db.execute(
-                        select(Certification).where(
-                            Certification.engineer_id == u.engineer_id,
-                            Certification.scan_file_path.is_not(None),
-                        )
-                    )
-                    certs = certs_res.scalars().all()
-                    items = []
-                    for c in certs:
-                        sp = getattr(c, "scan_file_path", None)
-                        if not sp:
-                            continue
-                        items.append(
-                            {
-                                "certification_type": getattr(c, "certification_type", None),
-                                "certificate_number": getattr(c, "certificate_number", None),
-                                "issuing_organization": getattr(c, "issuing_organization", None),
-                                "issue_date": str(getattr(c, "issue_date", None)) if getattr(c, "issue_date", None) else None,
-                                "expiry_date": str(getattr(c, "expiry_date", None)) if getattr(c, "expiry_date", None) else None,
-                                "scan_file_path": sp,
-                                "scan_file_name": getattr(c, "scan_file_name", None),
-                                "scan_mime_type": getattr(c, "scan_mime_type", None),
-                            }
-                        )
-                    if items:
-                        specialist_docs.append({"inspector_name": name, "certifications": items})
-            except Exception:
-                specialist_docs = []
+            # pdf, docx (поддерживаем также WORD/DOC) или оба формата ("both")
+            formats = report_formats(report_data.get("format"))
+            output_paths = _report_output_paths(reports_dir, report_type, inspection_id, formats)
             
-            if is_docx:
-                # Генерация Word документа
-                word_generator.generate_report_word(
-                    {
-                        "date_performed": inspection.date_performed.isoformat() if inspection.date_performed else None,
-                        "data": inspection.data,
-                        "conclusion": inspection.conclusion,
-                        "status": inspection.status,
-                    },
-                    {
-                        "id": str(equipment.id),
-                        "name": equipment.name,
-                        "serial_number": equipment.serial_number,
-                        "location": equipment.location,
-                        "commissioning_date": str(equipment.commissioning_date) if equipment.commissioning_date else None,
-                        "attributes": equipment.attributes or {},
-                    },
-                    ndt_methods_data,
-                    str(file_path),
-                    report_type,
-                    document_files=document_files,
-                    specialist_docs=specialist_docs,
-                    verification_equipment=verification_equipment_list,
-                )
-            else:
-                # Генерация PDF
-                if report_type == "EXPERTISE":
-                    generator.generate_expertise_report(
-                        {
-                            "date_performed": inspection.date_performed.isoformat() if inspection.date_performed else None,
-                            "data": inspection.data,
-                            "conclusion": inspection.conclusion,
-                            "status": inspection.status,
-                        },
-                        {
-                            "id": str(equipment.id),
-                            "name": equipment.name,
-                            "serial_number": equipment.serial_number,
-                            "location": equipment.location,
-                            "commissioning_date": str(equipment.commissioning_date) if equipment.commissioning_date else None,
-                            "attributes": equipment.attributes or {},
-                        },
-                        resource_data,
-                        str(file_path),
-                        ndt_methods_data,
-                        document_files=document_files,
-                        specialist_docs=specialist_docs,
-                        verification_equipment=verification_equipment_list,
-                    )
-                else:
-                    generator.generate_technical_report(
-                        {
-                            "date_performed": inspection.date_performed.isoformat() if inspection.date_performed else None,
-                            "data": inspection.data,
-                            "conclusion": inspection.conclusion,
-                            "status": inspection.status,
-                        },
-                        {
-                            "id": str(equipment.id),
-                            "name": equipment.name,
-                            "serial_number": equipment.serial_number,
-                            "location": equipment.location,
-                            "commissioning_date": str(equipment.commissioning_date) if equipment.commissioning_date else None,
-                            "attributes": equipment.attributes or {},
-                        },
-                        str(file_path),
-                        ndt_methods_data,
-                        document_files=document_files,
-                        specialist_docs=specialist_docs,
-                        verification_equipment=verification_equipment_list,
-                    )
+            # Рендеринг — в пуле процессов, чтобы не блокировать event loop;
+            # при двух форматах модель документа строится один раз
+            sizes = await render_report_async(ctx, report_type, output_paths)
             
             # Save report record
-            new_report = Report(
-                inspection_id=inspection_id,
-                report_type=report_type,
-                file_path=str(file_path),
-                file_size=file_path.stat().st_size if file_path.exists() else 0,
-                created_by=current_user.id,
-            )
-            # Для DOCX также заполняем word_* поля (для единообразия и будущего расширения)
-            if is_docx:
-                new_report.word_file_path = str(file_path)
-                new_report.word_file_size = new_report.file_size
+            new_report = await _new_report_record(db, inspection_id, report_type, output_paths, sizes, current_user.id)
             db.add(new_report)
             await db.commit()
             await db.refresh(new_report)
             
             return {
                 "id": str(new_report.id),
-                "file_path": str(file_path),
+                "file_path": new_report.file_path,
                 "file_size": new_report.file_size,
-                "format": "docx" if is_docx else "pdf",
+                "word_file_path": new_report.word_file_path,
+                "format": "both" if len(formats) > 1 else formats[0],
                 "status": "generated"
             }
         else:
@@ -2487,6 +2534,177 @@ async def generate_report(
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
 
 
+async def _render_batch_report(inspection_id, report_type: str, formats: List[str], created_by, semaphore: asyncio.Semaphore):
+    """Сгенерировать один отчет пакета: контекст, рендеринг в пуле, запись Report.
+    Возвращает (inspection_id, [(имя в архиве, путь)], текст ошибки)."""
+    async with semaphore:
+        try:
+            async with AsyncSessionLocal() as session:
+                ctx = await build_report_context(session, inspection_id, include_resource=report_type == "EXPERTISE")
+                reports_dir = Path("/app/reports")
+                reports_dir.mkdir(exist_ok=True)
+                output_paths = _report_output_paths(reports_dir, report_type, inspection_id, formats)
+                sizes = await render_report_async(ctx, report_type, output_paths)
+                new_report = await _new_report_record(session, inspection_id, report_type, output_paths, sizes, created_by)
+                session.add(new_report)
+                await session.commit()
+            files = [(os.path.basename(output_paths["pdf" if "pdf" in output_paths else "docx"]), new_report.file_path)]
+            if new_report.word_file_path and new_report.word_file_path != new_report.file_path:
+                files.append((os.path.basename(output_paths["docx"]), new_report.word_file_path))
+            return inspection_id, files, None
+        except HTTPException as e:
+            return inspection_id, None, str(e.detail)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return inspection_id, None, str(e)
+
+
+async def _stream_reports_zip(inspection_ids, report_type: str, formats: List[str], created_by, slot=None):
+    """Рендеринг отчетов параллельно в пуле и выдача ZIP по мере готовности файлов.
+    slot — слот ограничителя "batch", освобождается после отдачи архива."""
+    semaphore = asyncio.Semaphore(max(1, render_workers()))
+    tasks = [
+        asyncio.create_task(_render_batch_report(insp_id, report_type, formats, created_by, semaphore))
+        for insp_id in inspection_ids
+    ]
+    archive = ZipStream()
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            inspection_id, file_paths, error = await next_done
+            if error:
+                errors.append(f"{inspection_id}: {error}")
+                continue
+            for arcname, file_path in file_paths:
+                async for chunk in archive.add_file(arcname, file_path):
+                    yield chunk
+        if errors:
+            yield archive.add_bytes("errors.txt", "\n".join(errors).encode("utf-8"))
+        yield archive.close()
+    finally:
+        # Клиент мог оборвать загрузку — не оставляем висящих задач
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if slot is not None:
+            slot.release()
+
+
+@app.post("/api/reports/batch")
+async def generate_reports_batch(
+    batch_data: dict,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Пакетная генерация отчетов по проекту (project_id) или списку инспекций (inspection_ids).
+    Отчеты рендерятся параллельно, ZIP-архив собирается и отдается потоком."""
+    try:
+        user_result = await db.execute(select(User).where(User.username == username))
+        current_user = user_result.scalar_one_or_none()
+        if not current_user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        report_type = batch_data.get("report_type", "TECHNICAL_REPORT")
+        formats = report_formats(batch_data.get("format"))
+
+        if batch_data.get("project_id"):
+            try:
+                project_uuid = uuid_lib.UUID(str(batch_data.get("project_id")))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid project_id format")
+            result = await db.execute(
+                select(Inspection.id)
+                .where(Inspection.project_id == project_uuid)
+                .order_by(Inspection.date_performed)
+            )
+            inspection_ids = list(result.scalars().all())
+            archive_name = f"reports_{project_uuid}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        elif batch_data.get("inspection_ids"):
+            try:
+                inspection_ids = list(dict.fromkeys(uuid_lib.UUID(str(i)) for i in batch_data.get("inspection_ids")))
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid inspection_ids format")
+            archive_name = f"reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        else:
+            raise HTTPException(status_code=400, detail="project_id or inspection_ids is required")
+
+        if not inspection_ids:
+            raise HTTPException(status_code=404, detail="No inspections found")
+
+        # Слот держится до конца выдачи архива, поэтому занимается вручную, а не зависимостью
+        slot = await get_limiter("batch").acquire()
+        return StreamingResponse(
+            _stream_reports_zip(inspection_ids, report_type, formats, current_user.id, slot),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{archive_name}"'},
+            # Если клиент отключился до начала выдачи, генератор не запускается — освобождаем здесь
+            background=BackgroundTask(slot.release),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to generate reports: {str(e)}")
+
+
+# Объявлен раньше /api/reports/{report_id}: иначе "cleanup" совпадает с id
+@app.delete("/api/reports/cleanup", dependencies=[Depends(limit("bulk"))])
+async def cleanup_reports(
+    older_than_days: int = 90,
+    before: Optional[str] = None,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Массовое удаление старых отчетов.
+    - admin/chief_operator/operator: удаляют любые
+    - engineer: удаляет только свои
+    Параметры:
+      - older_than_days: удалить старше N дней (по created_at)
+      - before: ISO дата/время (например 2025-12-01 или 2025-12-01T00:00:00)
+    Удаление — DELETE ... RETURNING пачками, файлы отчетов удаляются в фоне.
+    """
+    try:
+        user_result = await db.execute(select(User).where(User.username == username))
+        current_user = user_result.scalar_one_or_none()
+        if not current_user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        cutoff = None
+        if before:
+            try:
+                cutoff = datetime.fromisoformat(before.replace("Z", "+00:00"))
+            except Exception:
+                # fallback для формата YYYY-MM-DD
+                try:
+                    cutoff = datetime.strptime(before, "%Y-%m-%d")
+                except Exception:
+                    raise HTTPException(status_code=400, detail="Invalid 'before' format")
+        else:
+            if older_than_days < 1:
+                raise HTTPException(status_code=400, detail="older_than_days must be >= 1")
+            cutoff = datetime.now() - timedelta(days=int(older_than_days))
+
+        if current_user.role not in BULK_ALL_ROLES + ["engineer"]:
+            raise HTTPException(status_code=403, detail="Доступ запрещен")
+
+        # Инженер удаляет только свои отчеты (как в get_reports)
+        report_ids = await _bulk_ids(
+            db,
+            select(Report.id).where(Report.created_at < cutoff).order_by(Report.created_at),
+            _report_owner_filter(current_user),
+        )
+        deleted = await _delete_reports(db, report_ids)
+        return {"status": "ok", "deleted": deleted, "cutoff": cutoff.isoformat()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to cleanup reports: {str(e)}")
+
+
 @app.delete("/api/reports/{report_id}")
 async def delete_report(
     report_id: str,
@@ -2494,6 +2712,7 @@ async def delete_report(
     db: AsyncSession = Depends(get_db)
 ):
     """Удаление отчета (admin/operator — любой, engineer — только свой)"""
+    released_files = []
     try:
         report_uuid = uuid_lib.UUID(report_id)
 
@@ -2526,17 +2745,12 @@ async def delete_report(
             raise HTTPException(status_code=403, detail="Доступ запрещен")
 
         # Удаляем файлы
-        for p in [report.file_path, getattr(report, "word_file_path", None)]:
-            if p:
-                try:
-                    fp = Path(p)
-                    if fp.exists():
-                        fp.unlink()
-                except Exception:
-                    pass
+        released_files.extend(_report_file_refs(report))
 
         await db.delete(report)
         await db.commit()
+        # Файлы отчетов освобождаются после фиксации удаления записей
+        await blob_store.discard(released_files)
         return {"status": "deleted", "id": report_id}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid report_id format")
@@ -2549,13 +2763,13 @@ async def delete_report(
 class BulkDeleteInspectionsRequest(BaseModel):
     inspection_ids: List[str]
 
-@app.post("/api/inspections/bulk-delete")
+@app.post("/api/inspections/bulk-delete", dependencies=[Depends(limit("bulk"))])
 async def bulk_delete_inspections(
     request: BulkDeleteInspectionsRequest,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Массовое удаление чек-листов"""
+    """Массовое удаление чек-листов (пачками, см. _delete_inspections)"""
     try:
         inspection_ids = request.inspection_ids
         if not inspection_ids:
@@ -2570,67 +2784,21 @@ async def bulk_delete_inspections(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        deleted_count = 0
-        for inspection_id in inspection_ids:
-            try:
-                insp_uuid = uuid_lib.UUID(inspection_id)
-                insp_result = await db.execute(select(Inspection).where(Inspection.id == insp_uuid))
-                inspection = insp_result.scalar_one_or_none()
-                
-                if not inspection:
-                    continue
-                
-                # Проверка прав
-                allowed = False
-                if user.role in ["admin", "chief_operator", "operator"]:
-                    allowed = True
-                elif user.role == "engineer":
-                    if inspection.inspector_id and inspection.inspector_id == user.id:
-                        allowed = True
-                
-                if not allowed:
-                    continue
-                
-                # Удаляем связанные отчеты и их файлы
-                rep_result = await db.execute(select(Report).where(Report.inspection_id == inspection.id))
-                related_reports = rep_result.scalars().all()
-                for report in related_reports:
-                    for p in [report.file_path, getattr(report, "word_file_path", None)]:
-                        if p:
-                            try:
-                                fp = Path(p)
-                                if fp.exists():
-                                    fp.unlink()
-                            except Exception:
-                                pass
-                    await db.delete(report)
-                
-                # Удаляем связанные методы НК
-                try:
-                    ndt_result = await db.execute(select(NDTMethod).where(NDTMethod.inspection_id == inspection.id))
-                    for m in ndt_result.scalars().all():
-                        await db.delete(m)
-                except Exception:
-                    pass
-                
-                # Удаляем связанное оборудование для поверок
-                try:
-                    eq_result = await db.execute(select(InspectionEquipment).where(InspectionEquipment.inspection_id == inspection.id))
-                    for eq in eq_result.scalars().all():
-                        await db.delete(eq)
-                except Exception:
-                    pass
-                
-                # Теперь можно безопасно удалить сам чек-лист
-                await db.delete(inspection)
-                deleted_count += 1
-            except Exception as e:
-                # Логируем ошибку для отладки, но продолжаем обработку других записей
-                print(f"⚠️ Error deleting inspection {inspection_id}: {str(e)}")
-                continue
+        # Некорректные id пропускаются, как и чек-листы без прав на удаление
+        requested = _parse_uuids(inspection_ids)
+        allowed_ids = await _bulk_ids(
+            db, select(Inspection.id).where(Inspection.id == _any_id(requested)), _inspection_owner_filter(user)
+        )
         
-        await db.commit()
-        return {"deleted": deleted_count, "total": len(inspection_ids)}
+        stats = await _delete_inspections(db, allowed_ids, "bulk_delete_inspections")
+        return {
+            "deleted": stats["deleted"],
+            "reports_deleted": stats["reports_deleted"],
+            "chunks": stats["chunks"],
+            "total": len(inspection_ids),
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete inspections: {str(e)}")
@@ -2639,7 +2807,7 @@ class BulkArchiveRequest(BaseModel):
     inspection_ids: List[str]
     archive: bool = True
 
-@app.post("/api/inspections/bulk-archive")
+@app.post("/api/inspections/bulk-archive", dependencies=[Depends(limit("bulk"))])
 async def bulk_archive_inspections(
     request: BulkArchiveRequest,
     current_user: dict = Depends(get_current_user),
@@ -2661,34 +2829,13 @@ async def bulk_archive_inspections(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        archived_count = 0
-        for inspection_id in inspection_ids:
-            try:
-                insp_uuid = uuid_lib.UUID(inspection_id)
-                insp_result = await db.execute(select(Inspection).where(Inspection.id == insp_uuid))
-                inspection = insp_result.scalar_one_or_none()
-                
-                if not inspection:
-                    continue
-                
-                # Проверка прав
-                allowed = False
-                if user.role in ["admin", "chief_operator", "operator"]:
-                    allowed = True
-                elif user.role == "engineer":
-                    if inspection.inspector_id and inspection.inspector_id == user.id:
-                        allowed = True
-                
-                if not allowed:
-                    continue
-                
-                inspection.is_archived = archive
-                archived_count += 1
-            except Exception as e:
-                continue
-        
-        await db.commit()
+        # UPDATE ... WHERE id = ANY(...) пачками; чек-листы без прав на изменение пропускаются
+        archived_count = await _set_archived(
+            db, Inspection, _parse_uuids(inspection_ids), archive, _inspection_owner_filter(user)
+        )
         return {"archived": archived_count, "total": len(inspection_ids)}
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to archive inspections: {str(e)}")
@@ -2696,13 +2843,13 @@ async def bulk_archive_inspections(
 class BulkDeleteReportsRequest(BaseModel):
     report_ids: List[str]
 
-@app.post("/api/reports/bulk-delete")
+@app.post("/api/reports/bulk-delete", dependencies=[Depends(limit("bulk"))])
 async def bulk_delete_reports(
     request: BulkDeleteReportsRequest,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Массовое удаление отчетов"""
+    """Массовое удаление отчетов (DELETE ... RETURNING пачками)"""
     try:
         report_ids = request.report_ids
         if not report_ids:
@@ -2717,49 +2864,11 @@ async def bulk_delete_reports(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        deleted_count = 0
-        for report_id in report_ids:
-            try:
-                report_uuid = uuid_lib.UUID(report_id)
-                rep_result = await db.execute(select(Report).where(Report.id == report_uuid))
-                report = rep_result.scalar_one_or_none()
-                
-                if not report:
-                    continue
-                
-                # Проверка прав
-                allowed = False
-                if user.role in ["admin", "chief_operator", "operator"]:
-                    allowed = True
-                elif user.role == "engineer":
-                    if report.created_by and report.created_by == user.id:
-                        allowed = True
-                    elif report.created_by is None and report.inspection_id:
-                        insp_result = await db.execute(select(Inspection).where(Inspection.id == report.inspection_id))
-                        insp = insp_result.scalar_one_or_none()
-                        if insp and insp.inspector_id == user.id:
-                            allowed = True
-                
-                if not allowed:
-                    continue
-                
-                # Удаляем файлы
-                for p in [report.file_path, getattr(report, "word_file_path", None)]:
-                    if p:
-                        try:
-                            fp = Path(p)
-                            if fp.exists():
-                                fp.unlink()
-                        except Exception:
-                            pass
-                
-                await db.delete(report)
-                deleted_count += 1
-            except Exception as e:
-                continue
-        
-        await db.commit()
+        # Отчеты без прав на удаление пропускаются; файлы удаляются в фоне (file_gc)
+        deleted_count = await _delete_reports(db, _parse_uuids(report_ids), _report_owner_filter(user))
         return {"deleted": deleted_count, "total": len(report_ids)}
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete reports: {str(e)}")
@@ -2768,7 +2877,7 @@ class BulkArchiveReportsRequest(BaseModel):
     report_ids: List[str]
     archive: bool = True
 
-@app.post("/api/reports/bulk-archive")
+@app.post("/api/reports/bulk-archive", dependencies=[Depends(limit("bulk"))])
 async def bulk_archive_reports(
     request: BulkArchiveReportsRequest,
     current_user: dict = Depends(get_current_user),
@@ -2790,123 +2899,20 @@ async def bulk_archive_reports(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        archived_count = 0
-        for report_id in report_ids:
-            try:
-                report_uuid = uuid_lib.UUID(report_id)
-                rep_result = await db.execute(select(Report).where(Report.id == report_uuid))
-                report = rep_result.scalar_one_or_none()
-                
-                if not report:
-                    continue
-                
-                # Проверка прав
-                allowed = False
-                if user.role in ["admin", "chief_operator", "operator"]:
-                    allowed = True
-                elif user.role == "engineer":
-                    if report.created_by and report.created_by == user.id:
-                        allowed = True
-                    elif report.created_by is None and report.inspection_id:
-                        insp_result = await db.execute(select(Inspection).where(Inspection.id == report.inspection_id))
-                        insp = insp_result.scalar_one_or_none()
-                        if insp and insp.inspector_id == user.id:
-                            allowed = True
-                
-                if not allowed:
-                    continue
-                
-                report.is_archived = archive
-                archived_count += 1
-            except Exception as e:
-                continue
-        
-        await db.commit()
+        archived_count = await _set_archived(
+            db, Report, _parse_uuids(report_ids), archive, _report_owner_filter(user)
+        )
         return {"archived": archived_count, "total": len(report_ids)}
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to archive reports: {str(e)}")
-
-@app.delete("/api/reports/cleanup")
-async def cleanup_reports(
-    older_than_days: int = 90,
-    before: Optional[str] = None,
-    username: str = Depends(verify_token),
-    db: AsyncSession = Depends(get_db),
-):
-    """
-    Массовое удаление старых отчетов.
-    - admin/chief_operator/operator: удаляют любые
-    - engineer: удаляет только свои
-    Параметры:
-      - older_than_days: удалить старше N дней (по created_at)
-      - before: ISO дата/время (например 2025-12-01 или 2025-12-01T00:00:00)
-    """
-    try:
-        user_result = await db.execute(select(User).where(User.username == username))
-        current_user = user_result.scalar_one_or_none()
-        if not current_user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        cutoff = None
-        if before:
-            try:
-                cutoff = datetime.fromisoformat(before.replace("Z", "+00:00"))
-            except Exception:
-                # fallback для формата YYYY-MM-DD
-                try:
-                    cutoff = datetime.strptime(before, "%Y-%m-%d")
-                except Exception:
-                    raise HTTPException(status_code=400, detail="Invalid 'before' format")
-        else:
-            if older_than_days < 1:
-                raise HTTPException(status_code=400, detail="older_than_days must be >= 1")
-            cutoff = datetime.now() - timedelta(days=int(older_than_days))
-
-        query = select(Report).where(Report.created_at < cutoff)
-
-        # Ограничение инженера только своими отчетами (как в get_reports)
-        if current_user.role == "engineer":
-            query = (
-                query.join(Inspection, Report.inspection_id == Inspection.id, isouter=True)
-                .where(
-                    or_(
-                        Report.created_by == current_user.id,
-                        and_(Report.created_by.is_(None), Inspection.inspector_id == current_user.id),
-                    )
-                )
-            )
-        elif current_user.role not in ["admin", "chief_operator", "operator"]:
-            raise HTTPException(status_code=403, detail="Доступ запрещен")
-
-        result = await db.execute(query)
-        reports = result.scalars().all()
-
-        deleted = 0
-        for report in reports:
-            # удаляем файлы
-            for p in [report.file_path, getattr(report, "word_file_path", None)]:
-                if p:
-                    try:
-                        fp = Path(p)
-                        if fp.exists():
-                            fp.unlink()
-                    except Exception:
-                        pass
-            await db.delete(report)
-            deleted += 1
-
-        await db.commit()
-        return {"status": "ok", "deleted": deleted, "cutoff": cutoff.isoformat()}
     except HTTPException:
         raise
     except Exception as e:
         await db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to cleanup reports: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to archive reports: {str(e)}")
 
 @app.get("/api/reports/{report_id}/download")
 async def download_report(
     report_id: str,
+    request: Request,
     format: Optional[str] = None,
     username: str = Depends(verify_token),
     db: AsyncSession = Depends(get_db),
@@ -2943,36 +2949,37 @@ async def download_report(
         fmt = (format or "").strip().lower()
         selected_path = None
         if fmt in ["docx", "doc", "word"]:
-            if report.word_file_path and os.path.exists(report.word_file_path):
+            if await blob_store.file_exists(report.word_file_path):
                 selected_path = report.word_file_path
-            elif report.file_path and str(report.file_path).lower().endswith(".docx") and os.path.exists(report.file_path):
+            elif report.file_path and str(report.file_path).lower().endswith(".docx") and await blob_store.file_exists(report.file_path):
                 selected_path = report.file_path
         elif fmt in ["pdf"]:
-            if report.file_path and str(report.file_path).lower().endswith(".pdf") and os.path.exists(report.file_path):
+            if report.file_path and str(report.file_path).lower().endswith(".pdf") and await blob_store.file_exists(report.file_path):
                 selected_path = report.file_path
 
         if not selected_path:
             # auto
-            if report.file_path and os.path.exists(report.file_path):
+            if await blob_store.file_exists(report.file_path):
                 selected_path = report.file_path
-            elif report.word_file_path and os.path.exists(report.word_file_path):
+            elif await blob_store.file_exists(report.word_file_path):
                 selected_path = report.word_file_path
 
-        if not selected_path or not os.path.exists(selected_path):
+        if not selected_path:
             raise HTTPException(status_code=404, detail="Report file not found")
 
-        filename = os.path.basename(selected_path)
+        filename = _report_download_name(report, selected_path)
         lower = filename.lower()
         if lower.endswith(".docx"):
             media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
         else:
             media_type = "application/pdf"
 
-        return FileResponse(
-            selected_path,
-            media_type=media_type,
-            filename=filename
-        )
+        if selected_path == report.file_path:
+            etag = report.blob_sha256
+        else:
+            etag = report.word_blob_sha256
+
+        return await file_response(request, selected_path, media_type, filename=filename, etag=etag)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid report_id format")
     except HTTPException:
@@ -3223,7 +3230,30 @@ async def add_ndt_method_to_inspection(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to add NDT method: {str(e)}")
 
-@app.post("/api/questionnaires/{questionnaire_id}/generate-pdf")
+async def _render_questionnaire_file(render, db: AsyncSession, questionnaire_id, extension: str) -> Tuple[str, str, int]:
+    """
+    Отрисовать файл опросного листа (render(путь)) и перенести его в blob_store
+    (в транзакции db), как отчеты: неизменный файл на диске/в хранилище один,
+    при STORAGE_BACKEND=s3 его видят все реплики. Возвращает (путь, sha256, размер).
+    """
+    questionnaires_dir = Path("/app/reports/questionnaires")
+    questionnaires_dir.mkdir(parents=True, exist_ok=True)
+    file_path = questionnaires_dir / f"questionnaire_{questionnaire_id}_{uuid_lib.uuid4().hex}{extension}"
+    try:
+        render(str(file_path))
+        size = file_path.stat().st_size
+        stored_path, sha256 = await blob_store.adopt_file(db, str(file_path))
+    except Exception:
+        await remove_file(str(file_path))
+        raise
+    return stored_path, sha256, size
+
+
+def _questionnaire_download_name(questionnaire, extension: str) -> str:
+    return f"questionnaire_{questionnaire.id}{extension}"
+
+
+@app.post("/api/questionnaires/{questionnaire_id}/generate-pdf", dependencies=[Depends(limit("reports"))])
 async def generate_questionnaire_pdf(
     questionnaire_id: str,
     db: AsyncSession = Depends(get_db)
@@ -3231,80 +3261,49 @@ async def generate_questionnaire_pdf(
     """Сгенерировать PDF для опросного листа"""
     try:
         q_uuid = uuid_lib.UUID(questionnaire_id)
-        result = await db.execute(
-            select(Questionnaire).where(Questionnaire.id == q_uuid)
-        )
-        questionnaire = result.scalar_one_or_none()
-        
-        if not questionnaire:
-            raise HTTPException(status_code=404, detail="Questionnaire not found")
-        
-        # Получаем данные об оборудовании
-        eq_result = await db.execute(
-            select(Equipment).where(Equipment.id == questionnaire.equipment_id)
-        )
-        equipment = eq_result.scalar_one_or_none()
-        
-        if not equipment:
-            raise HTTPException(status_code=404, detail="Equipment not found")
-        
-        # Получаем методы НК
-        ndt_result = await db.execute(
-            select(NDTMethod).where(NDTMethod.questionnaire_id == q_uuid)
-        )
-        ndt_methods = ndt_result.scalars().all()
+
+        # Опросный лист, оборудование, методы НК и вложения
+        ctx = await build_questionnaire_context(db, q_uuid)
+        questionnaire = ctx["questionnaire"]
+
+        # Содержимое не менялось — отдаем уже сгенерированный файл
+        if (
+            questionnaire.content_hash == ctx["content_hash"]
+            and questionnaire.file_path
+            and await blob_store.file_exists(questionnaire.file_path)
+        ):
+            return {
+                "id": str(questionnaire.id),
+                "file_path": questionnaire.file_path,
+                "file_size": questionnaire.file_size,
+                "status": "unchanged"
+            }
         
         # Генерируем PDF
         generator = ReportGenerator()
-        # Храним генерируемые файлы в /app/reports (примонтирован в docker-compose),
-        # чтобы они не пропадали при пересборке контейнера.
-        questionnaires_dir = Path("/app/reports/questionnaires")
-        questionnaires_dir.mkdir(parents=True, exist_ok=True)
-        
-        filename = f"questionnaire_{questionnaire.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        file_path = questionnaires_dir / filename
-        
-        generator.generate_questionnaire_report(
-            questionnaire.questionnaire_data or {},
-            {
-                "id": str(equipment.id),
-                "name": equipment.name,
-                "serial_number": equipment.serial_number,
-                "location": equipment.location,
-            },
-            {
-                "inventory_number": questionnaire.equipment_inventory_number,
-                "equipment_name": questionnaire.equipment_name,
-                "inspection_date": questionnaire.inspection_date.isoformat() if questionnaire.inspection_date else None,
-                "inspector_name": questionnaire.inspector_name,
-                "inspector_position": questionnaire.inspector_position,
-            },
-            str(file_path),
-            [
-                {
-                    "method_code": m.method_code,
-                    "method_name": m.method_name,
-                    "is_performed": bool(m.is_performed),
-                    "standard": m.standard,
-                    "equipment": m.equipment,
-                    "inspector_name": m.inspector_name,
-                    "inspector_level": m.inspector_level,
-                    "results": m.results,
-                    "defects": m.defects,
-                    "conclusion": m.conclusion,
-                }
-                for m in ndt_methods
-            ]
+        stored_path, sha256, size = await _render_questionnaire_file(
+            lambda path: generator.generate_questionnaire_report(
+                ctx["questionnaire_data"],
+                ctx["equipment"],
+                ctx["questionnaire_info"],
+                path,
+                ctx["ndt_methods"],
+            ),
+            db, questionnaire.id, ".pdf",
         )
         
-        # Обновляем запись опросного листа
-        questionnaire.file_path = str(file_path)
-        questionnaire.file_size = file_path.stat().st_size if file_path.exists() else 0
+        # Обновляем запись опросного листа; ссылка на прежний файл освобождается после фиксации
+        old_file = (questionnaire.file_path, questionnaire.blob_sha256)
+        questionnaire.file_path = stored_path
+        questionnaire.blob_sha256 = sha256
+        questionnaire.file_size = size
+        questionnaire.content_hash = ctx["content_hash"]
         await db.commit()
+        await blob_store.discard([old_file])
         
         return {
             "id": str(questionnaire.id),
-            "file_path": str(file_path),
+            "file_path": stored_path,
             "file_size": questionnaire.file_size,
             "status": "generated"
         }
@@ -3318,9 +3317,10 @@ async def generate_questionnaire_pdf(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {str(e)}")
 
-@app.get("/api/questionnaires/{questionnaire_id}/download")
+@app.get("/api/questionnaires/{questionnaire_id}/download", dependencies=[Depends(limit("reports"))])
 async def download_questionnaire(
     questionnaire_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """Скачать опросный лист (PDF)"""
@@ -3334,9 +3334,9 @@ async def download_questionnaire(
         if not questionnaire:
             raise HTTPException(status_code=404, detail="Questionnaire not found")
         
-        # Если PDF еще не сгенерирован, генерируем его
-        if not questionnaire.file_path or not Path(questionnaire.file_path).exists():
-            await generate_questionnaire_pdf(questionnaire_id, db)
+        # PDF генерируется, если его нет или содержимое изменилось (иначе — текущий файл)
+        generated = await generate_questionnaire_pdf(questionnaire_id, db)
+        if generated.get("status") != "unchanged":
             result = await db.execute(
                 select(Questionnaire).where(Questionnaire.id == q_uuid)
             )
@@ -3345,14 +3345,13 @@ async def download_questionnaire(
         if not questionnaire.file_path:
             raise HTTPException(status_code=404, detail="PDF file not found")
         
-        file_path = Path(questionnaire.file_path)
-        if not file_path.exists():
+        if not await blob_store.file_exists(questionnaire.file_path):
             raise HTTPException(status_code=404, detail="PDF file not found on disk")
         
-        return FileResponse(
-            path=str(file_path),
-            filename=file_path.name,
-            media_type='application/pdf'
+        return await file_response(
+            request, questionnaire.file_path, 'application/pdf',
+            filename=_questionnaire_download_name(questionnaire, ".pdf"),
+            etag=questionnaire.blob_sha256,
         )
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid questionnaire_id format")
@@ -3361,7 +3360,7 @@ async def download_questionnaire(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/questionnaires/{questionnaire_id}/generate-word")
+@app.post("/api/questionnaires/{questionnaire_id}/generate-word", dependencies=[Depends(limit("reports"))])
 async def generate_questionnaire_word(
     questionnaire_id: str,
     db: AsyncSession = Depends(get_db)
@@ -3371,80 +3370,49 @@ async def generate_questionnaire_word(
         from word_generator import WordGenerator
         
         q_uuid = uuid_lib.UUID(questionnaire_id)
-        result = await db.execute(
-            select(Questionnaire).where(Questionnaire.id == q_uuid)
-        )
-        questionnaire = result.scalar_one_or_none()
-        
-        if not questionnaire:
-            raise HTTPException(status_code=404, detail="Questionnaire not found")
-        
-        # Получаем данные об оборудовании
-        eq_result = await db.execute(
-            select(Equipment).where(Equipment.id == questionnaire.equipment_id)
-        )
-        equipment = eq_result.scalar_one_or_none()
-        
-        if not equipment:
-            raise HTTPException(status_code=404, detail="Equipment not found")
-        
-        # Получаем методы НК
-        ndt_result = await db.execute(
-            select(NDTMethod).where(NDTMethod.questionnaire_id == q_uuid)
-        )
-        ndt_methods = ndt_result.scalars().all()
+
+        # Опросный лист, оборудование, методы НК и вложения
+        ctx = await build_questionnaire_context(db, q_uuid)
+        questionnaire = ctx["questionnaire"]
+
+        # Содержимое не менялось — отдаем уже сгенерированный файл
+        if (
+            questionnaire.word_content_hash == ctx["content_hash"]
+            and questionnaire.word_file_path
+            and await blob_store.file_exists(questionnaire.word_file_path)
+        ):
+            return {
+                "id": str(questionnaire.id),
+                "word_file_path": questionnaire.word_file_path,
+                "word_file_size": questionnaire.word_file_size,
+                "status": "unchanged"
+            }
         
         # Генерируем Word
         generator = WordGenerator()
-        # Храним генерируемые файлы в /app/reports (примонтирован в docker-compose),
-        # чтобы они не пропадали при пересборке контейнера.
-        questionnaires_dir = Path("/app/reports/questionnaires")
-        questionnaires_dir.mkdir(parents=True, exist_ok=True)
-        
-        filename = f"questionnaire_{questionnaire.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-        file_path = questionnaires_dir / filename
-        
-        generator.generate_questionnaire_word(
-            questionnaire.questionnaire_data or {},
-            {
-                "id": str(equipment.id),
-                "name": equipment.name,
-                "serial_number": equipment.serial_number,
-                "location": equipment.location,
-            },
-            {
-                "inventory_number": questionnaire.equipment_inventory_number,
-                "equipment_name": questionnaire.equipment_name,
-                "inspection_date": questionnaire.inspection_date.isoformat() if questionnaire.inspection_date else None,
-                "inspector_name": questionnaire.inspector_name,
-                "inspector_position": questionnaire.inspector_position,
-            },
-            [
-                {
-                    "method_code": m.method_code,
-                    "method_name": m.method_name,
-                    "is_performed": bool(m.is_performed),
-                    "standard": m.standard,
-                    "equipment": m.equipment,
-                    "inspector_name": m.inspector_name,
-                    "inspector_level": m.inspector_level,
-                    "results": m.results,
-                    "defects": m.defects,
-                    "conclusion": m.conclusion,
-                }
-                for m in ndt_methods
-            ],
-            str(file_path)
+        stored_path, sha256, size = await _render_questionnaire_file(
+            lambda path: generator.generate_questionnaire_word(
+                ctx["questionnaire_data"],
+                ctx["equipment"],
+                ctx["questionnaire_info"],
+                ctx["ndt_methods"],
+                path,
+            ),
+            db, questionnaire.id, ".docx",
         )
         
-        # Обновляем запись опросного листа
-        questionnaire.word_file_path = str(file_path)
-        questionnaire.word_file_size = file_path.stat().st_size if file_path.exists() else 0
+        # Обновляем запись опросного листа; ссылка на прежний файл освобождается после фиксации
+        old_file = (questionnaire.word_file_path, questionnaire.word_blob_sha256)
+        questionnaire.word_file_path = stored_path
+        questionnaire.word_blob_sha256 = sha256
+        questionnaire.word_file_size = size
+        questionnaire.word_content_hash = ctx["content_hash"]
         await db.commit()
+        await blob_store.discard([old_file])
         
         return {
             "id": str(questionnaire.id),
-            "word_file_path": str(file_path),
+            "word_file_path": stored_path,
             "word_file_size": questionnaire.word_file_size,
             "status": "generated"
         }
@@ -3458,9 +3426,10 @@ async def generate_questionnaire_word(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to generate Word: {str(e)}")
 
-@app.get("/api/questionnaires/{questionnaire_id}/download-word")
+@app.get("/api/questionnaires/{questionnaire_id}/download-word", dependencies=[Depends(limit("reports"))])
 async def download_questionnaire_word(
     questionnaire_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """Скачать Word документ опросного листа"""
@@ -3474,9 +3443,9 @@ async def download_questionnaire_word(
         if not questionnaire:
             raise HTTPException(status_code=404, detail="Questionnaire not found")
         
-        # Если Word еще не сгенерирован, генерируем его
-        if not questionnaire.word_file_path or not Path(questionnaire.word_file_path).exists():
-            await generate_questionnaire_word(questionnaire_id, db)
+        # Word генерируется, если его нет или содержимое изменилось (иначе — текущий файл)
+        generated = await generate_questionnaire_word(questionnaire_id, db)
+        if generated.get("status") != "unchanged":
             result = await db.execute(
                 select(Questionnaire).where(Questionnaire.id == q_uuid)
             )
@@ -3485,14 +3454,14 @@ async def download_questionnaire_word(
         if not questionnaire.word_file_path:
             raise HTTPException(status_code=404, detail="Word file not found")
         
-        file_path = Path(questionnaire.word_file_path)
-        if not file_path.exists():
+        if not await blob_store.file_exists(questionnaire.word_file_path):
             raise HTTPException(status_code=404, detail="Word file not found on disk")
         
-        return FileResponse(
-            path=str(file_path),
-            filename=file_path.name,
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        return await file_response(
+            request, questionnaire.word_file_path,
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+            filename=_questionnaire_download_name(questionnaire, ".docx"),
+            etag=questionnaire.word_blob_sha256,
         )
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid questionnaire_id format")
@@ -3523,27 +3492,8 @@ async def upload_document_file(
         if not questionnaire:
             raise HTTPException(status_code=404, detail="Questionnaire not found")
         
-        # Проверяем номер/ключ документа.
-        # - Основной список (1..17) — "Перечень рассмотренных документов".
-        # - Дополнительно разрешаем любые "безопасные" ключи для прочих вложений чек-листа:
-        #   factory_plate_photo, control_scheme_image, photo_1, scheme_2025_12 и т.п.
-        allowed_numbers = {str(i) for i in range(1, 18)}
-        if document_number not in allowed_numbers:
-            import re
-            # безопасный ключ: латиница/цифры/подчерк/дефис, 1..64 символа
-            if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", document_number):
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid document key. Use 1..17 or a safe key like factory_plate_photo/control_scheme_image/photo_1",
-                )
-        
-        # Проверяем тип файла (только изображения и PDF)
-        allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'application/pdf']
-        if file.content_type not in allowed_types:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid file type. Allowed types: {', '.join(allowed_types)}"
-            )
+        validate_document_number(document_number)
+        validate_document_type(file.content_type)
         
         # Получаем пользователя для uploaded_by
         user_result = await db.execute(
@@ -3552,71 +3502,19 @@ async def upload_document_file(
         user = user_result.scalar_one_or_none()
         user_id = user.id if user else None
         
-        # Создаем директорию для файлов документов в /app/uploads (примонтирован),
-        # чтобы вложения чек-листа не пропадали при пересборке контейнера.
-        documents_dir = Path("/app/uploads/questionnaire_documents") / str(q_uuid)
-        documents_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Генерируем уникальное имя файла
-        file_extension = Path(file.filename).suffix if file.filename else '.bin'
-        if file.content_type == 'application/pdf':
-            file_extension = '.pdf'
-        elif 'image' in file.content_type:
-            file_extension = '.jpg' if 'jpeg' in file.content_type else '.png'
-        
-        file_id = uuid_lib.uuid4()
-        file_name = f"doc_{document_number}_{file_id}{file_extension}"
-        file_path = documents_dir / file_name
-        
-        # Сохраняем файл
-        file_content = await file.read()
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
-        
-        file_size = len(file_content)
+        # Сохраняем файл (потоково, с лимитом размера) и переносим в blob_store
+        extension = document_file_extension(file.content_type, file.filename)
+        stored = await save_upload(file, blob_store.staging_path(extension))
         
-        # Удаляем старый файл для этого документа, если есть
-        old_file_result = await db.execute(
-            select(QuestionnaireDocumentFile).where(
-                QuestionnaireDocumentFile.questionnaire_id == q_uuid,
-                QuestionnaireDocumentFile.document_number == document_number
+        try:
+            new_file = await attach_document_file(
+                db, q_uuid, document_number, stored.path, stored.sha256, stored.size,
+                file.filename or f"doc_{document_number}{extension}", file.content_type, user_id,
             )
-        )
-        old_file = old_file_result.scalar_one_or_none()
-        if old_file:
-            # Удаляем файл с диска
-            old_path = Path(old_file.file_path)
-            if old_path.exists():
-                old_path.unlink()
-            # Удаляем запись из БД
-            await db.execute(delete(QuestionnaireDocumentFile).where(QuestionnaireDocumentFile.id == old_file.id))
-        
-        # Создаем новую запись в БД
-        new_file = QuestionnaireDocumentFile(
-            questionnaire_id=q_uuid,
-            document_number=document_number,
-            file_name=file.filename or file_name,
-            file_path=str(file_path),
-            file_size=file_size,
-            file_type=file.content_type.split('/')[0] if file.content_type else None,  # image или application
-            mime_type=file.content_type,
-            uploaded_by=user_id
-        )
-        
-        db.add(new_file)
-        await db.commit()
-        await db.refresh(new_file)
-        
-        return {
-            "id": str(new_file.id),
-            "questionnaire_id": questionnaire_id,
-            "document_number": document_number,
-            "file_name": new_file.file_name,
-            "file_size": new_file.file_size,
-            "file_type": new_file.file_type,
-            "mime_type": new_file.mime_type,
-            "created_at": new_file.created_at.isoformat() if new_file.created_at else None
-        }
+        finally:
+            # Файл уже в хранилище либо запись не создана — временный не нужен
+            await remove_file(stored.path)
+        return document_file_to_dict(new_file)
         
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid questionnaire_id format")
@@ -3632,11 +3530,17 @@ async def upload_document_file(
 async def download_document_file(
     questionnaire_id: str,
     document_number: str,
+    request: Request,
+    size: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Скачать файл документа чек-листа"""
+    """
+    Скачать файл документа чек-листа. Изображения по умолчанию отдаются
+    в размере screen; size=thumb|print — другой вариант, size=original — исходный файл.
+    """
     try:
         q_uuid = uuid_lib.UUID(questionnaire_id)
+        variant = _image_variant(size)
         
         # Ищем файл
         result = await db.execute(
@@ -3651,7 +3555,7 @@ async def download_document_file(
             raise HTTPException(status_code=404, detail="Document file not found")
         
         file_path = Path(doc_file.file_path)
-        if not file_path.exists():
+        if not await blob_store.file_exists(doc_file.file_path):
             raise HTTPException(status_code=404, detail="File not found on disk")
         
         # Определяем media_type
@@ -3664,10 +3568,15 @@ async def download_document_file(
         elif doc_file.file_type == 'application' or 'pdf' in doc_file.mime_type:
             media_type = 'application/pdf'
         
-        return FileResponse(
-            path=str(file_path),
-            filename=doc_file.file_name,
-            media_type=media_type
+        variant_response = await _image_variant_response(
+            request, str(file_path), doc_file.mime_type, variant, doc_file.file_name, doc_file.blob_sha256,
+        )
+        if variant_response:
+            return variant_response
+        
+        return await file_response(
+            request, str(file_path), media_type,
+            filename=doc_file.file_name, etag=doc_file.blob_sha256,
         )
         
     except ValueError:
@@ -3718,14 +3627,18 @@ async def get_questionnaire_documents(
 async def view_document_file(
     questionnaire_id: str,
     document_number: str,
+    request: Request,
+    size: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
     Просмотр файла документа чек-листа в браузере (Content-Disposition: inline).
-    Поддерживает изображения и PDF.
+    Поддерживает изображения и PDF. Изображения по умолчанию отдаются в
+    размере screen; size=thumb|screen|print|original — другой вариант.
     """
     try:
         q_uuid = uuid_lib.UUID(questionnaire_id)
+        variant = _image_variant(size)
 
         result = await db.execute(
             select(QuestionnaireDocumentFile).where(
@@ -3739,7 +3652,7 @@ async def view_document_file(
             raise HTTPException(status_code=404, detail="Document file not found")
 
         file_path = Path(doc_file.file_path)
-        if not file_path.exists():
+        if not await blob_store.file_exists(doc_file.file_path):
             raise HTTPException(status_code=404, detail="File not found on disk")
 
         media_type = doc_file.mime_type or 'application/octet-stream'
@@ -3751,12 +3664,16 @@ async def view_document_file(
         elif (doc_file.file_type == 'application') or (doc_file.mime_type and 'pdf' in doc_file.mime_type):
             media_type = 'application/pdf'
 
-        return FileResponse(
-            path=str(file_path),
-            media_type=media_type,
-            headers={
-                "Content-Disposition": f'inline; filename="{doc_file.file_name}"'
-            }
+        variant_response = await _image_variant_response(
+            request, str(file_path), doc_file.mime_type, variant, doc_file.file_name, doc_file.blob_sha256,
+            inline=True,
+        )
+        if variant_response:
+            return variant_response
+
+        return await file_response(
+            request, str(file_path), media_type,
+            filename=doc_file.file_name, inline=True, etag=doc_file.blob_sha256,
         )
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid questionnaire_id format")
@@ -3788,14 +3705,11 @@ async def delete_document_file(
         if not doc_file:
             raise HTTPException(status_code=404, detail="Document file not found")
         
-        # Удаляем файл с диска
-        file_path = Path(doc_file.file_path)
-        if file_path.exists():
-            file_path.unlink()
-        
-        # Удаляем запись из БД
+        # Удаляем запись из БД, затем освобождаем файл (удаляется, если на него больше нет ссылок)
+        file_ref = (doc_file.file_path, doc_file.blob_sha256)
         await db.execute(delete(QuestionnaireDocumentFile).where(QuestionnaireDocumentFile.id == doc_file.id))
         await db.commit()
+        await blob_store.discard([file_ref])
         
         return {"status": "deleted", "document_number": document_number}
         
@@ -3881,31 +3795,26 @@ async def create_verification_equipment(
     current_user: dict = Depends(get_current_user)
 ):
     """Создать новое оборудование для поверки"""
+    staged_scan_path = None
     try:
         # Проверка прав (только admin, chief_operator, operator)
         if current_user.get("role") not in ["admin", "chief_operator", "operator"]:
             raise HTTPException(status_code=403, detail="Недостаточно прав")
         
         scan_file_path = None
+        scan_blob_sha256 = None
         scan_file_name = None
         scan_file_size = None
         scan_mime_type = None
         
         if scan_file:
-            upload_dir = Path("uploads/verification-scans")
-            upload_dir.mkdir(parents=True, exist_ok=True)
-            
-            file_ext = Path(scan_file.filename).suffix
-            file_name = f"{uuid_lib.uuid4()}{file_ext}"
-            file_path = upload_dir / file_name
-            
-            content = await scan_file.read()
-            with open(file_path, "wb") as f:
-                f.write(content)
-            
-            scan_file_path = str(file_path)
+            # Скан — в blob_store (ссылка добавляется в той же транзакции)
+            stored = await save_upload(scan_file, blob_store.staging_path(Path(scan_file.filename or "").suffix))
+            staged_scan_path = stored.path
+            scan_file_path = await blob_store.adopt(db, stored.path, stored.sha256, stored.size)
+            scan_blob_sha256 = stored.sha256
             scan_file_name = scan_file.filename
-            scan_file_size = len(content)
+            scan_file_size = stored.size
             scan_mime_type = scan_file.content_type
         
         verification_date_obj = datetime.strptime(verification_date, "%Y-%m-%d").date()
@@ -3924,6 +3833,7 @@ async def create_verification_equipment(
             verification_certificate_number=verification_certificate_number,
             verification_organization=verification_organization,
             scan_file_path=scan_file_path,
+            scan_blob_sha256=scan_blob_sha256,
             scan_file_name=scan_file_name,
             scan_file_size=scan_file_size,
             scan_mime_type=scan_mime_type,
@@ -3933,6 +3843,7 @@ async def create_verification_equipment(
         db.add(new_equipment)
         await db.commit()
         await db.refresh(new_equipment)
+        image_derivatives.schedule(new_equipment.scan_file_path, new_equipment.scan_mime_type)
         
         return {
             "id": str(new_equipment.id),
@@ -3942,10 +3853,16 @@ async def create_verification_equipment(
             "next_verification_date": new_equipment.next_verification_date.isoformat(),
         }
     except ValueError as e:
+        await db.rollback()
         raise HTTPException(status_code=400, detail=f"Неверный формат даты: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Скан уже в хранилище либо оборудование не создано — временный файл не нужен
+        await remove_file(staged_scan_path)
 
 @app.get("/api/verification-equipment/{equipment_id}")
 async def get_verification_equipment_by_id(
@@ -4089,32 +4006,29 @@ async def update_verification_equipment(
         if is_active is not None:
             item.is_active = 1 if is_active else 0
         
+        old_scan_ref = None
+        staged_scan_path = None
         if scan_file:
-            # Удалить старый файл, если есть
-            if item.scan_file_path and os.path.exists(item.scan_file_path):
-                try:
-                    os.remove(item.scan_file_path)
-                except:
-                    pass
+            stored = await save_upload(scan_file, blob_store.staging_path(Path(scan_file.filename or "").suffix))
+            staged_scan_path = stored.path
             
-            upload_dir = Path("uploads/verification-scans")
-            upload_dir.mkdir(parents=True, exist_ok=True)
-            
-            file_ext = Path(scan_file.filename).suffix
-            file_name = f"{uuid_lib.uuid4()}{file_ext}"
-            file_path = upload_dir / file_name
-            
-            content = await scan_file.read()
-            with open(file_path, "wb") as f:
-                f.write(content)
-            
-            item.scan_file_path = str(file_path)
+            old_scan_ref = (item.scan_file_path, item.scan_blob_sha256)
+            item.scan_file_path = await blob_store.adopt(db, stored.path, stored.sha256, stored.size)
+            item.scan_blob_sha256 = stored.sha256
             item.scan_file_name = scan_file.filename
-            item.scan_file_size = len(content)
+            item.scan_file_size = stored.size
             item.scan_mime_type = scan_file.content_type
         
-        await db.commit()
+        try:
+            await db.commit()
+        finally:
+            await remove_file(staged_scan_path)
         await db.refresh(item)
+        # Ссылка на старый скан освобождается после фиксации нового в БД
+        if old_scan_ref:
+            image_derivatives.schedule(item.scan_file_path, item.scan_mime_type)
+            await blob_store.discard([old_scan_ref])
+        invalidate_instrument_bundles(item.id)
         
         return {
             "id": str(item.id),
@@ -4124,6 +4038,8 @@ async def update_verification_equipment(
         }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Неверный формат: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -4147,15 +4063,12 @@ async def delete_verification_equipment(
         if not item:
             raise HTTPException(status_code=404, detail="Оборудование не найдено")
         
-        # Удалить файл скана, если есть
-        if item.scan_file_path and os.path.exists(item.scan_file_path):
-            try:
-                os.remove(item.scan_file_path)
-            except:
-                pass
-        
+        scan_ref = (item.scan_file_path, item.scan_blob_sha256)
         await db.delete(item)
         await db.commit()
+        # Файл скана удаляется, когда на него не осталось ссылок
+        await blob_store.discard([scan_ref])
+        invalidate_instrument_bundles(item.id)
         
         return {"status": "deleted", "id": equipment_id}
     except ValueError:
@@ -4167,12 +4080,18 @@ async def delete_verification_equipment(
 @app.get("/api/verification-equipment/{equipment_id}/scan")
 async def get_verification_scan(
     equipment_id: str,
+    request: Request,
     inline: bool = False,
+    size: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(verify_token_optional)
 ):
-    """Получить скан свидетельства о поверке"""
+    """
+    Получить скан свидетельства о поверке. Скан-изображение по умолчанию
+    отдается в размере screen; size=thumb|print — другой вариант, size=original — исходный файл.
+    """
     try:
+        variant = _image_variant(size)
         result = await db.execute(
             select(VerificationEquipment).where(VerificationEquipment.id == uuid_lib.UUID(equipment_id))
         )
@@ -4181,28 +4100,28 @@ async def get_verification_scan(
         if not item or not item.scan_file_path:
             raise HTTPException(status_code=404, detail="Скан не найден")
         
-        if not os.path.exists(item.scan_file_path):
+        if not await blob_store.file_exists(item.scan_file_path):
             raise HTTPException(status_code=404, detail="Файл не найден на сервере")
         
-        from fastapi.responses import StreamingResponse
-        
-        def iterfile():
-            with open(item.scan_file_path, mode="rb") as file_like:
-                yield from file_like
-        
-        headers = {}
-        if inline:
-            headers["Content-Disposition"] = f'inline; filename="{item.scan_file_name or "scan.pdf"}"'
-        else:
-            headers["Content-Disposition"] = f'attachment; filename="{item.scan_file_name or "scan.pdf"}"'
+        variant_response = await _image_variant_response(
+            request, item.scan_file_path, item.scan_mime_type, variant,
+            item.scan_file_name, item.scan_blob_sha256, inline=inline,
+        )
+        if variant_response:
+            return variant_response
         
-        return StreamingResponse(
-            iterfile(),
+        return await file_response(
+            request,
+            item.scan_file_path,
             media_type=item.scan_mime_type or "application/pdf",
-            headers=headers
+            filename=item.scan_file_name or "scan.pdf",
+            inline=inline,
+            etag=item.scan_blob_sha256,
         )
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный формат ID")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -4331,7 +4250,7 @@ async def get_inspection_equipment(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/verification-equipment/export")
+@app.get("/api/verification-equipment/export", dependencies=[Depends(limit("export"))])
 async def export_verification_equipment(
     format: str = "csv",  # csv или excel
     days_before_expiry: Optional[int] = None,
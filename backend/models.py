@@ -162,6 +162,7 @@ class Certification(Base):
     scan_file_name = Column(String(255), nullable=True)
     scan_file_size = Column(Integer, nullable=True)
     scan_mime_type = Column(String(100), nullable=True)
+    scan_blob_sha256 = Column(String(64), nullable=True)  # Блоб скана в blob_store
     is_active = Column(Integer, default=1)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -220,12 +221,14 @@ class Report(Base):
     __tablename__ = "reports"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    inspection_id = Column(UUID(as_uuid=True), ForeignKey("inspections.id"), nullable=False)
+    inspection_id = Column(UUID(as_uuid=True), ForeignKey("inspections.id"), nullable=False, index=True)
     report_type = Column(String(50))  # TECHNICAL, EXPERTISE
     file_path = Column(String(500))
     file_size = Column(Integer, default=0)
     word_file_path = Column(String(500), nullable=True)
     word_file_size = Column(Integer, default=0)
+    blob_sha256 = Column(String(64), nullable=True)  # Блоб file_path в blob_store
+    word_blob_sha256 = Column(String(64), nullable=True)  # Блоб word_file_path в blob_store
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
     is_archived = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -247,6 +250,10 @@ class Questionnaire(Base):
     file_size = Column(Integer, default=0)  # Размер файла в байтах
     word_file_path = Column(String(500), nullable=True)  # Путь к сгенерированному Word документу
     word_file_size = Column(Integer, default=0)  # Размер Word файла в байтах
+    content_hash = Column(String(64), nullable=True)  # Версия содержимого, по которой сгенерирован PDF
+    word_content_hash = Column(String(64), nullable=True)  # Версия содержимого, по которой сгенерирован Word
+    blob_sha256 = Column(String(64), nullable=True)  # Блоб file_path в blob_store
+    word_blob_sha256 = Column(String(64), nullable=True)  # Блоб word_file_path в blob_store
     created_by = Column(UUID(as_uuid=True), nullable=True)  # ID пользователя, создавшего опросный лист
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -257,16 +264,46 @@ class QuestionnaireDocumentFile(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     questionnaire_id = Column(UUID(as_uuid=True), ForeignKey("questionnaires.id"), nullable=False, index=True)
-    document_number = Column(String(10), nullable=False)  # Номер документа из чек-листа (1-17)
+    document_number = Column(String(64), nullable=False)  # Номер документа из чек-листа (1-17) или ключ вложения
     file_name = Column(String(255), nullable=False)  # Оригинальное имя файла
     file_path = Column(String(500), nullable=False)  # Путь к файлу на сервере
     file_size = Column(Integer, nullable=False)  # Размер файла в байтах
     file_type = Column(String(50))  # image/jpeg, image/png, application/pdf
     mime_type = Column(String(100))  # MIME тип файла
+    blob_sha256 = Column(String(64), nullable=True)  # Блоб файла в blob_store
     uploaded_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+class Blob(Base):
+    """Файл в хранилище с адресацией по содержимому (blob_store) и счетчик ссылок на него"""
+    __tablename__ = "blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    file_path = Column(String(500), nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_referenced_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UploadSession(Base):
+    """Сессия возобновляемой загрузки файла документа чек-листа (по частям)"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    questionnaire_id = Column(UUID(as_uuid=True), ForeignKey("questionnaires.id", ondelete="CASCADE"), nullable=False, index=True)
+    document_number = Column(String(64), nullable=False)
+    file_name = Column(String(255), nullable=False)
+    mime_type = Column(String(100), nullable=False)
+    total_size = Column(Integer, nullable=False)  # Ожидаемый размер файла в байтах
+    received_size = Column(Integer, nullable=False, default=0)  # Сколько байт уже получено
+    sha256 = Column(String(64))  # Ожидаемый SHA-256 (если клиент его передал)
+    status = Column(String(20), nullable=False, default="ACTIVE")  # ACTIVE, COMPLETED
+    document_file_id = Column(UUID(as_uuid=True), nullable=True)  # Итоговый QuestionnaireDocumentFile
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
 class NDTMethod(Base):
     """Методы неразрушающего контроля"""
     __tablename__ = "ndt_methods"
@@ -395,6 +432,7 @@ class VerificationEquipment(Base):
     scan_file_name = Column(String(255))  # Имя файла
     scan_file_size = Column(Integer)  # Размер файла
     scan_mime_type = Column(String(100))  # MIME тип
+    scan_blob_sha256 = Column(String(64))  # Блоб скана в blob_store
     is_active = Column(Integer, default=1)  # Активно ли оборудование
     notes = Column(Text)  # Примечания
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
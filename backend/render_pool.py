@@ -0,0 +1,107 @@
+"""
+Пул рендеринга отчетов.
+
+Генерация PDF (ReportLab) и DOCX (python-docx) — чисто CPU-работа, которая при
+вызове прямо из обработчика блокирует event loop. Рендеринг выносится в пул
+процессов: на вход подается уже собранный контекст (обычные dict, см.
+report_context.build_report_context), на выходе — путь к готовому файлу.
+
+Количество процессов задается переменной окружения REPORT_RENDER_WORKERS
+(по умолчанию — число CPU, не больше 4). При REPORT_RENDER_WORKERS=0 рендеринг
+выполняется в потоке текущего процесса.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+WORD_FORMATS = ("docx", "doc", "word")
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def render_workers() -> int:
+    """Число процессов пула рендеринга"""
+    value = os.getenv("REPORT_RENDER_WORKERS")
+    if value is not None and value.strip() != "":
+        return max(0, int(value))
+    return min(4, os.cpu_count() or 1)
+
+
+def is_word_format(output_format: Optional[str]) -> bool:
+    return (output_format or "pdf").strip().lower() in WORD_FORMATS
+
+
+def report_formats(output_format: Optional[str]) -> List[str]:
+    """Форматы для рендеринга: pdf, docx или оба ("both")"""
+    fmt = (output_format or "pdf").strip().lower()
+    if fmt in ("both", "all", "pdf+docx"):
+        return ["pdf", "docx"]
+    return ["docx"] if fmt in WORD_FORMATS else ["pdf"]
+
+
+def render_report(ctx: Dict[str, Any], report_type: str, output_paths: Dict[str, str]) -> Dict[str, int]:
+    """
+    Отрисовать отчет по контексту. output_paths: {"pdf": путь, "docx": путь}.
+    Модель документа строится один раз и отрисовывается во все запрошенные
+    форматы. Выполняется в процессе пула, поэтому функция модульного уровня.
+    Возвращает размеры файлов в байтах по форматам.
+    """
+    from report_document import build_report_document
+    document = build_report_document(ctx, report_type)
+
+    sizes: Dict[str, int] = {}
+    for fmt, output_path in output_paths.items():
+        if fmt == "docx":
+            from word_generator import WordGenerator
+            WordGenerator().render_document(document, output_path)
+        else:
+            from report_generator import ReportGenerator
+            ReportGenerator().render_document(document, output_path)
+        sizes[fmt] = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    return sizes
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    workers = render_workers()
+    if workers == 0:
+        return None
+    if _executor is None:
+        # spawn: дочерние процессы не наследуют event loop и соединения с БД
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def run_in_pool(fn, *args):
+    """Выполнить функцию в пуле рендеринга (при падении пула — пересоздать и повторить)"""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    if executor is None:
+        return await asyncio.to_thread(fn, *args)
+    try:
+        return await loop.run_in_executor(executor, fn, *args)
+    except BrokenProcessPool:
+        # Процесс пула аварийно завершился (например, OOM) — поднимаем пул заново
+        shutdown_render_pool()
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+
+
+async def render_report_async(ctx: Dict[str, Any], report_type: str, output_paths: Dict[str, str]) -> Dict[str, int]:
+    """Асинхронная обертка над render_report (вложения из внешнего хранилища скачиваются заранее)"""
+    from report_context import fetch_attachments
+    await fetch_attachments(ctx)
+    return await run_in_pool(render_report, ctx, report_type, output_paths)
+
+
+def shutdown_render_pool() -> None:
+    """Остановить пул (вызывается при остановке приложения)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
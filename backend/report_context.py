@@ -0,0 +1,405 @@
+"""
+Сборка контекста отчета: инспекция, оборудование, методы НК, вложения чек-листа,
+поверенное оборудование и документы специалистов.
+
+Данные собираются фиксированным числом пакетных запросов (без N+1) в сессии
+запроса. Отдельные сессии для параллельных запросов не используются: движок
+работает с NullPool и SSL, и каждая сессия — это новое TLS-соединение. Контекст используют предпросмотр,
+генерация PDF и DOCX.
+"""
+import hashlib
+import json
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import (
+    Certification,
+    Equipment,
+    EquipmentResource,
+    Inspection,
+    InspectionEquipment,
+    NDTMethod,
+    Questionnaire,
+    QuestionnaireDocumentFile,
+    User,
+    VerificationEquipment,
+)
+
+
+def equipment_to_dict(equipment: Equipment) -> Dict[str, Any]:
+    """Данные оборудования в формате генераторов отчетов"""
+    return {
+        "id": str(equipment.id),
+        "name": equipment.name,
+        "serial_number": equipment.serial_number,
+        "location": equipment.location,
+        "commissioning_date": str(equipment.commissioning_date) if equipment.commissioning_date else None,
+        "attributes": equipment.attributes or {},
+    }
+
+
+def inspection_to_dict(inspection: Inspection) -> Dict[str, Any]:
+    """Данные инспекции в формате генераторов отчетов"""
+    return {
+        "id": str(inspection.id),
+        "date_performed": inspection.date_performed.isoformat() if inspection.date_performed else None,
+        "data": inspection.data,
+        "conclusion": inspection.conclusion,
+        "status": inspection.status,
+    }
+
+
+def ndt_method_to_dict(m: NDTMethod) -> Dict[str, Any]:
+    """Метод НК в формате генераторов отчетов"""
+    return {
+        "method_code": m.method_code,
+        "method_name": m.method_name,
+        "is_performed": bool(m.is_performed),
+        "standard": m.standard,
+        "equipment": m.equipment,
+        "inspector_name": m.inspector_name,
+        "inspector_level": m.inspector_level,
+        "results": m.results,
+        "defects": m.defects,
+        "conclusion": m.conclusion,
+        "photos": m.photos or [],
+        "additional_data": m.additional_data or {},
+        "performed_date": m.performed_date.isoformat() if m.performed_date else None,
+    }
+
+
+def resource_to_dict(resource: EquipmentResource) -> Dict[str, Any]:
+    """Ресурс оборудования (используем поля, которые есть в модели EquipmentResource)"""
+    return {
+        "resource_type": resource.resource_type,
+        "current_value": float(resource.current_value) if resource.current_value else None,
+        "limit_value": float(resource.limit_value) if resource.limit_value else None,
+        "unit": resource.unit,
+        "last_updated": resource.last_updated.isoformat() if resource.last_updated else None,
+    }
+
+
+def document_file_to_dict(f: QuestionnaireDocumentFile) -> Dict[str, Any]:
+    """Вложение чек-листа (фото таблички/схема контроля/сканы документов)"""
+    return {
+        "document_number": f.document_number,
+        "file_name": f.file_name,
+        "file_path": f.file_path,
+        "file_size": int(f.file_size or 0),
+        "file_type": f.file_type,
+        "mime_type": f.mime_type,
+    }
+
+
+def verification_equipment_to_dict(ver_eq: VerificationEquipment) -> Dict[str, Any]:
+    """Поверенное оборудование, использованное при обследовании"""
+    return {
+        "id": str(ver_eq.id),
+        "name": ver_eq.name,
+        "equipment_type": ver_eq.equipment_type,
+        "serial_number": ver_eq.serial_number,
+        "manufacturer": ver_eq.manufacturer,
+        "model": ver_eq.model,
+        "verification_date": ver_eq.verification_date.isoformat() if ver_eq.verification_date else None,
+        "next_verification_date": ver_eq.next_verification_date.isoformat() if ver_eq.next_verification_date else None,
+        "verification_certificate_number": ver_eq.verification_certificate_number,
+        "verification_organization": ver_eq.verification_organization,
+        "scan_file_path": ver_eq.scan_file_path,
+        "scan_file_name": ver_eq.scan_file_name,
+        "scan_mime_type": ver_eq.scan_mime_type,
+    }
+
+
+def certification_to_dict(c: Certification) -> Dict[str, Any]:
+    """Удостоверение/сертификат специалиста для приложений отчета"""
+    return {
+        "id": str(c.id),
+        "certification_type": c.certification_type,
+        "certificate_number": c.certificate_number,
+        "issuing_organization": c.issuing_organization,
+        "issue_date": str(c.issue_date) if c.issue_date else None,
+        "expiry_date": str(c.expiry_date) if c.expiry_date else None,
+        "scan_file_path": c.scan_file_path,
+        "scan_file_name": c.scan_file_name,
+        "scan_mime_type": c.scan_mime_type,
+    }
+
+
+async def _optional(session: AsyncSession, what: str, default, fn, *args):
+    """Необязательная часть контекста: ошибка запроса не прерывает сборку отчета"""
+    try:
+        return await fn(session, *args)
+    except Exception as e:
+        print(f"Warning: Could not load {what}: {e}")
+        return default
+
+
+async def _load_ndt_methods(session: AsyncSession, inspection_id, equipment_id) -> List[NDTMethod]:
+    # Методы НК:
+    # 1) привязанные напрямую к inspection_id (3.3.0+)
+    # 2) фолбэк: привязанные к последнему questionnaire по этому оборудованию (историческая логика)
+    # Обе выборки — одним запросом, приоритет разбираем в Python.
+    latest_questionnaire = (
+        select(Questionnaire.id)
+        .where(Questionnaire.equipment_id == equipment_id)
+        .order_by(Questionnaire.created_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        select(NDTMethod).where(
+            or_(
+                NDTMethod.inspection_id == inspection_id,
+                NDTMethod.questionnaire_id == latest_questionnaire,
+            )
+        )
+        .order_by(NDTMethod.created_at)
+    )
+    methods = result.scalars().all()
+    by_inspection = [m for m in methods if m.inspection_id == inspection_id]
+    return by_inspection or [m for m in methods if m.inspection_id != inspection_id]
+
+
+async def _load_document_files(session: AsyncSession, equipment_id, inspection_created_at):
+    # Вложения чек-листа привязаны к Questionnaire: берем ближайший по created_at
+    # (если у инспекции нет created_at — последний)
+    q_query = select(Questionnaire.id).where(Questionnaire.equipment_id == equipment_id)
+    if inspection_created_at is not None:
+        q_query = q_query.order_by(
+            func.abs(func.extract("epoch", Questionnaire.created_at - inspection_created_at))
+        )
+    else:
+        q_query = q_query.order_by(Questionnaire.created_at.desc())
+    nearest = q_query.limit(1).subquery()
+
+    result = await session.execute(
+        select(nearest.c.id, QuestionnaireDocumentFile)
+        .select_from(nearest)
+        .outerjoin(QuestionnaireDocumentFile, QuestionnaireDocumentFile.questionnaire_id == nearest.c.id)
+    )
+    questionnaire_id = None
+    files = []
+    for q_id, f in result.all():
+        questionnaire_id = q_id
+        if f is not None:
+            files.append(document_file_to_dict(f))
+    return (str(questionnaire_id) if questionnaire_id else None), files
+
+
+async def _load_verification_equipment(session: AsyncSession, inspection_id) -> List[Dict[str, Any]]:
+    result = await session.execute(
+        select(VerificationEquipment)
+        .join(InspectionEquipment, InspectionEquipment.verification_equipment_id == VerificationEquipment.id)
+        .where(InspectionEquipment.inspection_id == inspection_id)
+        .order_by(InspectionEquipment.created_at)
+    )
+    return [verification_equipment_to_dict(v) for v in result.scalars().all()]
+
+
+async def _load_specialist_docs(session: AsyncSession, inspector_names: List[str]) -> List[Dict[str, Any]]:
+    """Документы специалистов (удостоверения/сертификаты НК) по ФИО из методов НК — одним запросом"""
+    if not inspector_names:
+        return []
+    result = await session.execute(
+        select(User.full_name, User.username, User.engineer_id, Certification)
+        .join(Certification, Certification.engineer_id == User.engineer_id)
+        .where(
+            or_(User.full_name.in_(inspector_names), User.username.in_(inspector_names)),
+            User.engineer_id.is_not(None),
+            Certification.scan_file_path.is_not(None),
+        )
+        .order_by(Certification.created_at)
+    )
+    rows = result.all()
+
+    # Сопоставление ФИО -> инженер: приоритет совпадению по full_name, затем по username
+    engineer_by_name: Dict[str, Any] = {}
+    for full_name, username, engineer_id, _ in rows:
+        if username in inspector_names:
+            engineer_by_name.setdefault(username, engineer_id)
+    for full_name, username, engineer_id, _ in rows:
+        if full_name in inspector_names:
+            engineer_by_name[full_name] = engineer_id
+
+    certs_by_engineer: Dict[Any, List[Dict[str, Any]]] = {}
+    seen = set()
+    for _, _, engineer_id, cert in rows:
+        if cert.id in seen:
+            continue
+        seen.add(cert.id)
+        certs_by_engineer.setdefault(engineer_id, []).append(certification_to_dict(cert))
+
+    specialist_docs = []
+    for name in inspector_names:
+        engineer_id = engineer_by_name.get(name)
+        items = certs_by_engineer.get(engineer_id) if engineer_id else None
+        if items:
+            specialist_docs.append({
+                "inspector_name": name,
+                "engineer_id": str(engineer_id),
+                "certifications": items,
+            })
+    return specialist_docs
+
+
+async def _load_ndt_and_specialists(session: AsyncSession, inspection_id, equipment_id):
+    methods = await _load_ndt_methods(session, inspection_id, equipment_id)
+    ndt_methods = [ndt_method_to_dict(m) for m in methods]
+    inspector_names = sorted(
+        {str(m.get("inspector_name")).strip() for m in ndt_methods if m.get("inspector_name")},
+        key=lambda s: s.lower(),
+    )
+    specialist_docs = await _optional(session, "specialist documents", [], _load_specialist_docs, inspector_names)
+    return ndt_methods, specialist_docs
+
+
+async def build_report_context(
+    db: AsyncSession,
+    inspection_id,
+    include_resource: bool = True,
+) -> Dict[str, Any]:
+    """
+    Собрать все данные для предпросмотра/генерации отчета по инспекции.
+
+    Все запросы — последовательно в сессии запроса (одно соединение): inspection +
+    equipment + последний ресурс, методы НК, документы специалистов, вложения,
+    поверенное оборудование. Итого не более 5 запросов независимо от количества
+    методов НК, специалистов и приборов.
+    """
+    query = (
+        select(Inspection, Equipment)
+        .outerjoin(Equipment, Equipment.id == Inspection.equipment_id)
+        .where(Inspection.id == inspection_id)
+    )
+    if include_resource:
+        latest_resource = (
+            select(EquipmentResource.id)
+            .where(EquipmentResource.equipment_id == Equipment.id)
+            .order_by(EquipmentResource.created_at.desc())
+            .limit(1)
+            .correlate(Equipment)
+            .scalar_subquery()
+        )
+        query = query.add_columns(EquipmentResource).outerjoin(
+            EquipmentResource, EquipmentResource.id == latest_resource
+        )
+    result = await db.execute(query)
+    row = result.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Inspection not found")
+    inspection, equipment = row[0], row[1]
+    if not equipment:
+        raise HTTPException(status_code=404, detail="Equipment not found")
+    resource = row[2] if include_resource else None
+    resource_data = resource_to_dict(resource) if resource else None
+
+    ndt_methods, specialist_docs = await _load_ndt_and_specialists(db, inspection.id, equipment.id)
+    questionnaire_id, document_files = await _optional(
+        db, "document files", (None, []),
+        _load_document_files, equipment.id, getattr(inspection, "created_at", None),
+    )
+    verification_equipment = await _optional(
+        db, "verification equipment", [], _load_verification_equipment, inspection.id,
+    )
+
+    return {
+        "inspection": inspection_to_dict(inspection),
+        "equipment": equipment_to_dict(equipment),
+        "questionnaire_id": questionnaire_id,
+        "ndt_methods": ndt_methods,
+        "resource": resource_data,
+        "document_files": document_files,
+        "specialist_docs": specialist_docs,
+        "verification_equipment": verification_equipment,
+    }
+
+
+async def fetch_attachments(ctx: Dict[str, Any]) -> None:
+    """
+    Локальные копии файлов, которые вставляются в отчет (вложения чек-листа,
+    сканы поверенного оборудования и документов специалистов). Нужно только при
+    внешнем хранилище (storage): рендеринг в пуле читает файлы с диска.
+    """
+    import blob_store
+
+    paths = [f.get("file_path") for f in ctx.get("document_files") or []]
+    paths += [v.get("scan_file_path") for v in ctx.get("verification_equipment") or []]
+    for doc in ctx.get("specialist_docs") or []:
+        paths += [c.get("scan_file_path") for c in doc.get("certifications") or []]
+    await blob_store.ensure_local_many(paths)
+
+
+async def _load_questionnaire_ndt_methods(session: AsyncSession, questionnaire_id) -> List[Dict[str, Any]]:
+    result = await session.execute(
+        select(NDTMethod).where(NDTMethod.questionnaire_id == questionnaire_id).order_by(NDTMethod.created_at)
+    )
+    return [ndt_method_to_dict(m) for m in result.scalars().all()]
+
+
+async def _load_questionnaire_document_files(session: AsyncSession, questionnaire_id) -> List[Dict[str, Any]]:
+    result = await session.execute(
+        select(QuestionnaireDocumentFile)
+        .where(QuestionnaireDocumentFile.questionnaire_id == questionnaire_id)
+        .order_by(QuestionnaireDocumentFile.document_number, QuestionnaireDocumentFile.file_path)
+    )
+    return [document_file_to_dict(f) for f in result.scalars().all()]
+
+
+def questionnaire_content_hash(ctx: Dict[str, Any]) -> str:
+    """
+    Версия содержимого опросного листа: данные чек-листа, реквизиты, оборудование,
+    методы НК и вложения плюс версия рендерера. Совпадает — сгенерированные PDF/Word актуальны.
+    """
+    from report_fragments import renderer_version
+
+    payload = {
+        "renderer": renderer_version(),
+        "questionnaire_data": ctx["questionnaire_data"],
+        "questionnaire_info": ctx["questionnaire_info"],
+        "equipment": ctx["equipment"],
+        "ndt_methods": ctx["ndt_methods"],
+        "document_files": ctx["document_files"],
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def build_questionnaire_context(db: AsyncSession, questionnaire_id) -> Dict[str, Any]:
+    """
+    Собрать данные для PDF/Word опросного листа: опросный лист + оборудование (в сессии
+    запроса, объект Questionnaire остается привязанным к ней), методы НК и вложения —
+    в той же сессии. content_hash — версия содержимого (questionnaire_content_hash).
+    """
+    result = await db.execute(
+        select(Questionnaire, Equipment)
+        .outerjoin(Equipment, Equipment.id == Questionnaire.equipment_id)
+        .where(Questionnaire.id == questionnaire_id)
+    )
+    row = result.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Questionnaire not found")
+    questionnaire, equipment = row
+    if not equipment:
+        raise HTTPException(status_code=404, detail="Equipment not found")
+    ndt_methods = await _load_questionnaire_ndt_methods(db, questionnaire_id)
+    document_files = await _load_questionnaire_document_files(db, questionnaire_id)
+
+    ctx = {
+        "questionnaire": questionnaire,
+        "questionnaire_data": questionnaire.questionnaire_data or {},
+        "equipment": equipment_to_dict(equipment),
+        "questionnaire_info": {
+            "inventory_number": questionnaire.equipment_inventory_number,
+            "equipment_name": questionnaire.equipment_name,
+            "inspection_date": questionnaire.inspection_date.isoformat() if questionnaire.inspection_date else None,
+            "inspector_name": questionnaire.inspector_name,
+            "inspector_position": questionnaire.inspector_position,
+        },
+        "ndt_methods": ndt_methods,
+        "document_files": document_files,
+    }
+    ctx["content_hash"] = questionnaire_content_hash(ctx)
+    return ctx
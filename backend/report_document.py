@@ -0,0 +1,694 @@
+"""
+Промежуточная модель документа отчета.
+
+Контекст отчета (инспекция, оборудование, методы НК, вложения, документы
+специалистов, поверенное оборудование) один раз обходится и превращается в
+последовательность блоков: заголовки, абзацы, таблицы, изображения, разрывы
+страниц. PDF (ReportGenerator.render_document) и DOCX
+(WordGenerator.render_document) отрисовываются из одной и той же модели, поэтому
+при генерации обоих форматов разбор чек-листа и сборка таблиц выполняются один раз.
+
+Сканы удостоверений и свидетельств о поверке описываются блоками Attachment и
+списком ReportDocument.appendices: в PDF они выносятся в приложения в конце
+отчета (см. appendix_bundles), в DOCX встраиваются изображениями.
+"""
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from image_derivatives import render_path
+
+
+@dataclass
+class Heading:
+    """Заголовок. level: 0 — заголовок отчета, 1/2 — раздел/подраздел, 3 — акт/пункт"""
+    text: str
+    level: int = 1
+
+
+@dataclass
+class Text:
+    """
+    Абзац. style: body, normal, subtitle, conclusion.
+    label — выделенная жирным подпись перед текстом ("Результаты: ...").
+    """
+    text: str
+    style: str = "body"
+    label: Optional[str] = None
+
+
+@dataclass
+class Table:
+    """
+    Таблица. kind:
+      - "kv" — две колонки "параметр: значение", первая колонка выделена;
+      - "grid" — первая строка — шапка, далее строки данных.
+    Размеры шрифтов и отступы используются PDF-рендерером, ширины колонок — обоими.
+    """
+    rows: List[List[str]]
+    col_widths: Sequence[float]  # в сантиметрах
+    kind: str = "grid"
+    font_size: float = 7
+    header_font_size: float = 8
+    padding: Optional[float] = None
+    align: Optional[str] = None
+    valign: Optional[str] = None
+
+
+@dataclass
+class Image:
+    """Изображение с диска (подпись выводится абзацем перед ним)"""
+    path: str
+    caption: Optional[str] = None
+    width: float = 16  # см
+    height: float = 10  # см
+
+
+@dataclass
+class Attachment:
+    """Скан документа: в DOCX — изображение, в PDF — ссылка на приложение в конце отчета"""
+    path: str
+    mime_type: Optional[str] = None
+    file_name: Optional[str] = None
+
+    @property
+    def is_image(self) -> bool:
+        return "image" in (self.mime_type or "").lower()
+
+
+@dataclass
+class Appendix:
+    """Приложение в конце PDF: сканы одного инженера (engineer) или прибора (instrument)"""
+    kind: str
+    key: str
+    title: str
+    items: List[Dict[str, Any]] = field(default_factory=list)  # [{"path", "mime_type", "caption"}]
+
+
+@dataclass
+class Spacer:
+    height: float  # см
+
+
+@dataclass
+class PageBreak:
+    pass
+
+
+@dataclass
+class FragmentBreak:
+    """
+    Граница фрагмента кеша PDF (report_fragments) без разрыва страницы: часто
+    меняющиеся блоки (статус, заключение) отделяются от тяжелых таблиц, и их
+    правка не перерисовывает соседние разделы. В верстке не отображается.
+    """
+    pass
+
+
+Block = Union[Heading, Text, Table, Image, Attachment, Spacer, PageBreak, FragmentBreak]
+
+
+@dataclass
+class ReportDocument:
+    """Документ отчета: заголовок для метаданных, последовательность блоков и приложения"""
+    title: str
+    blocks: List[Block] = field(default_factory=list)
+    appendices: List[Appendix] = field(default_factory=list)
+
+    def add(self, *blocks: Block) -> "ReportDocument":
+        self.blocks.extend(blocks)
+        return self
+
+    def extend(self, blocks: List[Block]) -> "ReportDocument":
+        self.blocks.extend(blocks)
+        return self
+
+
+# Список названий документов (из мобильного приложения)
+DOCUMENT_NAMES = {
+    '1': 'Лицензия на осуществление деятельности по эксплуатации взрывопожароопасных и химически опасных производственных объектов I, II и III классов опасности',
+    '2': 'Свидетельство о регистрации в государственном реестре ОПО, включая сведения характеризующие ОПО',
+    '3': 'Технологический регламент объектов опасных производственных объектов',
+    '4': 'План мероприятий по локализации и ликвидации последствий аварий на опасном производственном объекте',
+    '5': 'Положение о производственном контроле за соблюдением требований промышленной безопасности на опасных производственных объектах',
+    '6': 'Журнал учета аварий и инцидентов на ОПО',
+    '7': 'Страховой полис страхования гражданской ответственности владельца опасного объекта за причинение вреда в результате аварии на опасном объекте',
+    '8': 'Приказ о назначении ответственного лица за исправное состояние и безопасную эксплуатацию сосудов',
+    '9': 'Приказ о назначении ответственного лица за осуществление производственного контроля и соблюдение требований промышленной безопасности на опасном производственном объекте',
+    '10': 'Паспорт сосуда заводской (удостоверение о качестве монтажа, сертификат соответствия, сборочный чертёж и схема включения сосуда, расчёт на прочность)',
+    '11': 'Инструкция по монтажу и эксплуатации',
+    '12': 'Паспорта на предохранительные клапаны',
+    '13': 'Паспорта на запорную арматуру',
+    '14': 'Документация на контрольно-измерительные приборы',
+    '15': 'Ремонтная (исполнительная) документация',
+    '16': 'Заключение экспертизы промышленной безопасности',
+    '17': 'Акты проведения УЗТ',
+}
+
+# Табличные разделы чек-листа: (ключ данных, заголовок, шапка, поля строки, ширины колонок)
+_CHECKLIST_TABLES: List[Tuple[str, str, List[str], List[str], List[float]]] = [
+    (
+        'zra_items', "3.4. ЗРА (запорно-регулирующая арматура)",
+        ['№', 'Кол-во', 'Типоразмер', 'Тех. №', 'Зав. №', 'Место на схеме'],
+        ['quantity', 'type_size', 'tech_number', 'serial_number', 'location_on_scheme'],
+        [0.8, 1.3, 3.0, 2.0, 2.0, 8.0],
+    ),
+    (
+        'sppk_items', "3.5. СППК (предохранительные клапаны)",
+        ['№', 'Кол-во', 'Типоразмер', 'Тех. №', 'Зав. №', 'Место на схеме'],
+        ['quantity', 'type_size', 'tech_number', 'serial_number', 'location_on_scheme'],
+        [0.8, 1.3, 3.0, 2.0, 2.0, 8.0],
+    ),
+    (
+        'ovality_measurements', "3.6. Измерительный контроль — овальность",
+        ['№', 'Сечение', 'Dmax', 'Dmin', 'Отклонение, %'],
+        ['section_number', 'max_diameter', 'min_diameter', 'deviation_percent'],
+        [0.8, 3.0, 4.0, 4.0, 4.2],
+    ),
+    (
+        'deflection_measurements', "3.7. Измерительный контроль — прогиб",
+        ['№', 'Сечение', 'Прогиб, мм', 'Прогиб, %'],
+        ['section_number', 'deflection_mm', 'deflection_percent'],
+        [0.8, 3.0, 7.0, 7.2],
+    ),
+    (
+        'hardness_tests', "3.8. Контроль твердости",
+        ['№', 'Шов', 'Участок', 'Доп. осн', 'Доп. шов', 'Осн', 'Шов', 'ЗТВ'],
+        ['weld_number', 'area_number', 'allowed_hardness_base', 'allowed_hardness_weld',
+         'hardness_base', 'hardness_weld', 'hardness_haz'],
+        [0.7, 1.2, 1.5, 2.1, 2.1, 2.1, 2.1, 2.2],
+    ),
+    (
+        'weld_inspections', "3.9. Контроль сварных соединений (ПВК/УЗК)",
+        ['№', 'Шов', 'Место на карте', 'ПВК дефект', 'УЗК дефект', 'Заключение'],
+        ['weld_number', 'location_on_control_map', 'pvk_defect', 'uzk_defect', 'conclusion'],
+        [0.7, 1.2, 4.0, 4.0, 4.0, 4.1],
+    ),
+]
+
+_THICKNESS_FIELDS = ['location', 'section_number', 'thickness', 'min_allowed_thickness', 'x_percent', 'y_percent', 'comment']
+
+
+def _s(value: Any) -> str:
+    """Значение ячейки: None/пустое -> ''"""
+    return str(value or '')
+
+
+def _kv_table(rows: List[List[Any]], font_size: float = 10, padding: Optional[float] = 8) -> Table:
+    return Table(
+        rows=[[_s(k), _s(v)] for k, v in rows],
+        col_widths=[6, 12],
+        kind="kv",
+        font_size=font_size,
+        padding=padding,
+    )
+
+
+def _format_date(value: Any) -> str:
+    if not value:
+        return ''
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).strftime('%d.%m.%Y')
+    except Exception:
+        return str(value)
+
+
+def _image(path: Optional[str], caption: Optional[str] = None) -> List[Block]:
+    if not path or not isinstance(path, str) or not os.path.exists(path):
+        return []
+    # Фото вставляется уменьшенной копией print (если уже построена), а не в исходном разрешении
+    return [Image(path=render_path(path), caption=caption), Spacer(0.3 if caption else 0.2)]
+
+
+def build_checklist_blocks(data: Dict[str, Any], document_files: Optional[List[Dict[str, Any]]] = None) -> List[Block]:
+    """Блоки по данным чек-листа: документы, карта обследования, УЗТ, ЗРА, СППК, измерения, твердость, швы"""
+    blocks: List[Block] = []
+
+    # Поддерживаем обе схемы ключей (snake_case из мобильного и camelCase из старых версий)
+    def _get(*keys, default=None):
+        for k in keys:
+            if k in data and data.get(k) is not None:
+                return data.get(k)
+        return default
+
+    # Быстрый индекс вложений по ключу (document_number -> file_path)
+    attachments: Dict[str, str] = {}
+    for f in document_files or []:
+        if not isinstance(f, dict):
+            continue
+        dn = str(f.get("document_number") or "")
+        fp = f.get("file_path")
+        if dn and isinstance(fp, str) and fp:
+            attachments[dn] = fp
+
+    # Документы
+    docs = _get('documents', default={})
+    if docs:
+        rows = [['№', 'Наименование документа', 'Наличие']]
+        if isinstance(docs, dict):
+            for num, has_doc in docs.items():
+                rows.append([str(num), DOCUMENT_NAMES.get(str(num), f'Документ {num}'), 'Да' if has_doc else 'Нет'])
+        blocks.append(Heading("3.1. Перечень рассмотренных документов", level=2))
+        blocks.append(Table(rows=rows, col_widths=[1, 12, 5], font_size=10, header_font_size=10, padding=8, align="CENTER"))
+        blocks.append(Spacer(0.5))
+
+    # Карта обследования
+    vessel_name = _get('vessel_name', 'vesselName')
+    if vessel_name:
+        vessel_rows = [
+            ['Наименование сосуда:', vessel_name],
+            ['Заводской номер:', _get('serial_number', 'serialNumber', default='')],
+            ['Регистрационный номер:', _get('reg_number', 'regNumber', default='')],
+        ]
+        working_pressure = _get('working_pressure', 'workingPressure')
+        diameter = _get('diameter')
+        if working_pressure:
+            vessel_rows.append(['Рабочее давление:', working_pressure])
+        if diameter:
+            vessel_rows.append(['Диаметр сосуда:', diameter])
+        blocks.append(Heading("3.2. Карта обследования", level=2))
+        blocks.append(_kv_table(vessel_rows))
+        blocks.append(Spacer(0.5))
+
+    # Фото заводской таблички (как в мобильном)
+    plate_path = attachments.get("factory_plate_photo") or _get('factory_plate_photo', 'factoryPlatePhoto')
+    blocks.extend(_image(plate_path, "Фото заводской таблички:"))
+
+    # Толщинометрия (УЗТ) — таблица + схема (если есть)
+    thickness = _get('thickness_measurements', 'thicknessMeasurements', default=[])
+    if isinstance(thickness, list) and thickness:
+        blocks.append(Heading("3.3. УЗТ (Ультразвуковая толщинометрия)", level=2))
+        rows = [['№', 'Местоположение', 'Сечение', 'Толщина, мм', 'Мин. допустимая, мм', 'X%', 'Y%', 'Комментарий']]
+        for idx, point in enumerate(thickness, 1):
+            if isinstance(point, dict):
+                rows.append([str(idx)] + [_s(point.get(k)) for k in _THICKNESS_FIELDS])
+        if len(rows) > 1:
+            blocks.append(Table(rows=rows, col_widths=[0.8, 3.0, 1.6, 1.9, 2.3, 1.1, 1.1, 6.0], padding=4, align="LEFT"))
+            blocks.append(Spacer(0.3))
+        scheme_path = attachments.get("control_scheme_image") or _get('control_scheme_image', 'controlSchemeImage')
+        blocks.extend(_image(scheme_path, "Схема контроля:"))
+
+    # ЗРА / СППК / измерительный контроль / твердость / сварные соединения
+    for key, title, header, fields, widths in _CHECKLIST_TABLES:
+        items = _get(key, default=[])
+        if not isinstance(items, list) or not items:
+            continue
+        rows = [list(header)]
+        for i, it in enumerate(items, 1):
+            if isinstance(it, dict):
+                rows.append([str(i)] + [_s(it.get(k)) for k in fields])
+        blocks.append(Heading(title, level=2))
+        blocks.append(Table(rows=rows, col_widths=widths))
+        blocks.append(Spacer(0.3))
+
+    return blocks
+
+
+def _equipment_rows(equipment_data: Dict[str, Any], with_commissioning: bool = True) -> List[List[Any]]:
+    rows = [
+        ['Наименование оборудования:', equipment_data.get('name') or 'Не указано'],
+        ['Заводской номер:', equipment_data.get('serial_number') or 'Не указан'],
+        ['Место расположения:', equipment_data.get('location') or 'Не указано'],
+    ]
+    if with_commissioning:
+        rows.append(['Дата ввода в эксплуатацию:', equipment_data.get('commissioning_date') or 'Не указана'])
+        attrs = equipment_data.get('attributes') or {}
+        if attrs.get('regNumber'):
+            rows.append(['Регистрационный номер:', attrs['regNumber']])
+        if attrs.get('pressure'):
+            rows.append(['Рабочее давление:', attrs['pressure']])
+        if attrs.get('volume'):
+            rows.append(['Объем:', attrs['volume']])
+    return rows
+
+
+def _ndt_photos(method: Dict[str, Any]) -> List[str]:
+    """Фото по методу НК, включая аннотированные изображения"""
+    photos = method.get('photos') or []
+    additional_data = method.get('additional_data') or {}
+    annotated = additional_data.get('annotated_images', []) if isinstance(additional_data, dict) else []
+    images = (list(photos) if isinstance(photos, list) else []) + list(annotated or [])
+    return [p for p in images if isinstance(p, str)][:10]
+
+
+def _ndt_act_blocks(ndt_methods: Optional[List[Dict[str, Any]]], inspection_data: Dict[str, Any]) -> List[Block]:
+    blocks: List[Block] = []
+    if not ndt_methods:
+        return [Text("Методы НК не указаны.")]
+    performed = [m for m in ndt_methods if m.get("is_performed")]
+    if not performed:
+        return [Text("Методы НК не указаны или не выполнены.")]
+    for idx, m in enumerate(performed, 1):
+        blocks.append(Heading(f"Акт №{idx}. {m.get('method_name') or 'Метод НК'}", level=3))
+        blocks.append(_kv_table([
+            ["Метод НК:", m.get("method_name")],
+            ["Код:", m.get("method_code")],
+            ["Нормативный документ:", m.get("standard")],
+            ["Оборудование/прибор:", m.get("equipment")],
+            ["Дата выполнения:", m.get("performed_date") or inspection_data.get("date_performed")],
+            ["Специалист:", m.get("inspector_name")],
+            ["Уровень:", m.get("inspector_level")],
+        ], font_size=9, padding=None))
+        blocks.append(Spacer(0.2))
+        for label, key in (("Результаты:", "results"), ("Дефекты:", "defects"), ("Заключение:", "conclusion")):
+            if m.get(key):
+                blocks.append(Text(str(m.get(key)), style="normal", label=label))
+        photos = [p for p in _ndt_photos(m) if os.path.exists(p)]
+        if photos:
+            blocks.append(Text("Фотоматериалы:"))
+            for p in photos:
+                blocks.extend(_image(p))
+        blocks.append(Spacer(0.4))
+    return blocks
+
+
+def _ndt_summary_blocks(ndt_methods: List[Dict[str, Any]], heading: str) -> List[Block]:
+    """Сводная таблица методов НК и детализация (экспертиза)"""
+    performed = [m for m in ndt_methods if m.get('is_performed')]
+    blocks: List[Block] = [Heading(heading, level=1)]
+    if not performed:
+        return blocks
+    rows = [['Метод НК', 'Нормативный документ', 'Оборудование', 'Инженер', 'Уровень', 'Результаты']]
+    for method in performed:
+        results = _s(method.get('results'))
+        rows.append([
+            _s(method.get('method_name')),
+            _s(method.get('standard')),
+            _s(method.get('equipment')),
+            _s(method.get('inspector_name')),
+            _s(method.get('inspector_level')),
+            results[:50] + '...' if len(results) > 50 else results,
+        ])
+    blocks.append(Table(rows=rows, col_widths=[3, 3, 3, 3, 2, 4], font_size=8, header_font_size=9, padding=6, align="LEFT"))
+    for method in performed:
+        blocks.append(Spacer(0.3))
+        blocks.append(Heading(_s(method.get('method_name')), level=3))
+        if method.get('defects'):
+            blocks.append(Text(str(method.get('defects')), style="normal", label="Обнаруженные дефекты:"))
+        if method.get('conclusion'):
+            blocks.append(Text(str(method.get('conclusion')), style="normal", label="Заключение:"))
+    return blocks
+
+
+def _specialist_blocks(specialist_docs: Optional[List[Dict[str, Any]]], with_scans: bool) -> List[Block]:
+    if not specialist_docs:
+        return [Text("Документы специалистов НК не приложены.")]
+    blocks: List[Block] = []
+    for s in specialist_docs:
+        blocks.append(Heading(f"Документы специалиста: {s.get('inspector_name') or ''}", level=3))
+        for c in s.get("certifications") or []:
+            blocks.append(Text(_certification_caption(c)))
+            sp = c.get("scan_file_path")
+            if with_scans and sp and os.path.exists(sp):
+                blocks.append(Attachment(path=render_path(sp, c.get("scan_mime_type")), mime_type=c.get("scan_mime_type"), file_name=c.get("scan_file_name")))
+    return blocks
+
+
+def _certification_caption(c: Dict[str, Any]) -> str:
+    return f"{c.get('certification_type') or ''} №{c.get('certificate_number') or ''} ({c.get('issuing_organization') or ''})"
+
+
+def _verification_caption(eq: Dict[str, Any]) -> str:
+    return f"Свидетельство о поверке: {eq.get('name') or ''} ({eq.get('scan_file_name') or ''})"
+
+
+def _scan_item(path: Optional[str], mime_type: Optional[str], caption: str) -> Optional[Dict[str, Any]]:
+    if not path or not os.path.exists(path):
+        return None
+    return {"path": render_path(path, mime_type), "mime_type": mime_type, "caption": caption}
+
+
+def build_appendices(
+    specialist_docs: Optional[List[Dict[str, Any]]],
+    verification_equipment: Optional[List[Dict[str, Any]]],
+    with_specialists: bool = True,
+) -> List[Appendix]:
+    """Приложения PDF: пакет сканов по каждому инженеру и по каждому прибору"""
+    appendices: List[Appendix] = []
+    if with_specialists:
+        for s in specialist_docs or []:
+            items = [
+                _scan_item(c.get("scan_file_path"), c.get("scan_mime_type"), _certification_caption(c))
+                for c in s.get("certifications") or []
+            ]
+            items = [i for i in items if i]
+            if items and s.get("engineer_id"):
+                appendices.append(Appendix(
+                    kind="engineer",
+                    key=str(s["engineer_id"]),
+                    title=f"Документы специалиста: {s.get('inspector_name') or ''}",
+                    items=items,
+                ))
+    for eq in verification_equipment or []:
+        item = _scan_item(eq.get("scan_file_path"), eq.get("scan_mime_type"), _verification_caption(eq))
+        if item and eq.get("id"):
+            appendices.append(Appendix(kind="instrument", key=str(eq["id"]), title=item["caption"], items=[item]))
+    return appendices
+
+
+def _verification_blocks(verification_equipment: Optional[List[Dict[str, Any]]], heading: str) -> List[Block]:
+    if not verification_equipment:
+        return []
+    blocks: List[Block] = [
+        Spacer(0.5),
+        Heading(heading, level=3),
+        Text("При проведении обследования использовалось следующее поверенное оборудование:"),
+    ]
+    rows = [['№', 'Наименование', 'Тип', 'Серийный номер', 'Срок поверки', 'Свидетельство']]
+    for idx, eq in enumerate(verification_equipment, 1):
+        rows.append([
+            str(idx),
+            _s(eq.get('name')),
+            _s(eq.get('equipment_type')),
+            _s(eq.get('serial_number')),
+            _format_date(eq.get('next_verification_date')),
+            eq.get('verification_certificate_number') or '—',
+        ])
+    blocks.append(Table(rows=rows, col_widths=[0.8, 5, 2.5, 3, 3, 3.7], font_size=8, header_font_size=9, valign="TOP"))
+    blocks.append(Spacer(0.3))
+
+    # Сканы свидетельств о поверке
+    blocks.append(Text("Сканы свидетельств о поверке используемого оборудования:"))
+    for eq in verification_equipment:
+        scan_path = eq.get('scan_file_path')
+        if not scan_path or not os.path.exists(scan_path):
+            continue
+        blocks.append(Spacer(0.2))
+        blocks.append(Text(_verification_caption(eq)))
+        blocks.append(Attachment(path=render_path(scan_path, eq.get('scan_mime_type')), mime_type=eq.get('scan_mime_type'), file_name=eq.get('scan_file_name')))
+    return blocks
+
+
+def build_technical_document(
+    inspection_data: Dict[str, Any],
+    equipment_data: Dict[str, Any],
+    ndt_methods: Optional[List[Dict[str, Any]]] = None,
+    document_files: Optional[List[Dict[str, Any]]] = None,
+    specialist_docs: Optional[List[Dict[str, Any]]] = None,
+    verification_equipment: Optional[List[Dict[str, Any]]] = None,
+) -> ReportDocument:
+    """Технический отчет (формат, близкий к реальному отчету ТД)"""
+    document = ReportDocument(title="ОТЧЕТ О ТЕХНИЧЕСКОМ ДИАГНОСТИРОВАНИИ")
+    data = inspection_data.get("data") if isinstance(inspection_data.get("data"), dict) else {}
+    # Чек-лист разбирается один раз; блоки используются в разделах 3 и 5
+    checklist = build_checklist_blocks(data, document_files) if data else []
+
+    # Титульная страница
+    org = str(data.get("organization") or data.get("organization_name") or "").strip()
+    document.add(
+        Heading(document.title, level=0),
+        Spacer(0.5),
+        Text("по результатам обследования оборудования", style="subtitle"),
+    )
+    if org:
+        document.add(Spacer(0.2), Text(f"Организация/объект: {org}"))
+    document.add(
+        Spacer(1),
+        Text(f"Оборудование: {equipment_data.get('name') or 'Не указано'}"),
+        Text(f"Дата формирования: {datetime.now().strftime('%d.%m.%Y')}"),
+        PageBreak(),
+    )
+
+    # Содержание (упрощённое)
+    document.add(Heading("СОДЕРЖАНИЕ", level=1))
+    for item in [
+        "1. Общая часть",
+        "2. Исходные данные и нормативная база",
+        "3. Описание объекта и карта обследования",
+        "4. Акт(ы) неразрушающего контроля (по методам)",
+        "5. Результаты обследования (детализация)",
+        "6. Заключение",
+        "7. Приложения (фото/схемы/документы специалистов)",
+    ]:
+        document.add(Text(item))
+    document.add(PageBreak())
+
+    document.add(
+        Heading("1. ОБЩАЯ ЧАСТЬ", level=1),
+        Text(
+            "Настоящий отчет составлен по результатам технического диагностирования оборудования с целью "
+            "оценки технического состояния и определения возможности дальнейшей безопасной эксплуатации."
+        ),
+        Spacer(0.3),
+        Heading("2. ИСХОДНЫЕ ДАННЫЕ И НОРМАТИВНАЯ БАЗА", level=1),
+        Text(
+            "При выполнении работ использовались данные, предоставленные Заказчиком, результаты обследований и "
+            "применимые нормативные документы (ФНП, ГОСТ, РД и др.)."
+        ),
+        Spacer(0.3),
+    )
+
+    # 3. Описание объекта и карта обследования
+    inspection_rows = [
+        ['Дата проведения диагностики:', inspection_data.get('date_performed') or 'Не указана'],
+        ['Статус:', inspection_data.get('status') or 'DRAFT'],
+    ]
+    if data.get('executors'):
+        inspection_rows.append(['Исполнители:', data['executors']])
+    if data.get('organization'):
+        inspection_rows.append(['Организация:', data['organization']])
+    # Сведения об обследовании (статус) — отдельным фрагментом от таблиц
+    document.add(
+        Heading("3. ОПИСАНИЕ ОБЪЕКТА И КАРТА ОБСЛЕДОВАНИЯ", level=1),
+        _kv_table(_equipment_rows(equipment_data)),
+        Spacer(0.5),
+        FragmentBreak(),
+        Text("Сведения об обследовании:"),
+        _kv_table(inspection_rows),
+        Spacer(0.5),
+        FragmentBreak(),
+    )
+    document.extend(checklist)
+    document.add(PageBreak())
+
+    # 4. Акт(ы) НК
+    document.add(Heading("4. АКТ(Ы) НЕРАЗРУШАЮЩЕГО КОНТРОЛЯ", level=1))
+    document.extend(_ndt_act_blocks(ndt_methods, inspection_data))
+    document.add(PageBreak())
+
+    # 5. Детальные данные диагностики
+    if inspection_data.get('data'):
+        document.add(Heading("5. РЕЗУЛЬТАТЫ ОБСЛЕДОВАНИЯ (ДЕТАЛИЗАЦИЯ)", level=1))
+        document.extend(checklist)
+
+    # 6. Заключение
+    if inspection_data.get('conclusion'):
+        document.add(
+            FragmentBreak(),
+            Heading("6. ЗАКЛЮЧЕНИЕ", level=1),
+            Text(inspection_data['conclusion'], style="conclusion"),
+        )
+
+    # 7. Приложения
+    document.add(PageBreak(), Heading("7. ПРИЛОЖЕНИЯ", level=1))
+    document.extend(_specialist_blocks(specialist_docs, with_scans=True))
+    document.extend(_verification_blocks(
+        verification_equipment, "7.1. Используемое оборудование для неразрушающего контроля"
+    ))
+
+    # Подпись
+    document.add(
+        Spacer(0.8),
+        Text("Ответственный исполнитель: _________________________"),
+        Text(f"Дата: {datetime.now().strftime('%d.%m.%Y')}"),
+    )
+    document.appendices = build_appendices(specialist_docs, verification_equipment)
+    return document
+
+
+def build_expertise_document(
+    inspection_data: Dict[str, Any],
+    equipment_data: Dict[str, Any],
+    resource_data: Optional[Dict[str, Any]] = None,
+    ndt_methods: Optional[List[Dict[str, Any]]] = None,
+    document_files: Optional[List[Dict[str, Any]]] = None,
+    specialist_docs: Optional[List[Dict[str, Any]]] = None,
+    verification_equipment: Optional[List[Dict[str, Any]]] = None,
+) -> ReportDocument:
+    """Экспертиза промышленной безопасности"""
+    document = ReportDocument(title="ЭКСПЕРТИЗА ПРОМЫШЛЕННОЙ БЕЗОПАСНОСТИ")
+    data = inspection_data.get("data") if isinstance(inspection_data.get("data"), dict) else {}
+
+    document.add(
+        Heading(document.title, level=0),
+        Spacer(0.5),
+        Text(f"оборудования: {equipment_data.get('name') or 'Не указано'}", style="subtitle"),
+        Spacer(1),
+        Heading("1. ОБЩИЕ СВЕДЕНИЯ ОБ ОБОРУДОВАНИИ", level=1),
+        _kv_table(_equipment_rows(equipment_data, with_commissioning=False)),
+        Spacer(0.5),
+        Heading("2. РЕЗУЛЬТАТЫ ЭКСПЕРТИЗЫ", level=1),
+    )
+    if data:
+        document.add(FragmentBreak())
+        document.extend(build_checklist_blocks(data, document_files))
+
+    section_num = 3
+    if resource_data:
+        unit = resource_data.get('unit') or ''
+        document.add(
+            FragmentBreak(),
+            Heading("3. РЕСУРС ОБОРУДОВАНИЯ", level=1),
+            _kv_table([
+                ['Тип ресурса:', resource_data.get('resource_type') or 'Не указан'],
+                ['Текущее значение:', f"{resource_data.get('current_value', 0)} {unit}"],
+                ['Лимит:', f"{resource_data.get('limit_value', 0)} {unit}"],
+                ['Последнее обновление:', resource_data.get('last_updated') or 'Не указана'],
+            ]),
+            Spacer(0.5),
+        )
+        section_num = 4
+
+    if ndt_methods:
+        document.add(FragmentBreak())
+        document.extend(_ndt_summary_blocks(ndt_methods, f"{section_num}. МЕТОДЫ НЕРАЗРУШАЮЩЕГО КОНТРОЛЯ"))
+        section_num += 1
+
+    if inspection_data.get('conclusion'):
+        document.add(
+            FragmentBreak(),
+            Heading(f"{section_num}. ЗАКЛЮЧЕНИЕ", level=1),
+            Text(inspection_data['conclusion'], style="conclusion"),
+        )
+
+    # Приложения специалистов (в экспертизе — только реквизиты удостоверений)
+    document.add(PageBreak(), Heading("ПРИЛОЖЕНИЯ", level=1))
+    document.extend(_specialist_blocks(specialist_docs, with_scans=False))
+    document.extend(_verification_blocks(
+        verification_equipment, "Используемое оборудование для неразрушающего контроля"
+    ))
+
+    # Подпись
+    document.add(
+        PageBreak(),
+        Spacer(10),
+        Text("_________________________"),
+        Text("Эксперт"),
+        Spacer(0.5),
+        Text(f"Дата: {datetime.now().strftime('%d.%m.%Y')}"),
+    )
+    document.appendices = build_appendices(specialist_docs, verification_equipment, with_specialists=False)
+    return document
+
+
+def build_report_document(ctx: Dict[str, Any], report_type: str) -> ReportDocument:
+    """Модель документа по контексту из report_context.build_report_context"""
+    if report_type == "EXPERTISE":
+        return build_expertise_document(
+            ctx["inspection"],
+            ctx["equipment"],
+            ctx.get("resource"),
+            ctx.get("ndt_methods"),
+            document_files=ctx.get("document_files"),
+            specialist_docs=ctx.get("specialist_docs"),
+            verification_equipment=ctx.get("verification_equipment"),
+        )
+    return build_technical_document(
+        ctx["inspection"],
+        ctx["equipment"],
+        ctx.get("ndt_methods"),
+        document_files=ctx.get("document_files"),
+        specialist_docs=ctx.get("specialist_docs"),
+        verification_equipment=ctx.get("verification_equipment"),
+    )
@@ -0,0 +1,215 @@
+"""
+Кеш отрисованных разделов PDF-отчета.
+
+Модель документа (report_document) делится на разделы по разрывам страниц
+(rd.PageBreak) и границам фрагментов (rd.FragmentBreak), так что верстка
+совпадает с отрисовкой целиком; каждый раздел отрисовывается отдельным
+PDF-фрагментом и сохраняется в REPORT_FRAGMENT_CACHE_DIR под ключом — хешем его
+блоков, состояния файлов изображений и исходников рендерера. При повторной
+генерации (например, изменилось только заключение) неизменные разделы берутся
+из кеша готовыми страницами и склеиваются с заново отрисованными (pypdf).
+
+Раздел после rd.FragmentBreak продолжает страницу предыдущего: рядом с
+фрагментом хранится позиция, на которой он закончился (<ключ>.end), следующий
+отрисовывается с этой позиции (она входит в его ключ), а при склейке его первая
+страница накладывается на последнюю страницу предыдущего.
+
+REPORT_FRAGMENT_CACHE=0 отключает кеш: документ отрисовывается целиком.
+Размер кеша ограничен REPORT_FRAGMENT_CACHE_MB (старые фрагменты удаляются).
+"""
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import report_document as rd
+
+FRAGMENT_CACHE_DIR = Path(os.getenv("REPORT_FRAGMENT_CACHE_DIR", "/app/reports/fragment_cache"))
+FRAGMENT_CACHE_MAX_BYTES = int(os.getenv("REPORT_FRAGMENT_CACHE_MB", "500")) * 1024 * 1024
+
+_renderer_signature: Optional[str] = None
+
+
+def enabled() -> bool:
+    """Кеш включен и pypdf доступен для склейки"""
+    if os.getenv("REPORT_FRAGMENT_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return False
+    try:
+        import pypdf  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def renderer_version() -> str:
+    """
+    Хеш исходников рендерера: после изменения кода старые фрагменты не используются,
+    а сгенерированные по content_hash PDF/Word опросных листов считаются устаревшими.
+    """
+    global _renderer_signature
+    if _renderer_signature is None:
+        h = hashlib.sha256()
+        here = Path(__file__).resolve().parent
+        for name in ("report_generator.py", "report_document.py", "report_fragments.py", "word_generator.py"):
+            try:
+                h.update((here / name).read_bytes())
+            except OSError:
+                pass
+        _renderer_signature = h.hexdigest()
+    return _renderer_signature
+
+
+def split_sections(blocks: List["rd.Block"]) -> List[Tuple[str, List["rd.Block"], bool]]:
+    """
+    Разделы документа: [(заголовок, блоки, продолжение)] — участки между
+    разрывами страниц (rd.PageBreak) и границами фрагментов (rd.FragmentBreak).
+    После разрыва модель и так начинает новую страницу; раздел после границы
+    фрагмента помечается продолжением и дорисовывается на странице предыдущего
+    (см. render_fragments). Поэтому склеенные фрагменты дают ту же верстку, что
+    и документ, отрисованный целиком. Заголовок (для закладки) — первый
+    заголовок уровня 0–1 раздела; раздел без такого заголовка закладки не получает.
+    """
+    sections: List[Tuple[List[rd.Block], bool]] = [([], False)]
+    for block in blocks:
+        if isinstance(block, rd.PageBreak):
+            sections.append(([], False))
+        elif isinstance(block, rd.FragmentBreak):
+            # Пустой раздел перед границей — продолжение переносится дальше
+            if sections[-1][0]:
+                sections.append(([], True))
+        else:
+            sections[-1][0].append(block)
+
+    result = []
+    for section_blocks, continued in sections:
+        if not section_blocks:
+            continue
+        title = next(
+            (b.text for b in section_blocks if isinstance(b, rd.Heading) and b.level <= 1),
+            "",
+        )
+        result.append((title, section_blocks, continued and bool(result)))
+    return result
+
+
+def fragment_key(blocks: List["rd.Block"], salt: str = "") -> str:
+    """Ключ фрагмента: блоки раздела, файлы изображений (размер, mtime), рендерер"""
+    h = hashlib.sha256(renderer_version().encode("ascii"))
+    h.update(salt.encode("utf-8"))
+    for block in blocks:
+        h.update(repr(block).encode("utf-8"))
+        path = getattr(block, "path", None)
+        if path:
+            try:
+                st = os.stat(path)
+                h.update(f"|{st.st_size}|{st.st_mtime_ns}".encode("ascii"))
+            except OSError:
+                h.update(b"|missing")
+    return h.hexdigest()
+
+
+def get_fragment(key: str, render: Callable[[str], Optional[list]]) -> Tuple[str, Optional[list]]:
+    """
+    Фрагмент из кеша: (путь, позиция конца). При промахе — отрисовать
+    render(путь) и сохранить вместе с возвращенной им позицией конца.
+    """
+    FRAGMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = FRAGMENT_CACHE_DIR / f"{key}.pdf"
+    end_path = path.with_suffix(".end")
+    if path.exists():
+        try:
+            end = json.loads(end_path.read_text())
+            os.utime(path)  # для вытеснения по давности использования
+            return str(path), end
+        except (OSError, ValueError):
+            pass  # позиция потеряна — отрисовать заново
+
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_end_path = end_path.with_name(f".{end_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        end = render(str(tmp_path))
+        tmp_end_path.write_text(json.dumps(end))
+        os.replace(tmp_end_path, end_path)
+        os.replace(tmp_path, path)
+    finally:
+        for p in (tmp_path, tmp_end_path):
+            if p.exists():
+                p.unlink()
+    _prune()
+    return str(path), end
+
+
+def render_fragments(
+    sections: List[Tuple[str, List["rd.Block"], bool]],
+    salt: str,
+    render: Callable[[List["rd.Block"], str, Optional[list]], Optional[list]],
+) -> Iterator[Tuple[str, str, bool]]:
+    """
+    Фрагменты разделов по порядку: (заголовок, путь, продолжение).
+    render(блоки, путь, начало) отрисовывает раздел с позиции начала (None —
+    с новой страницы) и возвращает позицию конца. Продолжение отрисовывается
+    с позиции конца предыдущего фрагмента, и она входит в его ключ.
+    """
+    end = None
+    for title, blocks, continued in sections:
+        start = end if continued else None
+        key = fragment_key(blocks, salt if start is None else f"{salt}|{json.dumps(start)}")
+        path, end = get_fragment(key, lambda out, blocks=blocks, start=start: render(blocks, out, start))
+        yield title, path, continued
+
+
+def _prune() -> None:
+    """Удалить давно не использованные фрагменты сверх лимита размера кеша"""
+    try:
+        files = [(p, p.stat()) for p in FRAGMENT_CACHE_DIR.glob("*.pdf")]
+    except OSError:
+        return
+    total = sum(st.st_size for _, st in files)
+    if total <= FRAGMENT_CACHE_MAX_BYTES:
+        return
+    for p, st in sorted(files, key=lambda item: item[1].st_mtime):
+        try:
+            p.unlink()
+            total -= st.st_size
+        except OSError:
+            continue
+        try:
+            p.with_suffix(".end").unlink()
+        except OSError:
+            pass
+        if total <= FRAGMENT_CACHE_MAX_BYTES:
+            break
+
+
+def stitch(parts: List[Tuple[Optional[str], str, bool]], output_path: str, title: Optional[str] = None) -> str:
+    """
+    Склеить PDF-фрагменты [(закладка, путь, продолжение)] постранично в один
+    файл; первая страница продолжения накладывается на последнюю страницу
+    предыдущего фрагмента.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for outline_item, path, continued in parts:
+        if continued and len(writer.pages):
+            reader = PdfReader(path)
+            writer.pages[-1].merge_page(reader.pages[0])
+            if outline_item:
+                writer.add_outline_item(outline_item, len(writer.pages) - 1)
+            if len(reader.pages) > 1:
+                writer.append(reader, pages=(1, len(reader.pages)), import_outline=False)
+            continue
+        writer.append(path, outline_item=outline_item or None)
+    if title:
+        writer.add_metadata({"/Title": title})
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            writer.write(f)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
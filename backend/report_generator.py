@@ -4,15 +4,147 @@
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image, Flowable
+from reportlab.platypus.doctemplate import FrameActionFlowable
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+import functools
+import hashlib
 import os
 import io
+from xml.sax.saxutils import escape
+
+import report_document as rd
+from report_document import ReportDocument, build_technical_document, build_expertise_document
+
+# Режим больших таблиц: таблица длиннее LARGE_TABLE_ROWS строк отрисовывается
+# фрагментами по TABLE_CHUNK_ROWS строк с повтором шапки. Разбиение одной
+# огромной Table по страницам в ReportLab сверхлинейно (каждый split заново
+# пересчитывает остаток таблицы), а фрагменты фиксированного размера дают
+# линейное время сборки. Число строк фрагмента четное — полосы не сбиваются.
+LARGE_TABLE_ROWS = 200
+TABLE_CHUNK_ROWS = 100
+
+# Готовые TableStyle по параметрам блока: таблицы одного вида (и все фрагменты
+# большой таблицы) используют один и тот же объект стиля
+_TABLE_STYLES: Dict[tuple, TableStyle] = {}
+
+
+@functools.lru_cache(maxsize=None)
+def register_fonts() -> Tuple[str, str]:
+    """
+    Зарегистрировать шрифты с поддержкой русского языка (один раз на процесс).
+    Возвращает (обычный, жирный).
+    """
+    try:
+        # Пытаемся использовать системные шрифты с поддержкой кириллицы.
+        # Важно: для "????" в PDF почти всегда виноват шрифт без кириллицы,
+        # поэтому стараемся везде использовать DejaVu/Liberation.
+        candidates = [
+            {
+                "regular": "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+                "bold": "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+                "name_regular": "DejaVuSans",
+                "name_bold": "DejaVuSans-Bold",
+            },
+            {
+                "regular": "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+                "bold": "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+                "name_regular": "LiberationSans",
+                "name_bold": "LiberationSans-Bold",
+            },
+        ]
+
+        for c in candidates:
+            if os.path.exists(c["regular"]):
+                try:
+                    pdfmetrics.registerFont(TTFont(c["name_regular"], c["regular"]))
+                    if os.path.exists(c["bold"]):
+                        pdfmetrics.registerFont(TTFont(c["name_bold"], c["bold"]))
+                        return c["name_regular"], c["name_bold"]
+                    return c["name_regular"], c["name_regular"]
+                except Exception:
+                    continue
+
+        # Фолбэк: встроенные шрифты (могут не поддерживать кириллицу)
+        return "Helvetica", "Helvetica-Bold"
+    except Exception as e:
+        print(f"Warning: Could not register custom fonts: {e}")
+        return "Helvetica", "Helvetica-Bold"
+
+
+class _ContinuedTable(Flowable):
+    """
+    Следующий фрагмент большой таблицы. Шапка повторяется только на новой
+    странице: фрагмент, продолжающий таблицу на той же странице, рисуется
+    без нее, а при переносе остаток получает шапку (repeatRows) и дальше
+    делится как обычная таблица.
+    """
+
+    def __init__(self, header, rows, col_widths, style_for):
+        super().__init__()
+        self._header = header
+        self._rows = rows
+        self._col_widths = col_widths
+        # style_for(header, stripe_offset) -> TableStyle
+        self._style_for = style_for
+        self._body = self._make(rows, header=False, stripe_offset=0)
+        self._table = self._body
+
+    def _make(self, rows, header: bool, stripe_offset: int) -> Table:
+        data = self._header + rows if header else rows
+        table = Table(data, colWidths=self._col_widths, repeatRows=len(self._header) if header else 0)
+        table.setStyle(self._style_for(header, stripe_offset))
+        return table
+
+    def _at_page_top(self) -> bool:
+        # platypus помечает флоуабл _postponed, когда переносит его в следующий фрейм целиком
+        return bool(getattr(self, "_postponed", False))
+
+    def wrap(self, availWidth, availHeight):
+        if self._at_page_top() and self._table is self._body:
+            self._table = self._make(self._rows, header=True, stripe_offset=0)
+        self.width, self.height = self._table.wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        if self._at_page_top():
+            self.wrap(availWidth, availHeight)
+            return self._table.split(availWidth, availHeight)
+        parts = self._body.split(availWidth, availHeight)
+        if len(parts) != 2:
+            return parts
+        first = parts[0]
+        n = len(first._cellvalues)
+        # Остаток на новой странице — с шапкой; полосы продолжают чередование
+        return [first, self._make(self._rows[n:], header=True, stripe_offset=n % 2)]
+
+    def draw(self):
+        self._table.drawOn(self.canv, 0, 0)
+
+
+class _FramePosition(FrameActionFlowable):
+    """
+    Позиция в рамке страницы на границе фрагментов (rd.FragmentBreak): без
+    position — запоминает ее в конце фрагмента, с position — восстанавливает
+    в начале следующего, чтобы он продолжил ту же страницу.
+    """
+    _ZEROSIZE = True
+    width = height = 0
+
+    def __init__(self, position: Optional[list] = None):
+        self.position = position
+
+    def frameAction(self, frame):
+        if self.position is None:
+            self.position = [frame._y, frame._atTop, getattr(frame, "_prevASpace", 0)]
+        else:
+            frame._y, frame._atTop, frame._prevASpace = self.position
+
 
 class ReportGenerator:
     """Генератор PDF отчетов"""
@@ -24,47 +156,7 @@ class ReportGenerator:
     
     def _register_fonts(self):
         """Регистрация шрифтов с поддержкой русского языка"""
-        try:
-            # Пытаемся использовать системные шрифты с поддержкой кириллицы.
-            # Важно: для "????" в PDF почти всегда виноват шрифт без кириллицы,
-            # поэтому стараемся везде использовать DejaVu/Liberation.
-            candidates = [
-                {
-                    "regular": "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                    "bold": "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-                    "name_regular": "DejaVuSans",
-                    "name_bold": "DejaVuSans-Bold",
-                },
-                {
-                    "regular": "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-                    "bold": "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
-                    "name_regular": "LiberationSans",
-                    "name_bold": "LiberationSans-Bold",
-                },
-            ]
-
-            for c in candidates:
-                if os.path.exists(c["regular"]):
-                    try:
-                        pdfmetrics.registerFont(TTFont(c["name_regular"], c["regular"]))
-                        if os.path.exists(c["bold"]):
-                            pdfmetrics.registerFont(TTFont(c["name_bold"], c["bold"]))
-                            self.bold_font = c["name_bold"]
-                        else:
-                            self.bold_font = c["name_regular"]
-
-                        self.default_font = c["name_regular"]
-                        return
-                    except Exception:
-                        continue
-
-            # Фолбэк: встроенные шрифты (могут не поддерживать кириллицу)
-            self.default_font = "Helvetica"
-            self.bold_font = "Helvetica-Bold"
-        except Exception as e:
-            print(f"Warning: Could not register custom fonts: {e}")
-            self.default_font = "Helvetica"
-            self.bold_font = "Helvetica-Bold"
+        self.default_font, self.bold_font = register_fonts()
     
     def _setup_custom_styles(self):
         """Настройка пользовательских стилей"""
@@ -164,650 +256,16 @@ class ReportGenerator:
         verification_equipment: Optional[List[Dict[str, Any]]] = None,
     ) -> str:
         """Генерация технического отчета (формат, близкий к реальному отчету ТД)"""
-        doc = SimpleDocTemplate(
-            output_path,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
+        document = build_technical_document(
+            inspection_data,
+            equipment_data,
+            ndt_methods,
+            document_files=document_files,
+            specialist_docs=specialist_docs,
+            verification_equipment=verification_equipment,
         )
-        
-        story = []
-        
-        # Титульная страница
-        org = ""
-        try:
-            d = inspection_data.get("data") or {}
-            if isinstance(d, dict):
-                org = str(d.get("organization") or d.get("organization_name") or "").strip()
-        except Exception:
-            org = ""
-
-        story.append(Paragraph("ОТЧЕТ О ТЕХНИЧЕСКОМ ДИАГНОСТИРОВАНИИ", self.styles['ReportTitle']))
-        story.append(Spacer(1, 0.5*cm))
-        story.append(Paragraph("по результатам обследования оборудования", self.styles['ReportSubtitle']))
-        if org:
-            story.append(Spacer(1, 0.2*cm))
-            story.append(Paragraph(f"Организация/объект: {org}", self.styles['BodyText']))
-        story.append(Spacer(1, 1*cm))
-        story.append(Paragraph(f"Оборудование: {equipment_data.get('name', 'Не указано')}", self.styles['BodyText']))
-        story.append(Paragraph(f"Дата формирования: {datetime.now().strftime('%d.%m.%Y')}", self.styles['BodyText']))
-        story.append(PageBreak())
-
-        # Содержание (упрощённое)
-        story.append(Paragraph("СОДЕРЖАНИЕ", self.styles['SectionTitle']))
-        toc = [
-            "1. Общая часть",
-            "2. Исходные данные и нормативная база",
-            "3. Описание объекта и карта обследования",
-            "4. Акт(ы) неразрушающего контроля (по методам)",
-            "5. Результаты обследования (детализация)",
-            "6. Заключение",
-            "7. Приложения (фото/схемы/документы специалистов)",
-        ]
-        for item in toc:
-            story.append(Paragraph(item, self.styles['BodyText']))
-        story.append(PageBreak())
-
-        # 1. Общая часть
-        story.append(Paragraph("1. ОБЩАЯ ЧАСТЬ", self.styles['SectionTitle']))
-        story.append(Paragraph(
-            "Настоящий отчет составлен по результатам технического диагностирования оборудования с целью "
-            "оценки технического состояния и определения возможности дальнейшей безопасной эксплуатации.",
-            self.styles['BodyText']
-        ))
-        story.append(Spacer(1, 0.3*cm))
-
-        # 2. Нормативная база (в будущем можно расширить)
-        story.append(Paragraph("2. ИСХОДНЫЕ ДАННЫЕ И НОРМАТИВНАЯ БАЗА", self.styles['SectionTitle']))
-        story.append(Paragraph(
-            "При выполнении работ использовались данные, предоставленные Заказчиком, результаты обследований и "
-            "применимые нормативные документы (ФНП, ГОСТ, РД и др.).",
-            self.styles['BodyText']
-        ))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # 3. Описание объекта и карта обследования
-        story.append(Paragraph("3. ОПИСАНИЕ ОБЪЕКТА И КАРТА ОБСЛЕДОВАНИЯ", self.styles['SectionTitle']))
-        
-        equipment_info = [
-            ['Наименование оборудования:', equipment_data.get('name', 'Не указано')],
-            ['Заводской номер:', equipment_data.get('serial_number', 'Не указан')],
-            ['Место расположения:', equipment_data.get('location', 'Не указано')],
-            ['Дата ввода в эксплуатацию:', equipment_data.get('commissioning_date', 'Не указана')],
-        ]
-        
-        if equipment_data.get('attributes'):
-            attrs = equipment_data['attributes']
-            if attrs.get('regNumber'):
-                equipment_info.append(['Регистрационный номер:', attrs['regNumber']])
-            if attrs.get('pressure'):
-                equipment_info.append(['Рабочее давление:', attrs['pressure']])
-            if attrs.get('volume'):
-                equipment_info.append(['Объем:', attrs['volume']])
-        
-        table = Table(equipment_info, colWidths=[6*cm, 12*cm])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#334155')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            # Важно: используем шрифты с кириллицей, иначе будут "квадратики"
-            ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-            ('FONTNAME', (0, 0), (0, -1), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Информация о диагностике (как исходные данные)
-        story.append(Paragraph("Сведения об обследовании:", self.styles['BodyText']))
-        
-        inspection_info = [
-            ['Дата проведения диагностики:', inspection_data.get('date_performed', 'Не указана')],
-            ['Статус:', inspection_data.get('status', 'DRAFT')],
-        ]
-        
-        if inspection_data.get('data'):
-            data = inspection_data['data']
-            if isinstance(data, dict):
-                # Добавляем основные данные из диагностики
-                if data.get('executors'):
-                    inspection_info.append(['Исполнители:', data['executors']])
-                if data.get('organization'):
-                    inspection_info.append(['Организация:', data['organization']])
-        
-        table2 = Table(inspection_info, colWidths=[6*cm, 12*cm])
-        table2.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#334155')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-            ('FONTNAME', (0, 0), (0, -1), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-        ]))
-        story.append(table2)
-        story.append(Spacer(1, 0.5*cm))
-
-        # Фото таблички/схема (если загружены)
-        if inspection_data.get('data') and isinstance(inspection_data.get('data'), dict):
-            self._add_checklist_data(story, inspection_data['data'], document_files=document_files)
-
-        story.append(PageBreak())
-
-        # 4. Акт(ы) НК
-        story.append(Paragraph("4. АКТ(Ы) НЕРАЗРУШАЮЩЕГО КОНТРОЛЯ", self.styles['SectionTitle']))
-        if ndt_methods:
-            performed = [m for m in ndt_methods if m.get("is_performed")]
-            if not performed:
-                story.append(Paragraph("Методы НК не указаны или не выполнены.", self.styles['BodyText']))
-            else:
-                for idx, m in enumerate(performed, 1):
-                    story.append(Paragraph(f"Акт №{idx}. {m.get('method_name', 'Метод НК')}", self.styles['Heading3']))
-                    act_rows = [
-                        ["Метод НК:", str(m.get("method_name") or "")],
-                        ["Код:", str(m.get("method_code") or "")],
-                        ["Нормативный документ:", str(m.get("standard") or "")],
-                        ["Оборудование/прибор:", str(m.get("equipment") or "")],
-                        ["Дата выполнения:", str(m.get("performed_date") or inspection_data.get("date_performed") or "")],
-                        ["Специалист:", str(m.get("inspector_name") or "")],
-                        ["Уровень:", str(m.get("inspector_level") or "")],
-                    ]
-                    t = Table(act_rows, colWidths=[6*cm, 12*cm])
-                    t.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-                        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#334155')),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                        ('FONTNAME', (0, 0), (0, -1), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                        ('FONTSIZE', (0, 0), (-1, -1), 9),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                    ]))
-                    story.append(t)
-                    story.append(Spacer(1, 0.2*cm))
-                    if m.get("results"):
-                        story.append(Paragraph(f"<b>Результаты:</b> {str(m.get('results'))}", self.styles['Normal']))
-                    if m.get("defects"):
-                        story.append(Paragraph(f"<b>Дефекты:</b> {str(m.get('defects'))}", self.styles['Normal']))
-                    if m.get("conclusion"):
-                        story.append(Paragraph(f"<b>Заключение:</b> {str(m.get('conclusion'))}", self.styles['Normal']))
-
-                    # Фото по методу НК
-                    photos = m.get("photos") or []
-                    if isinstance(photos, list) and photos:
-                        story.append(Paragraph("Фотоматериалы:", self.styles['BodyText']))
-                        for p in photos[:10]:
-                            if isinstance(p, str) and os.path.exists(p):
-                                try:
-                                    img = Image(p)
-                                    img.drawWidth = 16 * cm
-                                    img.drawHeight = 10 * cm
-                                    story.append(img)
-                                    story.append(Spacer(1, 0.2*cm))
-                                except Exception:
-                                    pass
-                    story.append(Spacer(1, 0.4*cm))
-        else:
-            story.append(Paragraph("Методы НК не указаны.", self.styles['BodyText']))
-
-        story.append(PageBreak())
-        
-        # Детальные данные диагностики
-        if inspection_data.get('data'):
-            story.append(Paragraph("5. РЕЗУЛЬТАТЫ ОБСЛЕДОВАНИЯ (ДЕТАЛИЗАЦИЯ)", self.styles['SectionTitle']))
-            data = inspection_data['data']
-            if isinstance(data, dict):
-                # Добавляем данные из чек-листа
-                self._add_checklist_data(story, data, document_files=document_files)
-        
-        # Заключение
-        if inspection_data.get('conclusion'):
-            story.append(Paragraph("6. ЗАКЛЮЧЕНИЕ", self.styles['SectionTitle']))
-            story.append(Paragraph(inspection_data['conclusion'], self.styles['Conclusion']))
-
-        # Приложения: документы специалистов НК
-        story.append(PageBreak())
-        story.append(Paragraph("7. ПРИЛОЖЕНИЯ", self.styles['SectionTitle']))
-        if specialist_docs:
-            for s in specialist_docs:
-                story.append(Paragraph(f"Документы специалиста: {s.get('inspector_name','')}", self.styles['Heading3']))
-                certs = s.get("certifications") or []
-                for c in certs:
-                    line = f"{c.get('certification_type','')} №{c.get('certificate_number','')} ({c.get('issuing_organization','')})"
-                    story.append(Paragraph(line, self.styles['BodyText']))
-                    sp = c.get("scan_file_path")
-                    mt = (c.get("scan_mime_type") or "")
-                    # Встраиваем изображения; PDF перечисляем строкой (встраивание страниц PDF в ReportLab не делаем)
-                    if isinstance(sp, str) and os.path.exists(sp) and ("image" in mt):
-                        try:
-                            img = Image(sp)
-                            img.drawWidth = 16 * cm
-                            img.drawHeight = 10 * cm
-                            story.append(img)
-                            story.append(Spacer(1, 0.2*cm))
-                        except Exception:
-                            pass
-        else:
-            story.append(Paragraph("Документы специалистов НК не приложены.", self.styles['BodyText']))
-        
-        # Используемое оборудование для поверок
-        if verification_equipment and isinstance(verification_equipment, list) and len(verification_equipment) > 0:
-            story.append(Spacer(1, 0.5*cm))
-            story.append(Paragraph("7.1. Используемое оборудование для неразрушающего контроля", self.styles['Heading3']))
-            story.append(Paragraph(
-                "При проведении обследования использовалось следующее поверенное оборудование:",
-                self.styles['BodyText']
-            ))
-            
-            eq_table_data = [['№', 'Наименование', 'Тип', 'Серийный номер', 'Срок поверки', 'Свидетельство']]
-            for idx, eq in enumerate(verification_equipment, 1):
-                next_date = eq.get('next_verification_date', '')
-                if next_date:
-                    try:
-                        from datetime import datetime as dt
-                        d = dt.fromisoformat(next_date.replace('Z', '+00:00'))
-                        next_date = d.strftime('%d.%m.%Y')
-                    except:
-                        pass
-                
-                cert_num = eq.get('verification_certificate_number', '')
-                eq_table_data.append([
-                    str(idx),
-                    eq.get('name', ''),
-                    eq.get('equipment_type', ''),
-                    eq.get('serial_number', ''),
-                    next_date,
-                    cert_num if cert_num else '—',
-                ])
-            
-            eq_table = Table(eq_table_data, colWidths=[0.8*cm, 5*cm, 2.5*cm, 3*cm, 3*cm, 3.7*cm])
-            eq_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-            story.append(eq_table)
-            story.append(Spacer(1, 0.3*cm))
-            
-            # Добавляем сканы свидетельств о поверке
-            story.append(Paragraph("Сканы свидетельств о поверке используемого оборудования:", self.styles['BodyText']))
-            for eq in verification_equipment:
-                scan_path = eq.get('scan_file_path')
-                scan_name = eq.get('scan_file_name', '')
-                eq_name = eq.get('name', '')
-                
-                if scan_path and os.path.exists(scan_path):
-                    story.append(Spacer(1, 0.2*cm))
-                    story.append(Paragraph(f"Свидетельство о поверке: {eq_name} ({scan_name})", self.styles['BodyText']))
-                    try:
-                        # Пытаемся встроить изображение (для PDF/PNG/JPG)
-                        mime_type = eq.get('scan_mime_type', '')
-                        if 'image' in mime_type.lower():
-                            img = Image(scan_path)
-                            img.drawWidth = 16 * cm
-                            img.drawHeight = 10 * cm
-                            story.append(img)
-                            story.append(Spacer(1, 0.2*cm))
-                        else:
-                            # Для PDF просто указываем, что файл приложен
-                            story.append(Paragraph(f"Файл: {scan_name}", self.styles['BodyText']))
-                    except Exception as e:
-                        story.append(Paragraph(f"Не удалось встроить изображение: {str(e)}", self.styles['BodyText']))
-        
-        # Подпись
-        story.append(Spacer(1, 0.8*cm))
-        story.append(Paragraph("Ответственный исполнитель: _________________________", self.styles['BodyText']))
-        story.append(Paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y')}", self.styles['BodyText']))
-        
-        doc.build(story)
-        return output_path
-    
-    def _add_checklist_data(self, story, data: Dict[str, Any], document_files: Optional[List[Dict[str, Any]]] = None):
-        """Добавление данных из чек-листа"""
-        # Поддерживаем обе схемы ключей (snake_case из мобильного и camelCase из старых версий)
-        def _get(*keys, default=None):
-            for k in keys:
-                if k in data and data.get(k) is not None:
-                    return data.get(k)
-            return default
-
-        # Быстрый индекс вложений по ключу (document_number -> file_path)
-        attachments: Dict[str, str] = {}
-        if document_files and isinstance(document_files, list):
-            for f in document_files:
-                if not isinstance(f, dict):
-                    continue
-                dn = str(f.get("document_number") or "")
-                fp = f.get("file_path")
-                if dn and isinstance(fp, str) and fp:
-                    attachments[dn] = fp
-
-        def _add_image_if_exists(title: str, path: Optional[str]):
-            if not path or not isinstance(path, str):
-                return
-            if not os.path.exists(path):
-                return
-            try:
-                story.append(Paragraph(title, self.styles['BodyText']))
-                img = Image(path)
-                # масштабируем по ширине страницы
-                img.drawWidth = 16 * cm
-                img.drawHeight = 10 * cm
-                story.append(img)
-                story.append(Spacer(1, 0.3 * cm))
-            except Exception:
-                pass
-
-        # Документы
-        if _get('documents'):
-            story.append(Paragraph("3.1. Перечень рассмотренных документов", self.styles['SectionTitle']))
-            doc_data = [['№', 'Наименование документа', 'Наличие']]
-            docs = _get('documents', default={})
-            # Список названий документов (из мобильного приложения)
-            document_names = {
-                '1': 'Лицензия на осуществление деятельности по эксплуатации взрывопожароопасных и химически опасных производственных объектов I, II и III классов опасности',
-                '2': 'Свидетельство о регистрации в государственном реестре ОПО, включая сведения характеризующие ОПО',
-                '3': 'Технологический регламент объектов опасных производственных объектов',
-                '4': 'План мероприятий по локализации и ликвидации последствий аварий на опасном производственном объекте',
-                '5': 'Положение о производственном контроле за соблюдением требований промышленной безопасности на опасных производственных объектах',
-                '6': 'Журнал учета аварий и инцидентов на ОПО',
-                '7': 'Страховой полис страхования гражданской ответственности владельца опасного объекта за причинение вреда в результате аварии на опасном объекте',
-                '8': 'Приказ о назначении ответственного лица за исправное состояние и безопасную эксплуатацию сосудов',
-                '9': 'Приказ о назначении ответственного лица за осуществление производственного контроля и соблюдение требований промышленной безопасности на опасном производственном объекте',
-                '10': 'Паспорт сосуда заводской (удостоверение о качестве монтажа, сертификат соответствия, сборочный чертёж и схема включения сосуда, расчёт на прочность)',
-                '11': 'Инструкция по монтажу и эксплуатации',
-                '12': 'Паспорта на предохранительные клапаны',
-                '13': 'Паспорта на запорную арматуру',
-                '14': 'Документация на контрольно-измерительные приборы',
-                '15': 'Ремонтная (исполнительная) документация',
-                '16': 'Заключение экспертизы промышленной безопасности',
-                '17': 'Акты проведения УЗТ',
-            }
-            if isinstance(docs, dict):
-                for num, has_doc in docs.items():
-                    doc_name = document_names.get(str(num), f'Документ {num}')
-                    doc_data.append([num, doc_name, 'Да' if has_doc else 'Нет'])
-            
-            table = Table(doc_data, colWidths=[1*cm, 12*cm, 5*cm])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ]))
-            story.append(table)
-            story.append(Spacer(1, 0.5*cm))
-        
-        # Карта обследования
-        vessel_name = _get('vessel_name', 'vesselName')
-        if vessel_name:
-            story.append(Paragraph("3.2. Карта обследования", self.styles['SectionTitle']))
-            vessel_data = [
-                ['Наименование сосуда:', vessel_name or ''],
-                ['Заводской номер:', _get('serial_number', 'serialNumber', default='') or ''],
-                ['Регистрационный номер:', _get('reg_number', 'regNumber', default='') or ''],
-            ]
-            working_pressure = _get('working_pressure', 'workingPressure')
-            diameter = _get('diameter')
-            if working_pressure:
-                vessel_data.append(['Рабочее давление:', working_pressure])
-            if diameter:
-                vessel_data.append(['Диаметр сосуда:', diameter])
-            
-            table = Table(vessel_data, colWidths=[6*cm, 12*cm])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#334155')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (0, -1), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ]))
-            story.append(table)
-            story.append(Spacer(1, 0.5*cm))
-
-        # Фото заводской таблички (как в мобильном)
-        plate_path = _get('factory_plate_photo', 'factoryPlatePhoto')
-        _add_image_if_exists("Фото заводской таблички:", attachments.get("factory_plate_photo") or plate_path)
-
-        # Толщинометрия (УЗТ) — таблица + схема (если есть)
-        thickness = _get('thickness_measurements', 'thicknessMeasurements', default=[])
-        if isinstance(thickness, list) and len(thickness) > 0:
-            story.append(Paragraph("3.3. УЗТ (Ультразвуковая толщинометрия)", self.styles['SectionTitle']))
-            thickness_table_data = [['№', 'Местоположение', 'Сечение', 'Толщина, мм', 'Мин. допустимая, мм', 'X%', 'Y%', 'Комментарий']]
-            for idx, point in enumerate(thickness, 1):
-                if not isinstance(point, dict):
-                    continue
-                thickness_table_data.append([
-                    str(idx),
-                    str(point.get('location', '') or ''),
-                    str(point.get('section_number', '') or ''),
-                    str(point.get('thickness', '') or ''),
-                    str(point.get('min_allowed_thickness', '') or ''),
-                    str(point.get('x_percent', '') or ''),
-                    str(point.get('y_percent', '') or ''),
-                    str(point.get('comment', '') or ''),
-                ])
-            if len(thickness_table_data) > 1:
-                t = Table(thickness_table_data, colWidths=[0.8*cm, 3.0*cm, 1.6*cm, 1.9*cm, 2.3*cm, 1.1*cm, 1.1*cm, 6.0*cm])
-                t.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", self.default_font)),
-                    ('FONTSIZE', (0, 0), (-1, 0), 8),
-                    ('FONTSIZE', (0, 1), (-1, -1), 7),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                    ('TOPPADDING', (0, 0), (-1, -1), 4),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-                ]))
-                story.append(t)
-                story.append(Spacer(1, 0.3*cm))
-
-            scheme_path = _get('control_scheme_image', 'controlSchemeImage')
-            _add_image_if_exists("Схема контроля:", attachments.get("control_scheme_image") or scheme_path)
-
-        # ЗРА
-        zra = _get('zra_items', default=[])
-        if isinstance(zra, list) and zra:
-            story.append(Paragraph("3.4. ЗРА (запорно-регулирующая арматура)", self.styles['SectionTitle']))
-            rows = [['№', 'Кол-во', 'Типоразмер', 'Тех. №', 'Зав. №', 'Место на схеме']]
-            for i, it in enumerate(zra, 1):
-                if not isinstance(it, dict):
-                    continue
-                rows.append([
-                    str(i),
-                    str(it.get('quantity', '') or ''),
-                    str(it.get('type_size', '') or ''),
-                    str(it.get('tech_number', '') or ''),
-                    str(it.get('serial_number', '') or ''),
-                    str(it.get('location_on_scheme', '') or ''),
-                ])
-            t = Table(rows, colWidths=[0.8*cm, 1.3*cm, 3.0*cm, 2.0*cm, 2.0*cm, 8.0*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 0.3*cm))
+        return self.render_document(document, output_path)
 
-        # СППК
-        sppk = _get('sppk_items', default=[])
-        if isinstance(sppk, list) and sppk:
-            story.append(Paragraph("3.5. СППК (предохранительные клапаны)", self.styles['SectionTitle']))
-            rows = [['№', 'Кол-во', 'Типоразмер', 'Тех. №', 'Зав. №', 'Место на схеме']]
-            for i, it in enumerate(sppk, 1):
-                if not isinstance(it, dict):
-                    continue
-                rows.append([
-                    str(i),
-                    str(it.get('quantity', '') or ''),
-                    str(it.get('type_size', '') or ''),
-                    str(it.get('tech_number', '') or ''),
-                    str(it.get('serial_number', '') or ''),
-                    str(it.get('location_on_scheme', '') or ''),
-                ])
-            t = Table(rows, colWidths=[0.8*cm, 1.3*cm, 3.0*cm, 2.0*cm, 2.0*cm, 8.0*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 0.3*cm))
-
-        # Овальность
-        ovality = _get('ovality_measurements', default=[])
-        if isinstance(ovality, list) and ovality:
-            story.append(Paragraph("3.6. Измерительный контроль — овальность", self.styles['SectionTitle']))
-            rows = [['№', 'Сечение', 'Dmax', 'Dmin', 'Отклонение, %']]
-            for i, it in enumerate(ovality, 1):
-                if not isinstance(it, dict):
-                    continue
-                rows.append([
-                    str(i),
-                    str(it.get('section_number', '') or ''),
-                    str(it.get('max_diameter', '') or ''),
-                    str(it.get('min_diameter', '') or ''),
-                    str(it.get('deviation_percent', '') or ''),
-                ])
-            t = Table(rows, colWidths=[0.8*cm, 3.0*cm, 4.0*cm, 4.0*cm, 4.2*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 0.3*cm))
-
-        # Прогиб
-        deflection = _get('deflection_measurements', default=[])
-        if isinstance(deflection, list) and deflection:
-            story.append(Paragraph("3.7. Измерительный контроль — прогиб", self.styles['SectionTitle']))
-            rows = [['№', 'Сечение', 'Прогиб, мм', 'Прогиб, %']]
-            for i, it in enumerate(deflection, 1):
-                if not isinstance(it, dict):
-                    continue
-                rows.append([
-                    str(i),
-                    str(it.get('section_number', '') or ''),
-                    str(it.get('deflection_mm', '') or ''),
-                    str(it.get('deflection_percent', '') or ''),
-                ])
-            t = Table(rows, colWidths=[0.8*cm, 3.0*cm, 7.0*cm, 7.2*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 0.3*cm))
-
-        # Твердость
-        hardness = _get('hardness_tests', default=[])
-        if isinstance(hardness, list) and hardness:
-            story.append(Paragraph("3.8. Контроль твердости", self.styles['SectionTitle']))
-            rows = [['№', 'Шов', 'Участок', 'Доп. осн', 'Доп. шов', 'Осн', 'Шов', 'ЗТВ']]
-            for i, it in enumerate(hardness, 1):
-                if not isinstance(it, dict):
-                    continue
-                rows.append([
-                    str(i),
-                    str(it.get('weld_number', '') or ''),
-                    str(it.get('area_number', '') or ''),
-                    str(it.get('allowed_hardness_base', '') or ''),
-                    str(it.get('allowed_hardness_weld', '') or ''),
-                    str(it.get('hardness_base', '') or ''),
-                    str(it.get('hardness_weld', '') or ''),
-                    str(it.get('hardness_haz', '') or ''),
-                ])
-            t = Table(rows, colWidths=[0.7*cm, 1.2*cm, 1.5*cm, 2.1*cm, 2.1*cm, 2.1*cm, 2.1*cm, 2.2*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 0.3*cm))
-
-        # Сварные соединения
-        welds = _get('weld_inspections', default=[])
-        if isinstance(welds, list) and welds:
-            story.append(Paragraph("3.9. Контроль сварных соединений (ПВК/УЗК)", self.styles['SectionTitle']))
-            rows = [['№', 'Шов', 'Место на карте', 'ПВК дефект', 'УЗК дефект', 'Заключение']]
-            for i, it in enumerate(welds, 1):
-                if not isinstance(it, dict):
-                    continue
-                rows.append([
-                    str(i),
-                    str(it.get('weld_number', '') or ''),
-                    str(it.get('location_on_control_map', '') or ''),
-                    str(it.get('pvk_defect', '') or ''),
-                    str(it.get('uzk_defect', '') or ''),
-                    str(it.get('conclusion', '') or ''),
-                ])
-            t = Table(rows, colWidths=[0.7*cm, 1.2*cm, 4.0*cm, 4.0*cm, 4.0*cm, 4.1*cm])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 0.3*cm))
-    
     def generate_expertise_report(self, inspection_data: Dict[str, Any], equipment_data: Dict[str, Any],
                                   resource_data: Optional[Dict[str, Any]], output_path: str, 
                                   ndt_methods: Optional[List[Dict[str, Any]]] = None,
@@ -815,225 +273,204 @@ class ReportGenerator:
                                   specialist_docs: Optional[List[Dict[str, Any]]] = None,
                                   verification_equipment: Optional[List[Dict[str, Any]]] = None) -> str:
         """Генерация экспертизы промышленной безопасности"""
+        document = build_expertise_document(
+            inspection_data,
+            equipment_data,
+            resource_data,
+            ndt_methods,
+            document_files=document_files,
+            specialist_docs=specialist_docs,
+            verification_equipment=verification_equipment,
+        )
+        return self.render_document(document, output_path)
+
+    def render_document(self, document: ReportDocument, output_path: str) -> str:
+        """
+        Отрисовать модель документа (report_document) в PDF.
+        Разделы берутся из кеша фрагментов report_fragments (заново
+        отрисовываются только измененные), сканы (document.appendices)
+        добавляются в конец постранично из кеша пакетов appendix_bundles.
+        Без pypdf документ отрисовывается целиком, изображения — в теле.
+        """
+        import appendix_bundles
+        import report_fragments
+
+        bundles, self._appended_scans = appendix_bundles.collect(document.appendices)
+
+        if report_fragments.enabled():
+            parts = list(report_fragments.render_fragments(
+                report_fragments.split_sections(document.blocks),
+                self._fragment_salt(),
+                lambda blocks, path, start: self._build_pdf(blocks, path, document.title, start),
+            ))
+            parts += [(bundle_title, bundle_path, False) for bundle_title, bundle_path in bundles]
+            report_fragments.stitch(parts, output_path, document.title)
+            return output_path
+
+        body_path = f"{output_path}.body.pdf" if bundles else output_path
+        self._build_pdf(document.blocks, body_path, document.title)
+        if bundles:
+            try:
+                appendix_bundles.append_bundles(body_path, bundles, output_path)
+            finally:
+                os.remove(body_path)
+        return output_path
+
+    def _fragment_salt(self) -> str:
+        """Параметры рендерера, от которых зависит вид фрагмента (шрифты, вынесенные в приложения сканы)"""
+        scans = "|".join(sorted(getattr(self, "_appended_scans", ())))
+        scans_hash = hashlib.sha256(scans.encode("utf-8")).hexdigest()[:16] if scans else ""
+        return f"{getattr(self, 'default_font', '')}|{getattr(self, 'bold_font', '')}|{scans_hash}"
+
+    def _build_pdf(self, blocks, output_path: str, title: str, start: Optional[list] = None) -> list:
+        """
+        Отрисовать последовательность блоков в отдельный PDF. invariant=1 — без
+        случайного /ID и текущей CreationDate: одинаковое содержимое дает
+        побайтно одинаковый файл, и blob_store хранит отчет один раз даже без
+        кеша фрагментов (REPORT_FRAGMENT_CACHE=0).
+        start — позиция на первой странице, с которой продолжить (конец
+        предыдущего фрагмента); возвращается позиция, на которой отрисовка закончилась.
+        """
         doc = SimpleDocTemplate(
             output_path,
             pagesize=A4,
             rightMargin=2*cm,
             leftMargin=2*cm,
             topMargin=2*cm,
-            bottomMargin=2*cm
+            bottomMargin=2*cm,
+            title=title,
+            invariant=1,
         )
-        
-        story = []
-        
-        # Титульная страница
-        story.append(Paragraph("ЭКСПЕРТИЗА ПРОМЫШЛЕННОЙ БЕЗОПАСНОСТИ", self.styles['ReportTitle']))
-        story.append(Spacer(1, 0.5*cm))
-        story.append(Paragraph(f"оборудования: {equipment_data.get('name', 'Не указано')}", self.styles['ReportSubtitle']))
-        story.append(Spacer(1, 1*cm))
-        
-        # Информация об оборудовании (аналогично техническому отчету)
-        story.append(Paragraph("1. ОБЩИЕ СВЕДЕНИЯ ОБ ОБОРУДОВАНИИ", self.styles['SectionTitle']))
-        
-        equipment_info = [
-            ['Наименование оборудования:', equipment_data.get('name', 'Не указано')],
-            ['Заводской номер:', equipment_data.get('serial_number', 'Не указан')],
-            ['Место расположения:', equipment_data.get('location', 'Не указано')],
-        ]
-        
-        table = Table(equipment_info, colWidths=[6*cm, 12*cm])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#334155')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-            ('FONTNAME', (0, 0), (0, -1), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Результаты диагностики
-        story.append(Paragraph("2. РЕЗУЛЬТАТЫ ЭКСПЕРТИЗЫ", self.styles['SectionTitle']))
-        if inspection_data.get('data'):
-            self._add_checklist_data(story, inspection_data['data'], document_files=document_files)
-        
-        # Ресурс оборудования
-        if resource_data:
-            story.append(Paragraph("3. РЕСУРС ОБОРУДОВАНИЯ", self.styles['SectionTitle']))
-            resource_info = [
-                ['Тип ресурса:', resource_data.get('resource_type', 'Не указан')],
-                ['Текущее значение:', f"{resource_data.get('current_value', 0)} {resource_data.get('unit', '')}"],
-                ['Лимит:', f"{resource_data.get('limit_value', 0)} {resource_data.get('unit', '')}"],
-                ['Последнее обновление:', resource_data.get('last_updated', 'Не указана')],
-            ]
-            
-            table = Table(resource_info, colWidths=[6*cm, 12*cm])
-            table.setStyle(TableStyle([
+        story = [_FramePosition(start)] if start else []
+        for block in blocks:
+            story.extend(self._render_block(block))
+        end = _FramePosition()
+        story.append(end)
+        doc.build(story)
+        return end.position
+
+    def _render_block(self, block) -> list:
+        """Flowable'ы ReportLab для одного блока модели документа"""
+        if isinstance(block, rd.Heading):
+            style = {0: 'ReportTitle', 1: 'SectionTitle', 2: 'SectionTitle'}.get(block.level, 'Heading3')
+            return [Paragraph(escape(block.text), self.styles[style])]
+        if isinstance(block, rd.Text):
+            style = {
+                'subtitle': 'ReportSubtitle',
+                'conclusion': 'Conclusion',
+                'normal': 'Normal',
+            }.get(block.style, 'BodyText')
+            text = escape(block.text)
+            if block.label:
+                text = f"<b>{escape(block.label)}</b> {text}"
+            return [Paragraph(text, self.styles[style])]
+        if isinstance(block, rd.Table):
+            return self._render_table(block)
+        if isinstance(block, rd.Image):
+            flowables = []
+            try:
+                img = Image(block.path)
+                img.drawWidth = block.width * cm
+                img.drawHeight = block.height * cm
+                if block.caption:
+                    flowables.append(Paragraph(escape(block.caption), self.styles['BodyText']))
+                flowables.append(img)
+            except Exception:
+                pass
+            return flowables
+        if isinstance(block, rd.Attachment):
+            if block.path in getattr(self, "_appended_scans", ()):
+                return [Paragraph("Скан приведен в приложении в конце отчета.", self.styles['BodyText'])]
+            if block.is_image:
+                return self._render_block(rd.Image(path=block.path))
+            return [Paragraph(escape(f"Файл: {block.file_name or os.path.basename(block.path)}"), self.styles['BodyText'])]
+        if isinstance(block, rd.Spacer):
+            return [Spacer(1, block.height * cm)]
+        if isinstance(block, rd.PageBreak):
+            return [PageBreak()]
+        return []
+
+    def _render_table(self, block) -> list:
+        """Таблица модели документа; большие таблицы — фрагментами с повтором шапки"""
+        col_widths = [w * cm for w in block.col_widths]
+        style = self._table_style(block)
+        has_header = block.kind != "kv"
+        repeat_rows = 1 if has_header else 0
+        if len(block.rows) <= LARGE_TABLE_ROWS:
+            table = Table(block.rows, colWidths=col_widths, repeatRows=repeat_rows)
+            table.setStyle(style)
+            return [table]
+
+        header = block.rows[:1] if has_header else []
+        body = block.rows[1:] if has_header else block.rows
+        tables = []
+        for start in range(0, len(body), TABLE_CHUNK_ROWS):
+            rows = body[start:start + TABLE_CHUNK_ROWS]
+            if start and header:
+                # Шапка у следующих фрагментов — только при переносе на новую страницу
+                tables.append(_ContinuedTable(
+                    header, rows, col_widths,
+                    lambda with_header, stripe_offset: self._table_style(block, with_header, stripe_offset),
+                ))
+                continue
+            table = Table(header + rows, colWidths=col_widths, repeatRows=repeat_rows)
+            table.setStyle(style)
+            tables.append(table)
+        return tables
+
+    def _table_style(self, block, header: bool = True, stripe_offset: int = 0) -> TableStyle:
+        """
+        Стиль таблицы: "kv" — выделенная первая колонка, "grid" — темная шапка и полосы.
+        header=False — фрагмент "grid" без шапки; stripe_offset — сдвиг чередования полос.
+        """
+        default_font = getattr(self, "default_font", "Helvetica")
+        bold_font = getattr(self, "bold_font", default_font)
+        key = (
+            block.kind, block.font_size, block.header_font_size, block.padding,
+            block.align, block.valign, default_font, bold_font, header, stripe_offset,
+        )
+        cached = _TABLE_STYLES.get(key)
+        if cached is not None:
+            return cached
+        if block.kind == "kv":
+            commands = [
                 ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f1f5f9')),
                 ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#334155')),
                 ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (0, -1), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
+                # Важно: используем шрифты с кириллицей, иначе будут "квадратики"
+                ('FONTNAME', (0, 0), (-1, -1), default_font),
+                ('FONTNAME', (0, 0), (0, -1), bold_font),
+                ('FONTSIZE', (0, 0), (-1, -1), block.font_size),
                 ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-            ]))
-            story.append(table)
-            story.append(Spacer(1, 0.5*cm))
-            section_num = 4
+            ]
         else:
-            section_num = 3
-        
-        # Методы неразрушающего контроля
-        if ndt_methods:
-            story.append(Paragraph(f"{section_num}. МЕТОДЫ НЕРАЗРУШАЮЩЕГО КОНТРОЛЯ", self.styles['SectionTitle']))
-            
-            # Таблица методов НК
-            ndt_table_data = [['Метод НК', 'Нормативный документ', 'Оборудование', 'Инженер', 'Уровень', 'Результаты']]
-            for method in ndt_methods:
-                if method.get('is_performed'):
-                    ndt_table_data.append([
-                        method.get('method_name', ''),
-                        method.get('standard', ''),
-                        method.get('equipment', ''),
-                        method.get('inspector_name', ''),
-                        method.get('inspector_level', ''),
-                        method.get('results', '')[:50] + '...' if method.get('results') and len(method.get('results', '')) > 50 else method.get('results', ''),
-                    ])
-            
-            if len(ndt_table_data) > 1:
-                ndt_table = Table(ndt_table_data, colWidths=[3*cm, 3*cm, 3*cm, 3*cm, 2*cm, 4*cm])
-                ndt_table.setStyle(TableStyle([
+            stripes = [colors.white, colors.HexColor('#f8fafc')]
+            stripes = stripes[stripe_offset % 2:] + stripes[:stripe_offset % 2]
+            first = 1 if header else 0
+            commands = [
+                ('FONTNAME', (0, 0), (-1, -1), default_font),
+                ('FONTSIZE', (0, first), (-1, -1), block.font_size),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
+                ('ROWBACKGROUNDS', (0, first), (-1, -1), stripes),
+            ]
+            if header:
+                commands += [
                     ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
                     ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                    ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-                ]))
-                story.append(ndt_table)
-                
-                # Детальная информация по каждому методу
-                for method in ndt_methods:
-                    if method.get('is_performed'):
-                        story.append(Spacer(1, 0.3*cm))
-                        story.append(Paragraph(f"<b>{method.get('method_name', '')}</b>", self.styles['Heading3']))
-                        
-                        if method.get('defects'):
-                            story.append(Paragraph(f"<b>Обнаруженные дефекты:</b> {method.get('defects', '')}", self.styles['Normal']))
-                        
-                        if method.get('conclusion'):
-                            story.append(Paragraph(f"<b>Заключение:</b> {method.get('conclusion', '')}", self.styles['Normal']))
-            section_num += 1
-        
-        # Заключение
-        conclusion_section = section_num
-        if inspection_data.get('conclusion'):
-            story.append(Paragraph(f"{conclusion_section}. ЗАКЛЮЧЕНИЕ", self.styles['SectionTitle']))
-            story.append(Paragraph(inspection_data['conclusion'], self.styles['Conclusion']))
+                    ('FONTNAME', (0, 0), (-1, 0), bold_font),
+                    ('FONTSIZE', (0, 0), (-1, 0), block.header_font_size),
+                ]
+        if block.align:
+            commands.append(('ALIGN', (0, 0), (-1, -1), block.align))
+        if block.valign:
+            commands.append(('VALIGN', (0, 0), (-1, -1), block.valign))
+        if block.padding is not None:
+            commands.append(('BOTTOMPADDING', (0, 0), (-1, -1), block.padding))
+            commands.append(('TOPPADDING', (0, 0), (-1, -1), block.padding))
+        style = TableStyle(commands)
+        _TABLE_STYLES[key] = style
+        return style
 
-        # Приложения специалистов
-        story.append(PageBreak())
-        story.append(Paragraph("ПРИЛОЖЕНИЯ", self.styles['SectionTitle']))
-        if specialist_docs:
-            for s in specialist_docs:
-                story.append(Paragraph(f"Документы специалиста: {s.get('inspector_name','')}", self.styles['Heading3']))
-                for c in (s.get("certifications") or []):
-                    story.append(Paragraph(
-                        f"{c.get('certification_type','')} №{c.get('certificate_number','')} ({c.get('issuing_organization','')})",
-                        self.styles['BodyText']
-                    ))
-        else:
-            story.append(Paragraph("Документы специалистов НК не приложены.", self.styles['BodyText']))
-        
-        # Используемое оборудование для поверок
-        if verification_equipment and isinstance(verification_equipment, list) and len(verification_equipment) > 0:
-            story.append(Spacer(1, 0.5*cm))
-            story.append(Paragraph("Используемое оборудование для неразрушающего контроля", self.styles['Heading3']))
-            story.append(Paragraph(
-                "При проведении обследования использовалось следующее поверенное оборудование:",
-                self.styles['BodyText']
-            ))
-            
-            eq_table_data = [['№', 'Наименование', 'Тип', 'Серийный номер', 'Срок поверки', 'Свидетельство']]
-            for idx, eq in enumerate(verification_equipment, 1):
-                next_date = eq.get('next_verification_date', '')
-                if next_date:
-                    try:
-                        from datetime import datetime as dt
-                        d = dt.fromisoformat(next_date.replace('Z', '+00:00'))
-                        next_date = d.strftime('%d.%m.%Y')
-                    except:
-                        pass
-                
-                cert_num = eq.get('verification_certificate_number', '')
-                eq_table_data.append([
-                    str(idx),
-                    eq.get('name', ''),
-                    eq.get('equipment_type', ''),
-                    eq.get('serial_number', ''),
-                    next_date,
-                    cert_num if cert_num else '—',
-                ])
-            
-            eq_table = Table(eq_table_data, colWidths=[0.8*cm, 5*cm, 2.5*cm, 3*cm, 3*cm, 3.7*cm])
-            eq_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f172a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), getattr(self, "default_font", "Helvetica")),
-                ('FONTNAME', (0, 0), (-1, 0), getattr(self, "bold_font", getattr(self, "default_font", "Helvetica"))),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-            story.append(eq_table)
-            story.append(Spacer(1, 0.3*cm))
-            
-            # Добавляем сканы свидетельств о поверке
-            story.append(Paragraph("Сканы свидетельств о поверке используемого оборудования:", self.styles['BodyText']))
-            for eq in verification_equipment:
-                scan_path = eq.get('scan_file_path')
-                scan_name = eq.get('scan_file_name', '')
-                eq_name = eq.get('name', '')
-                
-                if scan_path and os.path.exists(scan_path):
-                    story.append(Spacer(1, 0.2*cm))
-                    story.append(Paragraph(f"Свидетельство о поверке: {eq_name} ({scan_name})", self.styles['BodyText']))
-                    try:
-                        mime_type = eq.get('scan_mime_type', '')
-                        if 'image' in mime_type.lower():
-                            img = Image(scan_path)
-                            img.drawWidth = 16 * cm
-                            img.drawHeight = 10 * cm
-                            story.append(img)
-                            story.append(Spacer(1, 0.2*cm))
-                        else:
-                            story.append(Paragraph(f"Файл: {scan_name}", self.styles['BodyText']))
-                    except Exception as e:
-                        story.append(Paragraph(f"Не удалось встроить изображение: {str(e)}", self.styles['BodyText']))
-        
-        # Подпись
-        story.append(PageBreak())
-        story.append(Spacer(1, 10*cm))
-        story.append(Paragraph("_________________________", self.styles['BodyText']))
-        story.append(Paragraph("Эксперт", self.styles['BodyText']))
-        story.append(Spacer(1, 0.5*cm))
-        story.append(Paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y')}", self.styles['BodyText']))
-        
-        doc.build(story)
-        return output_path
     
     def generate_questionnaire_report(
         self,
@@ -1044,7 +481,7 @@ class ReportGenerator:
         ndt_methods: Optional[List[Dict[str, Any]]] = None
     ):
         """Генерировать PDF опросного листа"""
-        doc = SimpleDocTemplate(output_path, pagesize=A4)
+        doc = SimpleDocTemplate(output_path, pagesize=A4, invariant=1)
         
         story = []
         
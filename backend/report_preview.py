@@ -0,0 +1,147 @@
+"""
+Быстрый визуальный предпросмотр отчета: титульная часть и первые N страниц в
+виде PNG-миниатюр.
+
+Отрисовываются только начальные разделы документа (через кеш фрагментов
+report_fragments), длинные таблицы обрезаются — их хвост в первые страницы все
+равно не попадает. Миниатюры кешируются в PREVIEW_CACHE_DIR по отпечатку:
+ключи фрагментов + число страниц + ширина, поэтому повторный предпросмотр
+неизменного отчета — это чтение нескольких PNG с диска.
+
+Растеризация — через pypdfium2 (опциональная зависимость: без нее предпросмотр
+недоступен, генерация отчетов работает как обычно).
+"""
+import dataclasses
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+import report_document as rd
+
+PREVIEW_CACHE_DIR = Path(os.getenv("REPORT_PREVIEW_CACHE_DIR", "/app/reports/preview_cache"))
+DEFAULT_PAGES = 3
+MAX_PAGES = 10
+DEFAULT_WIDTH = 360
+MAX_WIDTH = 1200
+# Строк таблицы, которых заведомо хватает на MAX_PAGES страниц
+PREVIEW_TABLE_ROWS = 60 * MAX_PAGES
+# Сколько наборов миниатюр хранить (старые удаляются)
+PREVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_PREVIEW_CACHE_ENTRIES", "500"))
+
+
+def available() -> bool:
+    """Есть ли растеризатор PDF и pypdf для подсчета страниц"""
+    try:
+        import pypdfium2  # noqa: F401
+        import pypdf  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _truncate(blocks: List["rd.Block"]) -> List["rd.Block"]:
+    result: List[rd.Block] = []
+    for block in blocks:
+        if isinstance(block, rd.Table) and len(block.rows) > PREVIEW_TABLE_ROWS + 1:
+            rest = len(block.rows) - PREVIEW_TABLE_ROWS - 1
+            result.append(dataclasses.replace(block, rows=block.rows[:PREVIEW_TABLE_ROWS + 1]))
+            result.append(rd.Text(f"… и еще {rest} строк"))
+        else:
+            result.append(block)
+    return result
+
+
+def _page_files(directory: Path) -> List[Path]:
+    return sorted(directory.glob("page_*.png"))
+
+
+def _prune() -> None:
+    """Удалить самые старые наборы миниатюр сверх PREVIEW_CACHE_MAX_ENTRIES"""
+    try:
+        entries = [p for p in PREVIEW_CACHE_DIR.iterdir() if p.is_dir() and not p.name.startswith(".")]
+    except OSError:
+        return
+    if len(entries) <= PREVIEW_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda p: p.stat().st_mtime)
+    for p in entries[:len(entries) - PREVIEW_CACHE_MAX_ENTRIES]:
+        shutil.rmtree(p, ignore_errors=True)
+
+
+def render_preview(ctx: Dict[str, Any], report_type: str, pages: int, width: int) -> Dict[str, Any]:
+    """
+    Отрисовать (или взять из кеша) миниатюры первых страниц отчета.
+    Выполняется в пуле рендеринга. Возвращает {"fingerprint", "pages": [пути PNG]}.
+    """
+    import appendix_bundles
+    import pypdfium2 as pdfium
+    from pypdf import PdfReader
+    import report_fragments
+    from report_generator import ReportGenerator
+
+    document = rd.build_report_document(ctx, report_type)
+    generator = ReportGenerator()
+    # Тот же набор вынесенных сканов, что и в render_document, — иначе соль и фрагменты разойдутся
+    _, generator._appended_scans = appendix_bundles.collect(document.appendices)
+    salt = generator._fragment_salt()
+
+    sections = [
+        (title, _truncate(blocks), continued)
+        for title, blocks, continued in report_fragments.split_sections(document.blocks)
+    ]
+    # Позиции продолжений определяются предыдущими разделами, поэтому в отпечатке достаточно ключей без них
+    keys = [report_fragments.fragment_key(blocks, salt) for _, blocks, _ in sections]
+    fingerprint = hashlib.sha256(f"{report_type}|{pages}|{width}|{'|'.join(keys)}".encode("ascii")).hexdigest()[:32]
+
+    cache_dir = PREVIEW_CACHE_DIR / fingerprint
+    if cache_dir.exists():
+        cached = _page_files(cache_dir)
+        if cached:
+            try:
+                os.utime(cache_dir)
+            except OSError:
+                pass
+            return {"fingerprint": fingerprint, "pages": [str(p) for p in cached]}
+
+    # Разделы по порядку, пока не наберется нужное число страниц
+    parts = []
+    total = 0
+    for part in report_fragments.render_fragments(
+        sections, salt, lambda blocks, out, start: generator._build_pdf(blocks, out, document.title, start)
+    ):
+        _, path, continued = part
+        parts.append(part)
+        total += len(PdfReader(path).pages) - (1 if continued else 0)
+        if total >= pages:
+            break
+
+    tmp_dir = PREVIEW_CACHE_DIR / f".{fingerprint}.{uuid.uuid4().hex}"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        # Продолжения накладываются на страницу предыдущего фрагмента — как в отчете
+        preview_path = str(tmp_dir / "preview.pdf")
+        report_fragments.stitch(parts, preview_path)
+        pdf = pdfium.PdfDocument(preview_path)
+        try:
+            for page_number in range(min(pages, len(pdf))):
+                page = pdf[page_number]
+                image = page.render(scale=width / page.get_width()).to_pil()
+                image.save(tmp_dir / f"page_{page_number + 1:02d}.png", optimize=True)
+                page.close()
+        finally:
+            pdf.close()
+        os.remove(preview_path)
+        try:
+            os.replace(tmp_dir, cache_dir)
+        except OSError:
+            # Параллельный запрос уже сохранил те же миниатюры
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    _prune()
+
+    return {"fingerprint": fingerprint, "pages": [str(p) for p in _page_files(cache_dir)]}
@@ -0,0 +1,312 @@
+"""
+Хранилище файлов blob_store: локальный диск или S3-совместимое хранилище.
+
+Файлы загрузок и отчетов хранятся как блобы (blob_store) с ключом
+"ab/cd/<sha256><расширение>". Где лежат байты, определяет драйвер
+(STORAGE_BACKEND):
+
+  local — каталог BLOB_STORE_DIR (по умолчанию, как раньше);
+  s3    — бакет S3_BUCKET S3-совместимого хранилища (AWS S3, MinIO и т.п.).
+          BLOB_STORE_DIR в этом режиме — локальный кэш: рендеринг отчетов и
+          уменьшенных копий изображений работает с файлами на диске, копия
+          скачивается по требованию (blob_store.ensure_local), давно не
+          использованные копии удаляет file_gc. Несколько реплик API видят одни
+          и те же файлы.
+
+Запись и чтение потоковые: загрузка в S3 — multipart из файла на диске
+(boto3 upload_file), чтение — частями с поддержкой диапазона (Range).
+Скачивание может отдаваться редиректом на подписанную ссылку
+(S3_REDIRECT_DOWNLOADS=1): права проверяет API, байты отдает хранилище.
+
+Настройка S3: S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL (для MinIO, например
+http://minio:9000), S3_REGION, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY,
+S3_PRESIGN_EXPIRES (сек), S3_PUBLIC_ENDPOINT_URL — адрес хранилища для
+подписанных ссылок, если клиенты видят его не по S3_ENDPOINT_URL (например,
+MinIO внутри docker-сети). Нужен пакет boto3.
+"""
+import asyncio
+import errno
+from abc import ABC, abstractmethod
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StoredObject:
+    """Метаданные объекта хранилища"""
+    size: int
+    modified: datetime
+
+
+def place_file(source: Path, target: Path) -> None:
+    """Перенести source в target; если такое содержимое уже лежит — source не нужен"""
+    if target.exists():
+        source.unlink(missing_ok=True)
+        # Свежее время изменения: сверка file_gc не трогает недавно использованные файлы
+        os.utime(target)
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # /app/reports и /app/uploads могут быть разными томами
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+        source.unlink(missing_ok=True)
+
+
+def _content_disposition(filename: str, inline: bool) -> str:
+    disposition = "inline" if inline else "attachment"
+    return f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+
+class StorageBackend(ABC):
+    """Драйвер хранилища блобов (ключ — относительный путь блоба)"""
+
+    name = "base"
+    # True — байты лежат не на локальном диске (BLOB_STORE_DIR — кэш)
+    is_remote = False
+
+    @abstractmethod
+    async def put_file(
+        self, key: str, source_path: str, content_type: Optional[str] = None, overwrite: bool = False
+    ) -> None:
+        """
+        Записать файл source_path под ключом key (source_path после вызова может
+        не существовать). Блобы адресуются содержимым, поэтому существующий объект
+        не перезаписывается; overwrite=True — для ключей не по содержимому
+        (части возобновляемых загрузок).
+        """
+
+    @abstractmethod
+    async def fetch_to(self, key: str, target_path: str) -> None:
+        """Скачать объект в локальный файл (атомарно)"""
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        """Размер и время изменения или None, если объекта нет"""
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Байты объекта [start, end] (end включительно) частями"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Удалить объект (отсутствующий объект — не ошибка)"""
+
+    async def download_url(
+        self, key: str, filename: str, media_type: Optional[str] = None, inline: bool = False
+    ) -> Optional[str]:
+        """Подписанная ссылка на скачивание или None (драйвер отдает файлы только через API)"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Файлы в каталоге на локальном диске"""
+
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    async def put_file(
+        self, key: str, source_path: str, content_type: Optional[str] = None, overwrite: bool = False
+    ) -> None:
+        target = self.path(key)
+        if overwrite:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(shutil.copyfile, source_path, target)
+            return
+        await asyncio.to_thread(place_file, Path(source_path), target)
+
+    async def fetch_to(self, key: str, target_path: str) -> None:
+        if Path(target_path) != self.path(key):
+            await asyncio.to_thread(shutil.copyfile, self.path(key), target_path)
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            st = await asyncio.to_thread(os.stat, self.path(key))
+        except FileNotFoundError:
+            return None
+        return StoredObject(size=st.st_size, modified=datetime.fromtimestamp(st.st_mtime, timezone.utc))
+
+    async def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self.path(key), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await asyncio.to_thread(self.path(key).unlink)
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage(StorageBackend):
+    """S3-совместимое хранилище (boto3; операции выполняются в потоках)"""
+
+    name = "s3"
+    is_remote = True
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        presign_expires: int = 300,
+        redirect_downloads: bool = True,
+        public_endpoint_url: Optional[str] = None,
+    ):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.presign_expires = presign_expires
+        self.redirect_downloads = redirect_downloads
+
+        def _client(endpoint: Optional[str]):
+            return boto3.client(
+                "s3",
+                endpoint_url=endpoint or None,
+                region_name=region or None,
+                aws_access_key_id=access_key or None,
+                aws_secret_access_key=secret_key or None,
+                # path-style адреса — для MinIO и прочих хранилищ без поддоменов бакетов
+                config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+            )
+
+        self.client = _client(endpoint_url)
+        # Подпись ссылки включает адрес хранилища — для внешнего адреса отдельный клиент
+        self.presign_client = _client(public_endpoint_url) if public_endpoint_url else self.client
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _is_missing(self, error) -> bool:
+        code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    async def put_file(
+        self, key: str, source_path: str, content_type: Optional[str] = None, overwrite: bool = False
+    ) -> None:
+        # Содержимое адресуется хешем: объект с таким ключом уже содержит те же байты
+        if not overwrite and await self.stat(key) is not None:
+            return
+        extra = {"ContentType": content_type} if content_type else None
+        await asyncio.to_thread(
+            self.client.upload_file, source_path, self.bucket, self.object_key(key), ExtraArgs=extra
+        )
+
+    async def fetch_to(self, key: str, target_path: str) -> None:
+        target = Path(target_path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            await asyncio.to_thread(self.client.download_file, self.bucket, self.object_key(key), str(tmp))
+            await asyncio.to_thread(os.replace, tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    async def stat(self, key: str) -> Optional[StoredObject]:
+        from botocore.exceptions import ClientError
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return StoredObject(size=int(head["ContentLength"]), modified=head["LastModified"])
+
+    async def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        response = await asyncio.to_thread(
+            self.client.get_object, Bucket=self.bucket, Key=self.object_key(key), Range=byte_range
+        )
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+    async def download_url(
+        self, key: str, filename: str, media_type: Optional[str] = None, inline: bool = False
+    ) -> Optional[str]:
+        if not self.redirect_downloads:
+            return None
+        params = {
+            "Bucket": self.bucket,
+            "Key": self.object_key(key),
+            "ResponseContentDisposition": _content_disposition(filename, inline),
+        }
+        if media_type:
+            params["ResponseContentType"] = media_type
+        return await asyncio.to_thread(
+            self.presign_client.generate_presigned_url, "get_object", Params=params, ExpiresIn=self.presign_expires
+        )
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Драйвер хранилища (создается при первом обращении, настройки — из окружения)"""
+    global _backend
+    if _backend is None:
+        kind = os.getenv("STORAGE_BACKEND", "local").strip().lower()
+        if kind == "s3":
+            _backend = S3Storage(
+                bucket=os.environ["S3_BUCKET"],
+                prefix=os.getenv("S3_PREFIX", ""),
+                endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+                region=os.getenv("S3_REGION"),
+                access_key=os.getenv("S3_ACCESS_KEY_ID"),
+                secret_key=os.getenv("S3_SECRET_ACCESS_KEY"),
+                presign_expires=int(os.getenv("S3_PRESIGN_EXPIRES", "300")),
+                redirect_downloads=os.getenv("S3_REDIRECT_DOWNLOADS", "1").strip().lower() in ("1", "true", "yes", "on"),
+                public_endpoint_url=os.getenv("S3_PUBLIC_ENDPOINT_URL"),
+            )
+        elif kind == "local":
+            from blob_store import BLOB_STORE_DIR
+            _backend = LocalStorage(BLOB_STORE_DIR)
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND: {kind}")
+    return _backend
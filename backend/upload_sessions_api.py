@@ -0,0 +1,523 @@
+"""
+Возобновляемая загрузка файлов документов чек-листа по частям.
+
+Мобильное приложение грузит фото табличек, схемы и сканы по нестабильной
+связи; при обрыве обычная загрузка (POST .../documents/{n}/upload)
+начинается заново. Протокол:
+
+  1. POST   /api/upload-sessions                 — создать сессию
+     {questionnaire_id, document_number, file_name, mime_type, total_size, sha256?}
+  2. PUT    /api/upload-sessions/{id}?offset=N   — тело запроса — очередная часть
+     файла, начиная с байта N (N должен совпадать с received_size сессии,
+     иначе 409 с актуальным received_size)
+  3. GET    /api/upload-sessions/{id}            — прогресс (после обрыва —
+     с какого байта продолжать)
+  4. POST   /api/upload-sessions/{id}/finalize   — проверить размер и SHA-256,
+     перенести файл в blob_store и привязать к QuestionnaireDocumentFile
+  DELETE    /api/upload-sessions/{id}            — отменить загрузку
+
+Повторный finalize завершенной сессии возвращает тот же документ. Части
+хранятся в UPLOAD_SESSION_DIR (файл сессии, в который дописываются части).
+При внешнем хранилище (STORAGE_BACKEND=s3) каждая принятая часть — объект
+"upload-sessions/<сессия>/<смещение>" в хранилище, finalize собирает файл из
+частей: запросы одной загрузки могут обслуживать разные реплики API. Сессии
+без активности дольше UPLOAD_SESSION_TTL_HOURS удаляет collect_stale_sessions()
+(фоновая задача в main.startup).
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid as uuid_lib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from auth import verify_token
+from database import AsyncSessionLocal, get_db
+from document_files import (
+    attach_document_file,
+    document_file_to_dict,
+    validate_document_number,
+    validate_document_type,
+)
+from models import Questionnaire, QuestionnaireDocumentFile, UploadSession, User
+from storage import get_storage
+from upload_storage import MAX_UPLOAD_BYTES, remove_file
+
+router = APIRouter(prefix="/api/upload-sessions", tags=["upload-sessions"])
+
+UPLOAD_SESSION_DIR = Path(os.getenv("UPLOAD_SESSION_DIR", "/app/uploads/.sessions"))
+# Рекомендуемый размер части для клиента
+UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv("UPLOAD_SESSION_CHUNK_KB", "1024")) * 1024
+UPLOAD_SESSION_TTL = timedelta(hours=float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")))
+UPLOAD_SESSION_GC_INTERVAL = float(os.getenv("UPLOAD_SESSION_GC_INTERVAL", "600"))
+
+
+class UploadSessionCreate(BaseModel):
+    questionnaire_id: str
+    document_number: str
+    file_name: str
+    mime_type: str
+    total_size: int
+    sha256: Optional[str] = None
+
+
+def _part_path(session_id: uuid_lib.UUID) -> Path:
+    return UPLOAD_SESSION_DIR / f"{session_id}.part"
+
+
+def _session_to_dict(session: UploadSession) -> dict:
+    return {
+        "id": str(session.id),
+        "questionnaire_id": str(session.questionnaire_id),
+        "document_number": session.document_number,
+        "file_name": session.file_name,
+        "mime_type": session.mime_type,
+        "total_size": session.total_size,
+        "received_size": session.received_size,
+        "status": session.status,
+        "chunk_size": UPLOAD_SESSION_CHUNK_SIZE,
+        "document_file_id": str(session.document_file_id) if session.document_file_id else None,
+    }
+
+
+async def _current_user_id(db: AsyncSession, username: str) -> Optional[uuid_lib.UUID]:
+    result = await db.execute(select(User.id).where(User.username == username))
+    return result.scalar_one_or_none()
+
+
+async def _get_session(db: AsyncSession, session_id: str, username: str) -> UploadSession:
+    """Сессия по id; чужие сессии недоступны"""
+    try:
+        s_uuid = uuid_lib.UUID(session_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid session_id format")
+    result = await db.execute(select(UploadSession).where(UploadSession.id == s_uuid))
+    session = result.scalar_one_or_none()
+    if not session:
+        raise HTTPException(status_code=404, detail="Сессия загрузки не найдена или устарела")
+    user_id = await _current_user_id(db, username)
+    if session.created_by and session.created_by != user_id:
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+    return session
+
+
+def _create_part(path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+
+def _chunk_path(session_id: uuid_lib.UUID) -> Path:
+    """Временный файл части одного запроса PUT"""
+    return UPLOAD_SESSION_DIR / f"{session_id}.{uuid_lib.uuid4().hex}.chunk"
+
+
+def _open_chunk(path: Path):
+    # При частях в хранилище каталог на этой реплике может еще не существовать
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return open(path, "wb")
+
+
+def _close_part(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def _append_part(path: Path, offset: int, chunk_path: Path) -> None:
+    """Дописать принятую часть в файл сессии с байта offset"""
+    with open(path, "r+b") as f, open(chunk_path, "rb") as chunk:
+        f.seek(offset)
+        # Хвост от части, не учтенной в received_size, перезаписывается
+        f.truncate()
+        shutil.copyfileobj(chunk, f, 1024 * 1024)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _remote_parts() -> bool:
+    """Части хранятся во внешнем хранилище (общем для реплик), а не в UPLOAD_SESSION_DIR"""
+    return get_storage().is_remote
+
+
+def _part_key(session_id: uuid_lib.UUID, offset: int) -> str:
+    return f"upload-sessions/{session_id}/{offset:015d}"
+
+
+async def _assemble_parts(session_id: uuid_lib.UUID, total_size: int, target: Path) -> int:
+    """
+    Собрать файл из частей в хранилище (по цепочке смещений). Возвращает число
+    собранных байт: меньше total_size — следующей части в хранилище нет.
+    """
+    storage = get_storage()
+    f = await asyncio.to_thread(_open_chunk, target)
+    offset = 0
+    try:
+        while offset < total_size:
+            key = _part_key(session_id, offset)
+            obj = await storage.stat(key)
+            if obj is None or obj.size == 0:
+                break
+            async for chunk in storage.iter_range(key):
+                await asyncio.to_thread(f.write, chunk)
+                offset += len(chunk)
+    finally:
+        await asyncio.to_thread(_close_part, f)
+    return offset
+
+
+async def _remove_parts(session_id: uuid_lib.UUID) -> None:
+    """Удалить файл сессии и части в хранилище"""
+    await remove_file(_part_path(session_id))
+    if not _remote_parts():
+        return
+    storage = get_storage()
+    offset = 0
+    # По цепочке до первой отсутствующей части — вместе с частью, записанной
+    # без фиксации received_size
+    while True:
+        key = _part_key(session_id, offset)
+        obj = await storage.stat(key)
+        if obj is None or obj.size == 0:
+            break
+        await storage.delete(key)
+        offset += obj.size
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@router.post("")
+async def create_upload_session(
+    body: UploadSessionCreate,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Начать возобновляемую загрузку файла документа"""
+    try:
+        q_uuid = uuid_lib.UUID(body.questionnaire_id)
+        q_result = await db.execute(select(Questionnaire.id).where(Questionnaire.id == q_uuid))
+        if q_result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Questionnaire not found")
+
+        validate_document_number(body.document_number)
+        validate_document_type(body.mime_type)
+        if body.total_size <= 0:
+            raise HTTPException(status_code=400, detail="Пустой файл")
+        if MAX_UPLOAD_BYTES and body.total_size > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Файл слишком большой (максимум {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ)",
+            )
+        sha256 = body.sha256.lower() if body.sha256 else None
+        if sha256 and (len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256)):
+            raise HTTPException(status_code=400, detail="Invalid sha256")
+
+        session = UploadSession(
+            questionnaire_id=q_uuid,
+            document_number=body.document_number,
+            file_name=body.file_name[:255],
+            mime_type=body.mime_type,
+            total_size=body.total_size,
+            received_size=0,
+            sha256=sha256,
+            status="ACTIVE",
+            created_by=await _current_user_id(db, username),
+        )
+        db.add(session)
+        await db.flush()
+        if not _remote_parts():
+            await asyncio.to_thread(_create_part, _part_path(session.id))
+        await db.commit()
+        await db.refresh(session)
+        return _session_to_dict(session)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid questionnaire_id format")
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to create upload session: {str(e)}")
+
+
+@router.get("/{session_id}")
+async def get_upload_session(
+    session_id: str,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Прогресс загрузки: сколько байт получено сервером"""
+    session = await _get_session(db, session_id, username)
+    return _session_to_dict(session)
+
+
+@router.put("/{session_id}")
+async def upload_session_chunk(
+    session_id: str,
+    offset: int,
+    request: Request,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Принять часть файла, начиная с байта offset (тело запроса — сырые байты)"""
+    try:
+        session = await _get_session(db, session_id, username)
+        if session.status != "ACTIVE":
+            raise HTTPException(status_code=409, detail="Загрузка уже завершена")
+        if offset != session.received_size:
+            # Клиент повторяет уже принятую часть или пропустил данные
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Неверное смещение", "received_size": session.received_size},
+            )
+        # Сессию не держим открытой на время приема тела
+        await db.commit()
+
+        remote = _remote_parts()
+        part_path = _part_path(session.id)
+        if not remote and not part_path.exists():
+            raise HTTPException(status_code=404, detail="Сессия загрузки не найдена или устарела")
+
+        # Тело пишется во временный файл запроса; в файл сессии оно попадает
+        # только после условного UPDATE, который блокирует строку сессии до
+        # фиксации: параллельный PUT с тем же смещением (повтор клиента) ждет,
+        # получает 409 и файл не трогает
+        chunk_path = _chunk_path(session.id)
+        received = offset
+        disconnected = False
+        try:
+            f = await asyncio.to_thread(_open_chunk, chunk_path)
+            try:
+                async for chunk in request.stream():
+                    if not chunk:
+                        continue
+                    if received + len(chunk) > session.total_size:
+                        raise HTTPException(status_code=413, detail="Данных больше, чем заявленный размер файла")
+                    await asyncio.to_thread(f.write, chunk)
+                    received += len(chunk)
+            except ClientDisconnect:
+                # Принятые до обрыва байты засчитываются — клиент узнает
+                # received_size через GET и продолжит с него
+                disconnected = True
+            finally:
+                await asyncio.to_thread(_close_part, f)
+
+            result = await db.execute(
+                update(UploadSession)
+                .where(UploadSession.id == session.id, UploadSession.received_size == offset)
+                .values(received_size=received, updated_at=func.now())
+            )
+            if result.rowcount == 0:
+                await db.rollback()
+                await db.refresh(session)
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Неверное смещение", "received_size": session.received_size},
+                )
+            if remote:
+                if received > offset:
+                    await get_storage().put_file(_part_key(session.id, offset), str(chunk_path), overwrite=True)
+            else:
+                await asyncio.to_thread(_append_part, part_path, offset, chunk_path)
+            await db.commit()
+        finally:
+            await remove_file(chunk_path)
+        if disconnected:
+            return None
+        return {"id": str(session.id), "received_size": received, "total_size": session.total_size}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to upload chunk: {str(e)}")
+
+
+@router.post("/{session_id}/finalize")
+async def finalize_upload_session(
+    session_id: str,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Завершить загрузку: проверить файл и привязать его к документу опросного листа"""
+    try:
+        session = await _get_session(db, session_id, username)
+        if session.status == "COMPLETED":
+            # Повтор после потерянного ответа — отдаем тот же документ
+            result = await db.execute(
+                select(QuestionnaireDocumentFile).where(QuestionnaireDocumentFile.id == session.document_file_id)
+            )
+            document_file = result.scalar_one_or_none()
+            if not document_file:
+                raise HTTPException(status_code=404, detail="Файл документа уже заменен или удален")
+            return document_file_to_dict(document_file)
+
+        if session.received_size != session.total_size:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Файл загружен не полностью", "received_size": session.received_size},
+            )
+
+        # rollback ниже сбрасывает состояние объекта — нужные поля читаем заранее
+        s_id = session.id
+        remote = _remote_parts()
+        # Части в хранилище собираются в отдельный файл запроса (параллельный finalize)
+        part_path = _chunk_path(s_id) if remote else _part_path(s_id)
+        if remote:
+            assembled = await _assemble_parts(s_id, session.total_size, part_path)
+            if assembled != session.total_size:
+                # Части нет в хранилище — клиент догружает с первого отсутствующего байта
+                await remove_file(part_path)
+                await db.execute(
+                    update(UploadSession)
+                    .where(UploadSession.id == s_id)
+                    .values(received_size=assembled, updated_at=func.now())
+                )
+                await db.commit()
+                raise HTTPException(
+                    status_code=409,
+                    detail={"message": "Файл загружен не полностью", "received_size": assembled},
+                )
+        sha256 = await asyncio.to_thread(_sha256_file, part_path)
+        if session.sha256:
+            if sha256 != session.sha256:
+                # Файл поврежден — начинать заново
+                await db.execute(delete(UploadSession).where(UploadSession.id == s_id))
+                await db.commit()
+                await remove_file(part_path)
+                await _remove_parts(s_id)
+                raise HTTPException(status_code=422, detail="Контрольная сумма файла не совпадает, загрузите файл заново")
+
+        # Помечаем сессию до переноса файла: параллельный finalize получит 409
+        result = await db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == s_id, UploadSession.status == "ACTIVE")
+            .values(status="FINALIZING", updated_at=func.now())
+        )
+        await db.commit()
+        if result.rowcount == 0:
+            if remote:
+                await remove_file(part_path)
+            raise HTTPException(status_code=409, detail="Загрузка уже завершается")
+
+        try:
+            document_file = await attach_document_file(
+                db, session.questionnaire_id, session.document_number, str(part_path), sha256,
+                session.total_size, session.file_name, session.mime_type, session.created_by,
+            )
+        except Exception:
+            await db.rollback()
+            # Сессию можно завершить повторно; если файл уже перенесен
+            # в хранилище, а запись не создана — загрузка начинается с нуля
+            values = {"status": "ACTIVE", "updated_at": func.now()}
+            if remote:
+                # Части остаются в хранилище — следующий finalize соберет файл заново
+                await remove_file(part_path)
+            elif not part_path.exists():
+                await asyncio.to_thread(_create_part, part_path)
+                values["received_size"] = 0
+            await db.execute(update(UploadSession).where(UploadSession.id == s_id).values(**values))
+            await db.commit()
+            raise
+
+        await db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == s_id)
+            .values(status="COMPLETED", document_file_id=document_file.id, updated_at=func.now())
+        )
+        await db.commit()
+        if remote:
+            await _remove_parts(s_id)
+        return document_file_to_dict(document_file)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to finalize upload: {str(e)}")
+
+
+@router.delete("/{session_id}")
+async def abort_upload_session(
+    session_id: str,
+    username: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Отменить загрузку и удалить полученные части"""
+    session = await _get_session(db, session_id, username)
+    if session.status == "FINALIZING":
+        raise HTTPException(status_code=409, detail="Загрузка уже завершается")
+    await db.execute(delete(UploadSession).where(UploadSession.id == session.id))
+    await db.commit()
+    await _remove_parts(session.id)
+    return {"message": "Загрузка отменена"}
+
+
+async def collect_stale_sessions() -> int:
+    """
+    Удалить сессии без активности дольше UPLOAD_SESSION_TTL (вместе с частями)
+    и части, для которых сессии в БД нет. Возвращает число удаленных сессий.
+    """
+    cutoff = datetime.now(timezone.utc) - UPLOAD_SESSION_TTL
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(UploadSession)
+            .where(UploadSession.updated_at < cutoff)
+            .returning(UploadSession.id)
+        )
+        stale_ids = [row[0] for row in result.all()]
+        await db.commit()
+        active = set((await db.execute(select(UploadSession.id))).scalars().all())
+
+    for session_id in stale_ids:
+        await _remove_parts(session_id)
+
+    # Части от сессий, запись о которых не была зафиксирована
+    def _orphans():
+        if not UPLOAD_SESSION_DIR.exists():
+            return []
+        threshold = (datetime.now(timezone.utc) - UPLOAD_SESSION_TTL).timestamp()
+        found = []
+        for path in UPLOAD_SESSION_DIR.glob("*.part"):
+            try:
+                if uuid_lib.UUID(path.stem) not in active and path.stat().st_mtime < threshold:
+                    found.append(path)
+            except (ValueError, OSError):
+                continue
+        # Временные файлы частей, оставшиеся после падения процесса
+        for path in UPLOAD_SESSION_DIR.glob("*.chunk"):
+            try:
+                if path.stat().st_mtime < threshold:
+                    found.append(path)
+            except OSError:
+                continue
+        return found
+
+    for path in await asyncio.to_thread(_orphans):
+        await remove_file(path)
+    return len(stale_ids)
+
+
+async def run_session_gc() -> None:
+    """Периодическая очистка устаревших сессий (запускается при старте приложения)"""
+    while True:
+        try:
+            removed = await collect_stale_sessions()
+            if removed:
+                print(f"🧹 Upload sessions GC: removed {removed} stale session(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Warning: upload sessions GC failed: {e}")
+        await asyncio.sleep(UPLOAD_SESSION_GC_INTERVAL)
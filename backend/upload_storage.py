@@ -0,0 +1,166 @@
+"""
+Потоковое сохранение загружаемых файлов.
+
+Все эндпоинты загрузки (файлы документов опросного листа, сканы сертификатов,
+сканы оборудования для поверки) сохраняют файл одинаково:
+  - тело читается частями по UPLOAD_CHUNK_SIZE, файл целиком в память не попадает;
+  - SHA-256 считается по ходу чтения;
+  - лимит размера (UPLOAD_MAX_MB) проверяется на каждой части — слишком большой
+    файл прерывается с 413, не дописываясь до конца. Multipart-тело Starlette
+    разбирает (и складывает во временный файл) до вызова эндпоинта, поэтому
+    тот же лимит применяет UploadSizeLimitMiddleware по мере приема байт:
+    по Content-Length — сразу, без него — как только тело превысит лимит;
+  - запись на диск выполняется в потоке (asyncio.to_thread), а не в event loop;
+  - данные пишутся во временный файл рядом с целевым и переносятся на место
+    атомарно (os.replace), поэтому недописанный файл никогда не виден по
+    итоговому пути.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_MB", "50")) * 1024 * 1024
+# Запас на границы multipart, заголовки частей и прочие поля формы
+UPLOAD_FORM_OVERHEAD = 1024 * 1024
+
+
+def _too_large_detail(limit: int) -> str:
+    return f"Файл слишком большой (максимум {limit // (1024 * 1024)} МБ)"
+
+
+@dataclass
+class StoredUpload:
+    """Сохраненный файл: путь, размер в байтах, SHA-256 содержимого"""
+    path: str
+    size: int
+    sha256: str
+
+
+def safe_file_name(name: Optional[str], default: str = "file") -> str:
+    """Имя файла без разделителей пути"""
+    return (name or default).replace("\\", "_").replace("/", "_")
+
+
+def _open_tmp(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return open(path, "wb")
+
+
+def _finish(f, tmp_path: Path, target: Path) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(tmp_path, target)
+
+
+def _discard(f, tmp_path: Path) -> None:
+    try:
+        f.close()
+    finally:
+        try:
+            tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+async def save_upload(
+    file: UploadFile,
+    target: Union[str, Path],
+    max_bytes: Optional[int] = None,
+) -> StoredUpload:
+    """
+    Сохранить загрузку в target потоково (см. описание модуля).
+    Превышение лимита — HTTPException 413; частично записанный файл удаляется.
+    """
+    target = Path(target)
+    limit = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    f = await asyncio.to_thread(_open_tmp, tmp_path)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if limit and size > limit:
+                raise HTTPException(status_code=413, detail=_too_large_detail(limit))
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+        await asyncio.to_thread(_finish, f, tmp_path, target)
+    except BaseException:
+        await asyncio.to_thread(_discard, f, tmp_path)
+        raise
+
+    return StoredUpload(path=str(target), size=size, sha256=digest.hexdigest())
+
+
+def _remove(path: Union[str, Path]) -> None:
+    try:
+        Path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+async def remove_file(path: Optional[Union[str, Path]]) -> None:
+    """Удалить замененный файл вне event loop; ошибки удаления не прерывают запрос"""
+    if not path:
+        return
+    try:
+        await asyncio.to_thread(_remove, path)
+    except OSError:
+        pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI-middleware: лимит UPLOAD_MAX_MB для multipart-запросов до разбора формы.
+    Заявленный Content-Length сверх лимита — 413 без чтения тела; тело без
+    Content-Length (chunked) обрывается с 413, как только превысит лимит, —
+    во временный файл Starlette попадает не больше лимита.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").lower().startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_bytes + UPLOAD_FORM_OVERHEAD
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": _too_large_detail(self.max_bytes)}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI пробрасывает HTTPException из разбора формы как ответ
+                    raise HTTPException(status_code=413, detail=_too_large_detail(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
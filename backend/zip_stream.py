@@ -0,0 +1,108 @@
+"""
+Потоковая сборка ZIP-архива.
+
+Архив формируется на лету: zipfile пишет в несеекабельный буфер (для записей
+используются data descriptor'ы), а накопленные байты сразу отдаются клиенту.
+Целиком архив не хранится ни в памяти, ни на диске — в памяти только текущий
+фрагмент файла.
+"""
+import asyncio
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+CHUNK_SIZE = 256 * 1024
+
+
+class _UnseekableBuffer:
+    """Буфер-приемник для zipfile: сеек не поддерживается, позиция считается вручную"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    """
+    ZIP-архив, отдаваемый по частям.
+
+    Пример:
+        zs = ZipStream()
+        async for chunk in zs.add_file("report.pdf", "/app/reports/x.pdf"):
+            yield chunk
+        yield zs.close()
+    """
+
+    def __init__(self, compression: int = zipfile.ZIP_DEFLATED, compresslevel: Optional[int] = 1):
+        self._buffer = _UnseekableBuffer()
+        # PDF/DOCX уже сжаты внутри, поэтому уровень сжатия минимальный
+        self._zip = zipfile.ZipFile(
+            self._buffer, mode="w", compression=compression, compresslevel=compresslevel
+        )
+        self._names = set()
+
+    def _unique_name(self, arcname: str) -> str:
+        name = arcname
+        counter = 1
+        while name in self._names:
+            stem, dot, ext = arcname.rpartition(".")
+            name = f"{stem}_{counter}.{ext}" if dot else f"{arcname}_{counter}"
+            counter += 1
+        self._names.add(name)
+        return name
+
+    def _zipinfo(self, arcname: str) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(self._unique_name(arcname), date_time=datetime.now().timetuple()[:6])
+        info.compress_type = self._zip.compression
+        info.external_attr = 0o644 << 16
+        return info
+
+    async def add_file(self, arcname: str, path: str) -> AsyncIterator[bytes]:
+        """Добавить файл с диска; чтение и сжатие — в потоке, по CHUNK_SIZE"""
+        info = self._zipinfo(arcname)
+        src = await asyncio.to_thread(open, path, "rb")
+        try:
+            dest = self._zip.open(info, mode="w")
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(src.read, CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await asyncio.to_thread(dest.write, chunk)
+                    data = self._buffer.drain()
+                    if data:
+                        yield data
+            finally:
+                dest.close()
+        finally:
+            src.close()
+        data = self._buffer.drain()
+        if data:
+            yield data
+
+    def add_bytes(self, arcname: str, content: bytes) -> bytes:
+        """Добавить небольшой файл из памяти (например, список ошибок)"""
+        self._zip.writestr(self._zipinfo(arcname), content)
+        return self._buffer.drain()
+
+    def close(self) -> bytes:
+        """Записать центральный каталог и вернуть последние байты архива"""
+        self._zip.close()
+        return self._buffer.drain()
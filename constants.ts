@@ -265,7 +265,7 @@ export const MOCK_CADASTRAL: CadastralParcel[] = [
   }
 ];
 
-export const API_BASE = 'http://5.129.203.182:8000';
+export const API_BASE = 'http://5.129.203.182';
 
 export const INSPECTION_TASKS: InspectionTask[] = [
   { id: 'T-001', equipmentId: 'V-501', equipmentName: 'Сепаратор С-1', type: EquipmentType.VESSEL, status: 'OVERDUE', date: '2024-12-01', assignee: 'Иванов И.И.', riskLevel: RiskLevel.CRITICAL },
@@ -1,5 +1,9 @@
 import 'dart:convert';
+import 'dart:io';
+import 'dart:math';
+import 'package:crypto/crypto.dart';
 import 'package:http/http.dart' as http;
+import 'package:shared_preferences/shared_preferences.dart';
 import 'package:package_info_plus/package_info_plus.dart';
 import '../models/equipment.dart';
 import '../models/vessel_checklist.dart';
@@ -8,7 +12,8 @@ import 'auth_service.dart';
 
 class ApiService {
   // TODO: Заменить на реальный URL сервера
-  static const String baseUrl = 'http://5.129.203.182:8000';
+  // API — через nginx (порт 80): файлы отдаются им напрямую (X-Accel-Redirect)
+  static const String baseUrl = 'http://5.129.203.182';
 
   // Вход в систему
   Future<Map<String, dynamic>?> login(String username, String password) async {
@@ -391,7 +396,14 @@ class ApiService {
     }
   }
 
-  // Загрузить файл документа для чек-листа
+  // Размер части при возобновляемой загрузке (сервер может предложить свой)
+  static const int _uploadChunkSize = 1024 * 1024;
+  static const int _uploadMaxRetries = 5;
+
+  // Загрузить файл документа для чек-листа.
+  // Файл отправляется по частям через /api/upload-sessions: при обрыве связи
+  // загрузка продолжается с последнего принятого сервером байта (в том числе
+  // при следующей синхронизации — id сессии хранится в SharedPreferences).
   Future<Map<String, dynamic>> uploadDocumentFile({
     required String questionnaireId,
     required String documentNumber,
@@ -406,36 +418,187 @@ class ApiService {
         throw Exception('Токен авторизации не найден');
       }
 
-      final uri = Uri.parse(
-          '$baseUrl/api/questionnaires/$questionnaireId/documents/$documentNumber/upload');
-
-      final request = http.MultipartRequest('POST', uri);
-      request.headers['Authorization'] = 'Bearer $token';
+      final file = File(filePath);
+      final totalSize = await file.length();
+      final prefs = await SharedPreferences.getInstance();
+      final sessionKey =
+          'upload_session:$questionnaireId:$documentNumber:$filePath:$totalSize';
+      final headers = {'Authorization': 'Bearer $token'};
+
+      Map<String, dynamic>? session;
+      final savedSessionId = prefs.getString(sessionKey);
+      if (savedSessionId != null) {
+        final response = await http.get(
+          Uri.parse('$baseUrl/api/upload-sessions/$savedSessionId'),
+          headers: headers,
+        );
+        if (response.statusCode == 200) {
+          session = json.decode(response.body);
+        } else {
+          await prefs.remove(sessionKey);
+        }
+      }
 
-      final file = await http.MultipartFile.fromPath('file', filePath,
-          filename: fileName);
-      request.files.add(file);
+      if (session == null) {
+        final digest = await sha256.bind(file.openRead()).first;
+        final response = await http.post(
+          Uri.parse('$baseUrl/api/upload-sessions'),
+          headers: {...headers, 'Content-Type': 'application/json'},
+          body: json.encode({
+            'questionnaire_id': questionnaireId,
+            'document_number': documentNumber,
+            'file_name': fileName,
+            'mime_type': _mimeTypeFor(fileName),
+            'total_size': totalSize,
+            'sha256': digest.toString(),
+          }),
+        );
+        if (response.statusCode == 404 && _isRouteNotFound(response)) {
+          // Сервер без возобновляемой загрузки — отправляем файл целиком
+          return _uploadDocumentFileMultipart(
+            token: token,
+            questionnaireId: questionnaireId,
+            documentNumber: documentNumber,
+            filePath: filePath,
+            fileName: fileName,
+          );
+        }
+        if (response.statusCode != 200) {
+          throw Exception(_errorDetail(response, 'Failed to start upload'));
+        }
+        session = json.decode(response.body);
+        await prefs.setString(sessionKey, session!['id']);
+      }
 
-      final streamedResponse = await request.send();
-      final response = await http.Response.fromStream(streamedResponse);
+      final sessionId = session!['id'] as String;
+      final chunkSize = (session['chunk_size'] as int?) ?? _uploadChunkSize;
+      int offset = session['received_size'] as int? ?? 0;
+      int retries = 0;
 
-      if (response.statusCode == 200 || response.statusCode == 201) {
-        return json.decode(response.body);
-      } else {
-        String errorMessage = 'Failed to upload file: ${response.statusCode}';
+      if (session['status'] != 'COMPLETED') {
+        final raf = await file.open();
         try {
-          final errorData = json.decode(response.body);
-          if (errorData['detail'] != null) {
-            errorMessage = errorData['detail'];
+          while (offset < totalSize) {
+            try {
+              await raf.setPosition(offset);
+              final chunk = await raf.read(min(chunkSize, totalSize - offset));
+              final response = await http.put(
+                Uri.parse('$baseUrl/api/upload-sessions/$sessionId?offset=$offset'),
+                headers: {...headers, 'Content-Type': 'application/octet-stream'},
+                body: chunk,
+              );
+              if (response.statusCode == 200) {
+                offset = json.decode(response.body)['received_size'] as int;
+                retries = 0;
+              } else if (response.statusCode == 409) {
+                // Сервер принял другую часть данных — продолжаем с его смещения
+                offset = await _uploadSessionOffset(sessionId, headers);
+              } else if (response.statusCode == 404) {
+                await prefs.remove(sessionKey);
+                throw Exception('Сессия загрузки устарела, файл будет загружен заново');
+              } else {
+                throw Exception(_errorDetail(response, 'Failed to upload chunk'));
+              }
+            } on SocketException {
+              if (++retries > _uploadMaxRetries) rethrow;
+              await Future.delayed(Duration(seconds: 1 << retries));
+              offset = await _uploadSessionOffset(sessionId, headers);
+            } on http.ClientException {
+              if (++retries > _uploadMaxRetries) rethrow;
+              await Future.delayed(Duration(seconds: 1 << retries));
+              offset = await _uploadSessionOffset(sessionId, headers);
+            }
           }
-        } catch (_) {}
-        throw Exception(errorMessage);
+        } finally {
+          await raf.close();
+        }
+      }
+
+      final response = await http.post(
+        Uri.parse('$baseUrl/api/upload-sessions/$sessionId/finalize'),
+        headers: headers,
+      );
+      if (response.statusCode == 200) {
+        await prefs.remove(sessionKey);
+        return json.decode(response.body);
+      }
+      if (response.statusCode == 422 || response.statusCode == 404) {
+        // Файл поврежден при передаче или сессия удалена — начать заново
+        await prefs.remove(sessionKey);
       }
+      throw Exception(_errorDetail(response, 'Failed to finalize upload'));
     } catch (e) {
       throw Exception('Error uploading document file: $e');
     }
   }
 
+  Future<int> _uploadSessionOffset(
+      String sessionId, Map<String, String> headers) async {
+    final response = await http.get(
+      Uri.parse('$baseUrl/api/upload-sessions/$sessionId'),
+      headers: headers,
+    );
+    if (response.statusCode != 200) {
+      throw Exception(_errorDetail(response, 'Failed to get upload progress'));
+    }
+    return json.decode(response.body)['received_size'] as int;
+  }
+
+  Future<Map<String, dynamic>> _uploadDocumentFileMultipart({
+    required String token,
+    required String questionnaireId,
+    required String documentNumber,
+    required String filePath,
+    required String fileName,
+  }) async {
+    final uri = Uri.parse(
+        '$baseUrl/api/questionnaires/$questionnaireId/documents/$documentNumber/upload');
+
+    final request = http.MultipartRequest('POST', uri);
+    request.headers['Authorization'] = 'Bearer $token';
+
+    final file = await http.MultipartFile.fromPath('file', filePath,
+        filename: fileName);
+    request.files.add(file);
+
+    final streamedResponse = await request.send();
+    final response = await http.Response.fromStream(streamedResponse);
+
+    if (response.statusCode == 200 || response.statusCode == 201) {
+      return json.decode(response.body);
+    }
+    throw Exception(_errorDetail(response, 'Failed to upload file'));
+  }
+
+  static String _mimeTypeFor(String fileName) {
+    final name = fileName.toLowerCase();
+    if (name.endsWith('.pdf')) return 'application/pdf';
+    if (name.endsWith('.png')) return 'image/png';
+    return 'image/jpeg';
+  }
+
+  static bool _isRouteNotFound(http.Response response) {
+    try {
+      return json.decode(response.body)['detail'] == 'Not Found';
+    } catch (_) {
+      return false;
+    }
+  }
+
+  static String _errorDetail(http.Response response, String fallback) {
+    String errorMessage = '$fallback: ${response.statusCode}';
+    try {
+      final errorData = json.decode(response.body);
+      final detail = errorData['detail'];
+      if (detail is String) {
+        errorMessage = detail;
+      } else if (detail is Map && detail['message'] != null) {
+        errorMessage = detail['message'];
+      }
+    } catch (_) {}
+    return errorMessage;
+  }
+
   // Получить список файлов документов для опросного листа
   Future<List<Map<String, dynamic>>> getDocumentFiles(
       String questionnaireId) async {
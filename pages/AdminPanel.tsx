@@ -69,7 +69,7 @@ const AdminPanel = () => {
     pendingReports: 0,
   });
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
   const { user, hasRole } = useAuth();
 
   useEffect(() => {
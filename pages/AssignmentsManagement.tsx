@@ -60,7 +60,7 @@ const AssignmentsManagement = () => {
   const loadStatistics = async () => {
     try {
       const token = localStorage.getItem('token');
-      const API_BASE = 'http://5.129.203.182:8000';
+      const API_BASE = 'http://5.129.203.182';
       const response = await fetch(`${API_BASE}/api/assignments/statistics/engineers`, {
         headers: {
           'Authorization': `Bearer ${token}`
@@ -79,7 +79,7 @@ const AssignmentsManagement = () => {
   const loadAssignments = async () => {
     try {
       const token = localStorage.getItem('token');
-      const API_BASE = 'http://5.129.203.182:8000';
+      const API_BASE = 'http://5.129.203.182';
       const response = await fetch(`${API_BASE}/api/assignments`, {
         headers: {
           'Authorization': `Bearer ${token}`
@@ -104,7 +104,7 @@ const AssignmentsManagement = () => {
   const loadEquipment = async () => {
     try {
       const token = localStorage.getItem('token');
-      const API_BASE = 'http://5.129.203.182:8000';
+      const API_BASE = 'http://5.129.203.182';
       const response = await fetch(`${API_BASE}/api/equipment?limit=1000`, {
         headers: {
           'Authorization': `Bearer ${token}`
@@ -123,7 +123,7 @@ const AssignmentsManagement = () => {
   const loadEngineers = async () => {
     try {
       const token = localStorage.getItem('token');
-      const API_BASE = 'http://5.129.203.182:8000';
+      const API_BASE = 'http://5.129.203.182';
       const response = await fetch(`${API_BASE}/api/users?role=engineer`, {
         headers: {
           'Authorization': `Bearer ${token}`
@@ -142,7 +142,7 @@ const AssignmentsManagement = () => {
   const loadObjectStatistics = async () => {
     try {
       const token = localStorage.getItem('token');
-      const API_BASE = 'http://5.129.203.182:8000';
+      const API_BASE = 'http://5.129.203.182';
       const response = await fetch(`${API_BASE}/api/assignments/statistics/objects`, {
         headers: {
           'Authorization': `Bearer ${token}`
@@ -732,7 +732,7 @@ const CreateAssignmentModal: React.FC<{
   const [expanded, setExpanded] = useState<Record<string, boolean>>({});
   const [equipmentByWorkshop, setEquipmentByWorkshop] = useState<Record<string, any[]>>({});
   const [loadingHierarchy, setLoadingHierarchy] = useState(true);
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     loadHierarchy();
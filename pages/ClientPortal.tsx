@@ -35,7 +35,7 @@ const ClientPortal = () => {
   const [searchTerm, setSearchTerm] = useState('');
   const [loading, setLoading] = useState(true);
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     loadData();
@@ -60,7 +60,7 @@ const CompetenciesManagement = () => {
     equipment_types: [] as string[],
   });
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   const downloadCertScan = async (cert: Certification) => {
     try {
@@ -70,7 +70,7 @@ const CompetenciesManagement = () => {
         window.location.href = '/#/login';
         return;
       }
-      const res = await fetch(`${API_BASE}/api/certifications/${cert.id}/scan`, {
+      const res = await fetch(`${API_BASE}/api/certifications/${cert.id}/scan?size=original`, {
         headers: { 'Authorization': `Bearer ${token}` },
       });
       if (!res.ok) {
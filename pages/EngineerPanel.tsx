@@ -35,7 +35,7 @@ const EngineerPanel = () => {
     file: null as File | null
   });
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     if (user?.engineer_id) {
@@ -3,7 +3,7 @@ import { useNavigate, useParams } from 'react-router-dom';
 import { ArrowLeft, Calendar, FileText, Info, MapPin, Package, Users, Wrench, Eye, X, Sparkles, Download, Trash2, CheckCircle2 } from 'lucide-react';
 import { useAuth } from '../contexts/AuthContext';
 
-const API_BASE = 'http://5.129.203.182:8000';
+const API_BASE = 'http://5.129.203.182';
 
 const EquipmentDetails = () => {
   const { id } = useParams();
@@ -61,7 +61,7 @@ const EquipmentHierarchy = () => {
   } | null>(null);
   const [selectedEngineers, setSelectedEngineers] = useState<string[]>([]);
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     loadData();
@@ -93,7 +93,7 @@ const EquipmentManagement = () => {
     commissioning_date: '',
   });
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     loadData();
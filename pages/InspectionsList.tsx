@@ -54,7 +54,7 @@ const InspectionsList = () => {
   const [selectedInspections, setSelectedInspections] = useState<Set<string>>(new Set());
   const [isProcessing, setIsProcessing] = useState(false);
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     const init = async () => {
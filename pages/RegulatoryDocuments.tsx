@@ -19,7 +19,7 @@ const RegulatoryDocuments = () => {
   const [typeFilter, setTypeFilter] = useState<string>('ALL');
   const [selectedDoc, setSelectedDoc] = useState<RegulatoryDocument | null>(null);
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     loadDocuments();
@@ -63,6 +63,11 @@ interface PreviewData {
   };
 }
 
+interface PreviewPage {
+  page: number;
+  image: string;
+}
+
 const ReportGeneration = () => {
   const [inspections, setInspections] = useState<Inspection[]>([]);
   const [equipment, setEquipment] = useState<Equipment[]>([]);
@@ -73,8 +78,10 @@ const ReportGeneration = () => {
   const [previewData, setPreviewData] = useState<PreviewData | null>(null);
   const [previewType, setPreviewType] = useState<string>('');
   const [loadingPreview, setLoadingPreview] = useState(false);
+  const [previewPages, setPreviewPages] = useState<PreviewPage[]>([]);
+  const [loadingPages, setLoadingPages] = useState(false);
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     loadData();
@@ -108,6 +115,26 @@ const ReportGeneration = () => {
     }
   };
 
+  // Миниатюры первых страниц отчета (грузятся параллельно с данными предпросмотра)
+  const loadPreviewPages = async (inspectionId: string, reportType: string, headers: HeadersInit) => {
+    setPreviewPages([]);
+    setLoadingPages(true);
+    try {
+      const response = await fetch(
+        `${API_BASE}/api/inspections/${inspectionId}/preview/pages?report_type=${reportType}&pages=3`,
+        { headers }
+      );
+      if (response.ok) {
+        const data = await response.json();
+        setPreviewPages(data.pages || []);
+      }
+    } catch (error) {
+      console.error('Ошибка загрузки миниатюр отчета:', error);
+    } finally {
+      setLoadingPages(false);
+    }
+  };
+
   const loadPreview = async (inspectionId: string, reportType: string) => {
     setLoadingPreview(true);
     try {
@@ -117,6 +144,7 @@ const ReportGeneration = () => {
         headers['Authorization'] = `Bearer ${token}`;
       }
       
+      loadPreviewPages(inspectionId, reportType, headers);
       const response = await fetch(`${API_BASE}/api/inspections/${inspectionId}/preview`, { headers });
       if (response.ok) {
         const data = await response.json();
@@ -156,7 +184,7 @@ const ReportGeneration = () => {
 
       if (response.ok) {
         const data = await response.json();
-        alert(`Отчет успешно сгенерирован в формате ${format.toUpperCase()}!`);
+        alert(`Отчет успешно сгенерирован в формате ${format === 'both' ? 'PDF и DOCX' : format.toUpperCase()}!`);
         await loadData(); // Обновляем данные после генерации
         setPreviewData(null);
       } else {
@@ -381,6 +409,30 @@ const ReportGeneration = () => {
             </div>
             
             <div className="flex-1 overflow-y-auto p-4 md:p-6 space-y-4 md:space-y-6">
+              {/* Первые страницы отчета */}
+              {(loadingPages || previewPages.length > 0) && (
+                <div className="bg-slate-900 p-3 md:p-4 rounded-lg">
+                  <h3 className="text-base md:text-lg font-bold text-white mb-3 flex items-center gap-2">
+                    <Eye size={18} className="md:w-5 md:h-5 text-accent" />
+                    Первые страницы отчета
+                  </h3>
+                  {loadingPages ? (
+                    <p className="text-slate-400 text-sm">Формирование миниатюр...</p>
+                  ) : (
+                    <div className="grid grid-cols-2 sm:grid-cols-3 gap-3">
+                      {previewPages.map((p) => (
+                        <img
+                          key={p.page}
+                          src={p.image}
+                          alt={`Страница ${p.page}`}
+                          className="w-full rounded border border-slate-700 bg-white"
+                        />
+                      ))}
+                    </div>
+                  )}
+                </div>
+              )}
+
               {/* Оборудование */}
               <div className="bg-slate-900 p-3 md:p-4 rounded-lg">
                 <h3 className="text-base md:text-lg font-bold text-white mb-3 flex items-center gap-2">
@@ -526,6 +578,24 @@ const ReportGeneration = () => {
               >
                 Отмена
               </button>
+              <button
+                onClick={() => handleGenerateFromPreview('both')}
+                disabled={generating === previewData.inspection.id}
+                className="px-3 md:px-4 py-2 bg-slate-700 hover:bg-slate-600 text-white rounded-lg font-bold flex items-center justify-center gap-2 disabled:opacity-50 text-sm md:text-base"
+              >
+                {generating === previewData.inspection.id ? (
+                  <>
+                    <Sparkles size={14} className="md:w-4 md:h-4 animate-spin" />
+                    <span>Генерация...</span>
+                  </>
+                ) : (
+                  <>
+                    <FileText size={14} className="md:w-4 md:h-4" />
+                    <span className="hidden sm:inline">Сгенерировать PDF + Word</span>
+                    <span className="sm:hidden">PDF + Word</span>
+                  </>
+                )}
+              </button>
               <button
                 onClick={() => handleGenerateFromPreview('docx')}
                 disabled={generating === previewData.inspection.id}
@@ -2,7 +2,7 @@ import React, { useMemo, useState, useEffect } from 'react';
 import { Download, FileText, Search, Filter, Calendar, User, AlertCircle, Upload, X, File, Image as ImageIcon, Trash2, CheckCircle2 } from 'lucide-react';
 import { useAuth } from '../contexts/AuthContext';
 
-const API_BASE = 'http://5.129.203.182:8000';
+const API_BASE = 'http://5.129.203.182';
 
 interface Report {
   id: string;
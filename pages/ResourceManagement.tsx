@@ -37,7 +37,7 @@ const ResourceManagement = () => {
     status: 'ACTIVE',
   });
 
-  const API_BASE = 'http://5.129.203.182:8000';
+  const API_BASE = 'http://5.129.203.182';
 
   useEffect(() => {
     loadData();
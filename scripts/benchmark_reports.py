@@ -0,0 +1,331 @@
+"""
+Бенчмарк генерации отчетов (PDF/DOCX) с профилированием памяти.
+
+Синтезирует обследования растущего размера (число точек УЗТ, число вложений,
+несколько методов НК) и замеряет генераторы напрямую, без БД и API:
+  - ReportGenerator.generate_technical_report
+  - ReportGenerator.generate_expertise_report
+  - ReportGenerator.generate_questionnaire_report
+  - WordGenerator.generate_report_word
+
+Для каждого прогона записываются время (лучшее из --repeat), пиковая память
+Python-аллокаций (tracemalloc, отдельный прогон; буферы C-расширений вроде lxml
+не учитываются) и размер файла. Результаты пишутся в JSON; с --baseline текущие
+замеры сравниваются с прошлым файлом и скрипт завершается с кодом 1, если время
+или память выросли больше порога.
+
+Примеры:
+  python scripts/benchmark_reports.py
+  python scripts/benchmark_reports.py --quick --output bench.json
+  python scripts/benchmark_reports.py --baseline bench.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend"))
+
+DEFAULT_POINTS = [10, 100, 1000, 10000]
+DEFAULT_ATTACHMENTS = [0, 10, 50]
+QUICK_POINTS = [10, 1000]
+QUICK_ATTACHMENTS = [0, 10]
+NDT_METHODS = [
+    ("VIK", "Визуальный и измерительный контроль"),
+    ("UZT", "Ультразвуковая толщинометрия"),
+    ("UK", "Ультразвуковой контроль"),
+    ("MK", "Магнитопорошковый контроль"),
+]
+GENERATORS = ["technical_pdf", "expertise_pdf", "questionnaire_pdf", "report_word"]
+
+
+def _make_images(directory: Path, count: int) -> List[str]:
+    """Синтетические фото (JPEG ~ 1600x1200, как с телефона)"""
+    from PIL import Image as PILImage, ImageDraw
+
+    paths = []
+    for i in range(count):
+        path = directory / f"photo_{i}.jpg"
+        img = PILImage.new("RGB", (1600, 1200), ((40 + i * 4) % 256, 90, 140))
+        draw = ImageDraw.Draw(img)
+        for x in range(0, 1600, 80):
+            draw.line([(x, 0), (1600 - x, 1200)], fill=(255, 255, 255), width=3)
+        img.save(path, "JPEG", quality=85)
+        paths.append(str(path))
+    return paths
+
+
+def _checklist_data(points: int, photo_paths: List[str]) -> Dict[str, Any]:
+    rows = max(1, points // 50)
+    return {
+        "vessel_name": "Сосуд В-1",
+        "serial_number": "12345",
+        "reg_number": "Р-678",
+        "working_pressure": "1.6 МПа",
+        "diameter": "1200 мм",
+        "documents": {str(i): i % 3 != 0 for i in range(1, 18)},
+        "factory_plate_photo": photo_paths[0] if photo_paths else None,
+        "thickness_measurements": [
+            {
+                "location": f"Обечайка {i // 12 + 1}, точка {i % 12 + 1}",
+                "section_number": str(i // 12 + 1),
+                "thickness": round(11.5 + (i % 7) * 0.13, 2),
+                "min_allowed_thickness": 9.8,
+                "x_percent": i % 100,
+                "y_percent": (i * 7) % 100,
+                "comment": "Без замечаний" if i % 10 else "Локальное утонение",
+            }
+            for i in range(points)
+        ],
+        "zra_items": [{"quantity": 1, "type_size": "DN50 PN16", "tech_number": f"З-{i}", "serial_number": str(i),
+                       "location_on_scheme": "Патрубок выхода"} for i in range(rows)],
+        "sppk_items": [{"quantity": 1, "type_size": "СППК4 50-16", "tech_number": f"К-{i}", "serial_number": str(i),
+                        "location_on_scheme": "Верхняя часть"} for i in range(rows)],
+        "ovality_measurements": [{"section_number": i, "max_diameter": 1202, "min_diameter": 1198,
+                                  "deviation_percent": 0.33} for i in range(rows)],
+        "deflection_measurements": [{"section_number": i, "deflection_mm": 2, "deflection_percent": 0.1}
+                                    for i in range(rows)],
+        "hardness_tests": [{"weld_number": str(i), "area_number": "1", "allowed_hardness_base": "120-180",
+                            "allowed_hardness_weld": "120-200", "hardness_base": 150,
+                            "hardness_weld": 160, "hardness_haz": 155} for i in range(rows)],
+        "weld_inspections": [{"weld_number": str(i), "location_on_control_map": "Шов К1", "pvk_defect": "Нет",
+                              "uzk_defect": "Нет", "conclusion": "Годен"} for i in range(rows)],
+        "executors": "Иванов И.И., Петров П.П.",
+        "organization": "ООО «ЭС ТД НГО»",
+    }
+
+
+def build_case(points: int, attachments: int, workdir: Path) -> Dict[str, Any]:
+    """Синтетический контекст отчета в формате report_context.build_report_context"""
+    photos = _make_images(workdir, attachments)
+    # Вложения: фото таблички, фото методов НК и сканы удостоверений специалистов
+    method_photos: List[List[str]] = [[] for _ in NDT_METHODS]
+    cert_scans: List[str] = []
+    for i, p in enumerate(photos[1:]):
+        if i % 5 == 4:
+            cert_scans.append(p)
+        else:
+            method_photos[i % len(NDT_METHODS)].append(p)
+
+    data = _checklist_data(points, photos)
+    ndt_methods = [
+        {
+            "method_code": code,
+            "method_name": name,
+            "is_performed": True,
+            "standard": "ГОСТ Р 55724-2013",
+            "equipment": "УТ-93П",
+            "inspector_name": "Иванов И.И.",
+            "inspector_level": "II",
+            "results": "Недопустимых дефектов не выявлено. " * 5,
+            "defects": "Нет",
+            "conclusion": "Соответствует требованиям НТД",
+            "photos": method_photos[idx],
+            "additional_data": {},
+            "performed_date": "2025-06-01",
+        }
+        for idx, (code, name) in enumerate(NDT_METHODS)
+    ]
+    specialist_docs = [{
+        "inspector_name": "Иванов И.И.",
+        "engineer_id": "00000000-0000-0000-0000-000000000001",
+        "certifications": [
+            {"id": str(i), "certification_type": "УК", "certificate_number": f"{1000 + i}",
+             "issuing_organization": "НОАП", "scan_file_path": p, "scan_mime_type": "image/jpeg",
+             "scan_file_name": Path(p).name}
+            for i, p in enumerate(cert_scans)
+        ],
+    }]
+    equipment = {
+        "id": "00000000-0000-0000-0000-0000000000e1",
+        "name": "Сосуд под давлением В-1",
+        "serial_number": "12345",
+        "location": "Цех №1",
+        "commissioning_date": "2010-01-01",
+    }
+    inspection = {
+        "id": "00000000-0000-0000-0000-0000000000a1",
+        "date_performed": "2025-06-01",
+        "status": "SIGNED",
+        "data": data,
+        "conclusion": "Оборудование пригодно к эксплуатации до 2030 года.",
+    }
+    return {
+        "inspection": inspection,
+        "equipment": equipment,
+        "ndt_methods": ndt_methods,
+        "resource": {"resource_type": "Циклы", "current_value": 1200, "limit_value": 5000, "unit": "цикл",
+                     "last_updated": "2025-06-01"},
+        "document_files": [],
+        "specialist_docs": specialist_docs,
+        "verification_equipment": [],
+        "questionnaire_info": {"inventory_number": "ИН-1", "inspection_date": "2025-06-01",
+                               "inspector_name": "Иванов И.И.", "inspector_position": "Инженер"},
+    }
+
+
+def _runner(name: str, ctx: Dict[str, Any], output_path: str) -> Callable[[], None]:
+    from report_generator import ReportGenerator
+    from word_generator import WordGenerator
+
+    if name == "technical_pdf":
+        return lambda: ReportGenerator().generate_technical_report(
+            ctx["inspection"], ctx["equipment"], output_path, ctx["ndt_methods"],
+            document_files=ctx["document_files"], specialist_docs=ctx["specialist_docs"],
+            verification_equipment=ctx["verification_equipment"],
+        )
+    if name == "expertise_pdf":
+        return lambda: ReportGenerator().generate_expertise_report(
+            ctx["inspection"], ctx["equipment"], ctx["resource"], output_path, ctx["ndt_methods"],
+            document_files=ctx["document_files"], specialist_docs=ctx["specialist_docs"],
+            verification_equipment=ctx["verification_equipment"],
+        )
+    if name == "questionnaire_pdf":
+        return lambda: ReportGenerator().generate_questionnaire_report(
+            ctx["inspection"]["data"], ctx["equipment"], ctx["questionnaire_info"], output_path, ctx["ndt_methods"],
+        )
+    if name == "report_word":
+        return lambda: WordGenerator().generate_report_word(
+            ctx["inspection"], ctx["equipment"], ctx["ndt_methods"], output_path,
+            document_files=ctx["document_files"], specialist_docs=ctx["specialist_docs"],
+            verification_equipment=ctx["verification_equipment"],
+        )
+    raise ValueError(f"Неизвестный генератор: {name}")
+
+
+def _reset_caches() -> None:
+    """Холодные кеши приложений и фрагментов: сборка пакетов сканов и всех разделов входит в замер"""
+    import appendix_bundles
+    import report_fragments
+
+    shutil.rmtree(appendix_bundles.APPENDIX_CACHE_DIR, ignore_errors=True)
+    shutil.rmtree(report_fragments.FRAGMENT_CACHE_DIR, ignore_errors=True)
+
+
+def measure(name: str, ctx: Dict[str, Any], workdir: Path, repeat: int) -> Dict[str, Any]:
+    ext = "docx" if name == "report_word" else "pdf"
+    output_path = str(workdir / f"{name}.{ext}")
+    run = _runner(name, ctx, output_path)
+
+    timings = []
+    for _ in range(repeat):
+        _reset_caches()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+
+    # Память меряем отдельным прогоном: tracemalloc заметно замедляет выполнение
+    _reset_caches()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": round(min(timings), 4),
+        "seconds_all": [round(t, 4) for t in timings],
+        "peak_memory_bytes": peak,
+        "output_bytes": os.path.getsize(output_path),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> List[str]:
+    """Регрессии относительно прошлого прогона: время/память выросли больше порога"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["generator"], r["points"], r["attachments"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        old = previous.get((r["generator"], r["points"], r["attachments"]))
+        if not old:
+            continue
+        for metric in ("seconds", "peak_memory_bytes"):
+            if old[metric] and r[metric] > old[metric] * (1 + threshold):
+                regressions.append(
+                    f"{r['generator']} points={r['points']} attachments={r['attachments']}: "
+                    f"{metric} {old[metric]} -> {r[metric]} (+{(r[metric] / old[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк генерации отчетов")
+    parser.add_argument("--points", type=int, nargs="+", help="Число точек УЗТ (по умолчанию 10 100 1000 10000)")
+    parser.add_argument("--attachments", type=int, nargs="+", help="Число вложений (по умолчанию 0 10 50)")
+    parser.add_argument("--generators", nargs="+", choices=GENERATORS, default=GENERATORS)
+    parser.add_argument("--repeat", type=int, default=3, help="Число замеров времени (берется лучший)")
+    parser.add_argument("--quick", action="store_true", help="Сокращенная сетка размеров")
+    parser.add_argument("--output", default=f"benchmark_reports_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Допустимый рост времени/памяти (доля)")
+    args = parser.parse_args()
+
+    points_grid = args.points or (QUICK_POINTS if args.quick else DEFAULT_POINTS)
+    attachments_grid = args.attachments or (QUICK_ATTACHMENTS if args.quick else DEFAULT_ATTACHMENTS)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="report_bench_") as tmp:
+        import appendix_bundles
+        import report_fragments
+        appendix_bundles.APPENDIX_CACHE_DIR = Path(tmp) / "appendix_cache"
+        report_fragments.FRAGMENT_CACHE_DIR = Path(tmp) / "fragment_cache"
+
+        for attachments in attachments_grid:
+            for points in points_grid:
+                workdir = Path(tmp) / f"p{points}_a{attachments}"
+                workdir.mkdir()
+                ctx = build_case(points, attachments, workdir)
+                for name in args.generators:
+                    m = measure(name, ctx, workdir, max(1, args.repeat))
+                    row = {"generator": name, "points": points, "attachments": attachments, **m}
+                    results.append(row)
+                    print(
+                        f"{name:18} points={points:<6} attachments={attachments:<3} "
+                        f"{m['seconds']:8.3f} s  peak={m['peak_memory_bytes'] / 1048576:8.1f} MiB  "
+                        f"size={m['output_bytes'] / 1024:8.1f} KiB",
+                        flush=True,
+                    )
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ: {line}")
+        if regressions:
+            return 1
+        print("Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
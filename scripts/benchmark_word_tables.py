@@ -0,0 +1,75 @@
+"""
+Бенчмарк таблиц в DOCX: заполнение через объектную модель python-docx против
+сборки строк в WordprocessingML (WordGenerator._render_table_xml).
+
+Строится таблица УЗТ на 5000 строк (как в build_checklist_blocks), замеряется
+время отрисовки таблицы и сохранения документа каждым способом, после чего
+проверяется, что текст ячеек в обоих документах совпадает.
+
+Пример:
+  python scripts/benchmark_word_tables.py --rows 5000 --repeat 3
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend"))
+
+
+def thickness_table(rows: int):
+    import report_document as rd
+
+    data = [['№', 'Местоположение', 'Сечение', 'Толщина, мм', 'Мин. допустимая, мм', 'X%', 'Y%', 'Комментарий']]
+    for i in range(rows):
+        data.append([
+            str(i + 1), f"Обечайка {i // 12 + 1}, точка {i % 12 + 1}", str(i // 12 + 1),
+            f"{11.5 + (i % 7) * 0.13:.2f}", "9.8", str(i % 100), str((i * 7) % 100),
+            "Без замечаний" if i % 10 else "Локальное утонение",
+        ])
+    return rd.Table(rows=data, col_widths=[0.8, 3.0, 1.6, 1.9, 2.3, 1.1, 1.1, 6.0], padding=4, align="LEFT")
+
+
+def run(method: str, block):
+    from docx import Document
+    from word_generator import WordGenerator
+
+    doc = Document()
+    started = time.perf_counter()
+    getattr(WordGenerator(), method)(doc, block)
+    rendered = time.perf_counter() - started
+    buf = io.BytesIO()
+    doc.save(buf)
+    return rendered, time.perf_counter() - started, doc, len(buf.getvalue())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк таблиц DOCX")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    block = thickness_table(args.rows)
+    docs = {}
+    for method in ("_render_table_cells", "_render_table_xml"):
+        best = None
+        for _ in range(max(1, args.repeat)):
+            rendered, total, doc, size = run(method, block)
+            if best is None or total < best[1]:
+                best = (rendered, total, size)
+        docs[method] = doc
+        print(f"{method:20} rows={args.rows}  таблица {best[0]:7.3f} s  с сохранением {best[1]:7.3f} s  "
+              f"size={best[2] / 1024:.1f} KiB")
+
+    texts = [[[c.text for c in row.cells] for row in d.tables[0].rows] for d in docs.values()]
+    if texts[0] != texts[1]:
+        print("ОШИБКА: содержимое таблиц различается")
+        return 1
+    print("Содержимое таблиц совпадает")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())